@@ -0,0 +1,218 @@
+# ~/frappe-bench/apps/tuktuk_management/tuktuk_management/api/analytics_export.py
+"""
+Columnar export for offline analytics
+
+Streams TukTuk Transaction, Driver Deposit Transaction and TukTuk Daily Report
+rows in keyset-paginated chunks into zstd-compressed Parquet files, partitioned
+by business month:
+
+    <site>/private/files/analytics/<dataset>/month=YYYY-MM/part-<run>.parquet
+
+Exports are incremental: each dataset keeps a watermark (the last exported
+`modified`, `name`) and a run only writes rows changed since then. A row that
+changed after an earlier export therefore appears in more than one part file;
+consumers keep the latest `modified` per `name`.
+
+Needs pyarrow (listed in requirements.txt).
+
+    bench --site <site> execute tuktuk_management.api.analytics_export.export_all
+"""
+
+import os
+
+import frappe
+from frappe.utils import get_datetime, now_datetime
+
+CHUNK_SIZE = 50000
+WATERMARK_KEY = "tuktuk_analytics_watermark::{0}"
+
+# dataset: table, month column, [(column, arrow type)]
+DATASETS = {
+    "transactions": {
+        "table": "tabTukTuk Transaction",
+        "month_column": "timestamp",
+        "columns": [
+            ("name", "string"), ("transaction_id", "string"), ("transaction_type", "string"),
+            ("timestamp", "timestamp"), ("tuktuk", "string"), ("driver", "string"),
+            ("substitute_driver", "string"), ("driver_type", "string"), ("customer_phone", "string"),
+            ("amount", "float64"), ("driver_share", "float64"), ("target_contribution", "float64"),
+            ("payment_status", "string"), ("b2c_payment_sent", "int8"), ("modified", "timestamp"),
+        ],
+    },
+    "deposit_movements": {
+        "table": "tabDriver Deposit Transaction",
+        "month_column": "transaction_date",
+        "columns": [
+            ("name", "string"), ("parent", "string"), ("parenttype", "string"),
+            ("transaction_date", "date"), ("transaction_type", "string"), ("amount", "float64"),
+            ("balance_after_transaction", "float64"), ("transaction_reference", "string"),
+            ("modified", "timestamp"),
+        ],
+    },
+    "daily_reports": {
+        "table": "tabTukTuk Daily Report",
+        "month_column": "report_date",
+        "columns": [
+            ("name", "string"), ("report_date", "date"), ("total_revenue", "float64"),
+            ("total_driver_share", "float64"), ("total_target_contribution", "float64"),
+            ("total_transactions", "int64"), ("drivers_at_target", "int64"), ("total_drivers", "int64"),
+            ("target_achievement_rate", "float64"), ("inactive_drivers", "int64"),
+            ("drivers_below_target", "int64"), ("drivers_at_risk", "int64"),
+            ("active_tuktuks", "int64"), ("available_tuktuks", "int64"), ("charging_tuktuks", "int64"),
+            ("modified", "timestamp"),
+        ],
+    },
+}
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        frappe.throw("pyarrow is required for analytics export. Run: bench pip install pyarrow")
+    return pyarrow
+
+
+def _schema(pa, columns):
+    types = {
+        "string": pa.string(),
+        "timestamp": pa.timestamp("us"),
+        "date": pa.date32(),
+        "float64": pa.float64(),
+        "int64": pa.int64(),
+        "int8": pa.int8(),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+def get_watermark(dataset):
+    value = frappe.db.get_global(WATERMARK_KEY.format(dataset))
+    if not value:
+        return None, None
+    modified, _sep, name = value.partition("|")
+    return modified, name
+
+
+def set_watermark(dataset, modified, name):
+    frappe.db.set_global(WATERMARK_KEY.format(dataset), f"{modified}|{name}")
+
+
+def _chunks(table, columns, after):
+    """Rows changed after the (modified, name) watermark, in keyset order"""
+    last_modified, last_name = after
+    select = ", ".join(f"`{name}`" for name, kind in columns)
+
+    while True:
+        keyset, params = "", {"limit": CHUNK_SIZE}
+        if last_modified:
+            keyset = "WHERE (modified > %(last_modified)s OR (modified = %(last_modified)s AND name > %(last_name)s))"
+            params.update({"last_modified": last_modified, "last_name": last_name})
+
+        rows = frappe.db.sql(f"""
+            SELECT {select}
+            FROM `{table}`
+            {keyset}
+            ORDER BY modified, name
+            LIMIT %(limit)s
+        """, params, as_dict=True)
+        if not rows:
+            return
+
+        yield rows
+        if len(rows) < CHUNK_SIZE:
+            return
+        last_modified, last_name = rows[-1].modified, rows[-1].name
+
+
+def export_dataset(dataset):
+    """
+    Export one dataset incrementally.
+
+    Returns:
+        dict: dataset, rows, partitions (months written), watermark
+    """
+    pa = _pyarrow()
+    import pyarrow.parquet as pq
+
+    config = DATASETS[dataset]
+    schema = _schema(pa, config["columns"])
+    column_names = [name for name, kind in config["columns"]]
+    run = now_datetime().strftime("%Y%m%d%H%M%S")
+    base = frappe.get_site_path("private", "files", "analytics", dataset)
+
+    writers = {}
+    exported = 0
+    watermark = get_watermark(dataset)
+    last = watermark
+
+    try:
+        for rows in _chunks(config["table"], config["columns"], watermark):
+            # Partition the chunk by business month
+            by_month = {}
+            for row in rows:
+                month_value = row.get(config["month_column"]) or row.modified
+                by_month.setdefault(get_datetime(month_value).strftime("%Y-%m"), []).append(row)
+
+            for month, month_rows in by_month.items():
+                if month not in writers:
+                    folder = os.path.join(base, f"month={month}")
+                    os.makedirs(folder, exist_ok=True)
+                    writers[month] = pq.ParquetWriter(
+                        os.path.join(folder, f"part-{run}.parquet"), schema, compression="zstd"
+                    )
+                table = pa.Table.from_pydict(
+                    {name: [row.get(name) for row in month_rows] for name in column_names},
+                    schema=schema,
+                )
+                writers[month].write_table(table)
+
+            exported += len(rows)
+            last = (rows[-1].modified, rows[-1].name)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    # Advance the watermark only once every part file is complete
+    if exported:
+        set_watermark(dataset, last[0], last[1])
+        frappe.db.commit()
+
+    return {"dataset": dataset, "rows": exported, "partitions": sorted(writers), "watermark": str(last[0] or "")}
+
+
+def export_all(datasets=None):
+    """Incremental export of every dataset (or the given list)"""
+    results = []
+    for dataset in datasets or DATASETS:
+        try:
+            results.append(export_dataset(dataset))
+        except Exception as e:
+            frappe.log_error(f"Analytics export of {dataset} failed: {str(e)}", "Analytics Export Error")
+            results.append({"dataset": dataset, "error": str(e)})
+    return results
+
+
+@frappe.whitelist()
+def enqueue_analytics_export():
+    """Run the incremental analytics export in the background (reports queue)"""
+    frappe.only_for("System Manager")
+
+    from tuktuk_management.utils.job_queues import enqueue_job, REPORTS
+
+    enqueue_job(
+        "tuktuk_management.api.analytics_export.export_all",
+        queue=REPORTS,
+        dedupe_key="analytics_export",
+    )
+    return {"success": True, "message": "Analytics export queued"}
+
+
+@frappe.whitelist()
+def reset_analytics_watermark(dataset):
+    """Make the next export of a dataset start from the beginning"""
+    frappe.only_for("System Manager")
+    if dataset not in DATASETS:
+        frappe.throw(f"Unknown dataset: {dataset}")
+    frappe.db.set_global(WATERMARK_KEY.format(dataset), "")
+    return {"success": True, "message": f"Watermark of {dataset} cleared"}
@@ -12,14 +12,20 @@ Purpose: Address left_to_target calculation discrepancies identified in producti
 import frappe
 from frappe.utils import flt, now_datetime, today
 
+from tuktuk_management.utils.job_lock import single_flight, set_rows_touched
+
 
 @frappe.whitelist()
-def check_balance_discrepancies(auto_fix=False):
+def check_balance_discrepancies(auto_fix=False, run_type="Manual"):
     """
     Check for discrepancies in driver balance calculations.
     
+    The outcome is stored as one Reconciliation Run (aggregates plus a row per
+    discrepancy) instead of Error Log entries.
+    
     Args:
         auto_fix: If True, automatically fix discrepancies found
+        run_type: "Manual" or "Scheduled"
         
     Returns:
         dict: Summary of discrepancies found and fixed
@@ -28,8 +34,7 @@ def check_balance_discrepancies(auto_fix=False):
         frappe.flags.ignore_permissions = True
         
         # Get global daily target for calculations
-        settings = frappe.get_single("TukTuk Settings")
-        global_target = flt(settings.global_daily_target or 0)
+        global_target = flt(frappe.db.get_single_value("TukTuk Settings", "global_daily_target"))
         
         # Query all active drivers
         drivers = frappe.db.sql("""
@@ -50,54 +55,31 @@ def check_balance_discrepancies(auto_fix=False):
         """, (global_target,), as_dict=True)
         
         discrepancies = []
-        fixed_count = 0
-        
         for driver in drivers:
-            expected_left = driver.calculated_left_to_target
+            expected_left = flt(driver.calculated_left_to_target)
             actual_left = flt(driver.left_to_target or 0)
             error = actual_left - expected_left
             
             if abs(error) > 0.01:  # More than 1 cent difference
-                discrepancy_info = {
+                discrepancies.append({
                     'driver_id': driver.name,
                     'driver_name': driver.driver_name,
-                    'current_balance': driver.current_balance,
+                    'current_balance': flt(driver.current_balance),
                     'actual_left_to_target': actual_left,
                     'expected_left_to_target': expected_left,
                     'error': error,
-                    'effective_target': driver.daily_target or global_target
-                }
-                discrepancies.append(discrepancy_info)
-                
-                # Log the discrepancy
-                frappe.log_error(
-                    f"""Balance Discrepancy Detected
-
-Driver: {driver.driver_name} ({driver.name})
-Current Balance: {driver.current_balance}
-Expected left_to_target: {expected_left}
-Actual left_to_target: {actual_left}
-Error: {error} KES
-Effective Target: {driver.daily_target or global_target}
-
-Auto-fix: {'YES' if auto_fix else 'NO'}
-                    """,
-                    "Balance Reconciliation - Discrepancy Found"
-                )
-                
-                # Auto-fix if requested
-                if auto_fix:
-                    frappe.db.sql("""
-                        UPDATE `tabTukTuk Driver`
-                        SET left_to_target = %s
-                        WHERE name = %s
-                    """, (expected_left, driver.name))
-                    fixed_count += 1
+                    'effective_target': flt(driver.daily_target or global_target)
+                })
         
+        fixed_count = 0
         if auto_fix and discrepancies:
-            frappe.db.commit()
+            frappe.db.sql("""
+                UPDATE `tabTukTuk Driver`
+                SET left_to_target = GREATEST(0, COALESCE(NULLIF(daily_target, 0), %s) - current_balance)
+                WHERE name IN %s
+            """, (global_target, tuple(d['driver_id'] for d in discrepancies)))
+            fixed_count = len(discrepancies)
         
-        # Create summary report
         summary = {
             'timestamp': now_datetime(),
             'total_drivers_checked': len(drivers),
@@ -107,23 +89,13 @@ Auto-fix: {'YES' if auto_fix else 'NO'}
             'details': discrepancies
         }
         
-        # Log summary
-        frappe.log_error(
-            f"""Balance Reconciliation Summary
-
-Date: {today()}
-Drivers Checked: {len(drivers)}
-Discrepancies Found: {len(discrepancies)}
-Discrepancies Fixed: {fixed_count}
-Total Error Amount: {summary['total_error_amount']} KES
-
-{'=' * 60}
-Details:
-{'=' * 60}
-{format_discrepancy_table(discrepancies)}
-            """,
-            "Balance Reconciliation - Summary"
-        )
+        # Stored balances vs the ledger (latest checkpoint + events since)
+        from tuktuk_management.api.driver_ledger import verify_ledgers
+        ledger_mismatches = [row for row in verify_ledgers() if not row.is_consistent]
+        summary['ledger_mismatches'] = len(ledger_mismatches)
+        
+        summary['run'] = save_reconciliation_run(summary, ledger_mismatches, auto_fix, run_type)
+        frappe.db.commit()
         
         return summary
         
@@ -132,6 +104,119 @@ Details:
         raise
 
 
+def save_reconciliation_run(summary, ledger_mismatches, auto_fix=False, run_type="Manual"):
+    """Store the run and all of its discrepancy rows (one bulk insert); returns the run name"""
+    from frappe.model.naming import make_autoname
+    
+    details = summary['details']
+    checked = summary['total_drivers_checked']
+    run = frappe.get_doc({
+        "doctype": "Reconciliation Run",
+        "run_time": summary['timestamp'],
+        "run_type": run_type,
+        "auto_fix": 1 if auto_fix else 0,
+        "drivers_checked": checked,
+        "discrepancies_found": summary['discrepancies_found'],
+        "discrepancies_fixed": summary['discrepancies_fixed'],
+        "ledger_mismatches": len(ledger_mismatches),
+        "discrepancy_rate": flt(summary['discrepancies_found'] * 100.0 / checked, 2) if checked else 0,
+        "total_error_amount": summary['total_error_amount'],
+        "max_error_amount": max([abs(d['error']) for d in details] or [0]),
+    }).insert(ignore_permissions=True)
+    
+    rows = [
+        (d['driver_id'], d['driver_name'], "Left To Target", d['current_balance'],
+         d['expected_left_to_target'], d['actual_left_to_target'], d['error'], d['effective_target'],
+         1 if auto_fix else 0)
+        for d in details
+    ]
+    for m in ledger_mismatches:
+        if abs(m.balance_difference) > 0.01:
+            rows.append((m.driver, None, "Ledger Balance", flt(m.stored_balance),
+                         flt(m.ledger_balance), flt(m.stored_balance), m.balance_difference, 0, 0))
+        if abs(m.deposit_difference) > 0.01:
+            rows.append((m.driver, None, "Ledger Deposit", flt(m.stored_balance),
+                         flt(m.ledger_deposit), flt(m.stored_deposit), m.deposit_difference, 0, 0))
+    
+    if rows:
+        now, user = run.creation, run.owner
+        frappe.db.bulk_insert("Reconciliation Discrepancy", (
+            "name", "creation", "modified", "owner", "modified_by", "docstatus",
+            "parent", "parenttype", "parentfield", "idx",
+            "driver", "driver_name", "discrepancy_type", "current_balance",
+            "expected_value", "actual_value", "error", "effective_target", "fixed"
+        ), [
+            (make_autoname("hash", "Reconciliation Discrepancy"), now, now, user, user, 0,
+             run.name, "Reconciliation Run", "discrepancies", idx) + row
+            for idx, row in enumerate(rows, start=1)
+        ])
+    
+    return run.name
+
+
+@frappe.whitelist()
+def get_reconciliation_trend(from_date=None, to_date=None, interval="day"):
+    """
+    Discrepancy statistics across Reconciliation Runs, per day/week/month.
+    
+    Returns:
+        list: period, runs, avg/max discrepancy rate, discrepancies, error amount, ledger mismatches
+    """
+    frappe.only_for(["System Manager", "Tuktuk Manager"])
+    period = {
+        "day": "DATE(run_time)",
+        "week": "DATE_SUB(DATE(run_time), INTERVAL WEEKDAY(run_time) DAY)",
+        "month": "DATE_FORMAT(run_time, '%%Y-%%m-01')",
+    }.get(interval)
+    if not period:
+        frappe.throw("Interval must be day, week or month")
+    
+    conditions, params = "1=1", {}
+    if from_date:
+        conditions += " AND run_time >= %(from_date)s"
+        params["from_date"] = f"{from_date} 00:00:00"
+    if to_date:
+        conditions += " AND run_time < DATE_ADD(%(to_date)s, INTERVAL 1 DAY)"
+        params["to_date"] = to_date
+    
+    return frappe.db.sql(f"""
+        SELECT
+            {period} AS period,
+            COUNT(*) AS runs,
+            ROUND(AVG(discrepancy_rate), 2) AS avg_discrepancy_rate,
+            MAX(discrepancy_rate) AS max_discrepancy_rate,
+            SUM(discrepancies_found) AS discrepancies,
+            SUM(total_error_amount) AS total_error_amount,
+            SUM(ledger_mismatches) AS ledger_mismatches
+        FROM `tabReconciliation Run`
+        WHERE {conditions}
+        GROUP BY period
+        ORDER BY period
+    """, params, as_dict=True)
+
+
+@frappe.whitelist()
+def get_repeat_discrepancy_drivers(from_date=None, limit=20):
+    """Drivers that show up in the most runs since from_date (default: last 30 days)"""
+    frappe.only_for(["System Manager", "Tuktuk Manager"])
+    from frappe.utils import add_days
+    
+    return frappe.db.sql("""
+        SELECT
+            d.driver,
+            d.discrepancy_type,
+            COUNT(DISTINCT d.parent) AS runs,
+            SUM(ABS(d.error)) AS total_error,
+            MAX(r.run_time) AS last_seen
+        FROM `tabReconciliation Discrepancy` d
+        JOIN `tabReconciliation Run` r ON r.name = d.parent
+        WHERE r.run_time >= %s
+        GROUP BY d.driver, d.discrepancy_type
+        ORDER BY runs DESC, total_error DESC
+        LIMIT %s
+    """, (f"{from_date or add_days(today(), -30)} 00:00:00", int(limit)), as_dict=True)
+
+
 @frappe.whitelist()
 def fix_all_discrepancies():
     """
@@ -227,6 +312,7 @@ def format_discrepancy_table(discrepancies):
     return "\n".join(lines)
 
 
+@single_flight()
 def scheduled_reconciliation():
     """
     Scheduled task to check for balance discrepancies.
@@ -236,17 +322,19 @@ def scheduled_reconciliation():
     Manual intervention required for fixes.
     """
     try:
-        result = check_balance_discrepancies(auto_fix=False)
+        result = check_balance_discrepancies(auto_fix=False, run_type="Scheduled")
+        set_rows_touched(result['total_drivers_checked'])
         
-        if result['discrepancies_found'] > 0:
-            # Send notification if discrepancies found
+        if result['discrepancies_found'] > 0 or result['ledger_mismatches'] > 0:
+            # One short alert per run; the details are on the Reconciliation Run
             frappe.log_error(
                 f"""⚠️ ATTENTION REQUIRED: Balance Discrepancies Detected
 
 {result['discrepancies_found']} driver(s) have balance calculation errors.
+{result['ledger_mismatches']} driver(s) do not match their balance ledger.
 Total discrepancy amount: {result['total_error_amount']} KES
 
-Please review the "Balance Reconciliation - Summary" error log for details.
+Details: Reconciliation Run {result['run']}
 
 To fix automatically, run:
 bench --site {frappe.local.site} execute tuktuk_management.api.balance_reconciliation.fix_all_discrepancies
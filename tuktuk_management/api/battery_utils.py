@@ -452,6 +452,9 @@ def check_low_battery_alerts():
         
         if low_battery_vehicles:
             frappe.log_error(f"Low battery alerts sent for {len(low_battery_vehicles)} vehicles")
+
+        return len(low_battery_vehicles)
             
     except Exception as e:
-        frappe.log_error(f"Low battery check failed: {str(e)}")
\ No newline at end of file
+        frappe.log_error(f"Low battery check failed: {str(e)}")
+        return 0
\ No newline at end of file
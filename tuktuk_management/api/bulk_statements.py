@@ -0,0 +1,220 @@
+# ~/frappe-bench/apps/tuktuk_management/tuktuk_management/api/bulk_statements.py
+"""
+Bulk month-end driver statements
+
+Every driver's statement for a period is built from three range queries
+(transactions, deposit movements and opening deposit balances of all drivers),
+partitioned by driver in memory. Statements are rendered to CSV/XLSX across a
+process pool - rendering needs no DB access - then stored as private Files
+attached to each driver and, optionally, announced by email or SMS.
+
+    bench --site <site> execute tuktuk_management.api.bulk_statements.generate_bulk_statements --kwargs "{'from_date': '2026-09-01', 'to_date': '2026-09-30'}"
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import frappe
+from frappe.utils import add_days, add_months, flt, get_first_day, get_last_day, get_url, getdate
+
+from tuktuk_management.api.driver_statement import (
+    DEPOSIT_COLUMNS, TRANSACTION_COLUMNS, _write_csv, _write_xlsx,
+    tag_deposit_row, tag_transaction_row, with_running_figures,
+)
+from tuktuk_management.api.transaction_archive import transaction_source
+
+STATEMENT_WORKERS = 4
+
+
+def prefetch_statement_data(from_date, to_date):
+    """
+    All drivers' statement rows for [from_date, to_date], partitioned by driver.
+
+    Returns:
+        tuple: ({driver: [transaction rows]}, {driver: [deposit rows]}, {driver: opening balance})
+    """
+    from_date, to_date = getdate(from_date), getdate(to_date)
+
+    transactions = {}
+    for row in frappe.db.sql(f"""
+        SELECT
+            tt.driver as statement_driver,
+            {TRANSACTION_COLUMNS}
+        FROM {transaction_source(from_date)} tt
+        WHERE tt.timestamp >= %s
+          AND tt.timestamp < %s
+          AND tt.payment_status = 'Completed'
+          AND tt.driver IS NOT NULL AND tt.driver != ''
+        ORDER BY tt.driver, tt.timestamp, tt.name
+    """, (f"{from_date} 00:00:00", f"{add_days(to_date, 1)} 00:00:00"), as_dict=1):
+        transactions.setdefault(row.pop("statement_driver"), []).append(row)
+
+    deposits = {}
+    for row in frappe.db.sql(f"""
+        SELECT
+            ddt.parent as statement_driver,
+            {DEPOSIT_COLUMNS}
+        FROM `tabDriver Deposit Transaction` ddt
+        WHERE ddt.parenttype = 'TukTuk Driver'
+          AND ddt.transaction_date BETWEEN %s AND %s
+        ORDER BY ddt.parent, ddt.transaction_date, ddt.idx
+    """, (from_date, to_date), as_dict=1):
+        deposits.setdefault(row.pop("statement_driver"), []).append(row)
+
+    # Latest deposit balance of each driver before the period
+    opening = {
+        r.parent: flt(r.balance_after_transaction)
+        for r in frappe.db.sql("""
+            SELECT parent, balance_after_transaction
+            FROM (
+                SELECT
+                    parent,
+                    balance_after_transaction,
+                    ROW_NUMBER() OVER (PARTITION BY parent ORDER BY transaction_date DESC, idx DESC) AS rn
+                FROM `tabDriver Deposit Transaction`
+                WHERE parenttype = 'TukTuk Driver'
+                  AND transaction_date < %s
+            ) latest
+            WHERE rn = 1
+        """, (from_date,), as_dict=1)
+    }
+
+    return transactions, deposits, opening
+
+
+def render_statement(driver, transactions, deposits, opening_balance, path, file_format="CSV"):
+    """Write one driver's statement file (runs in a worker process, no DB access)"""
+    state = {"t": None, "d": None, "balance": flt(opening_balance), "earnings": 0.0}
+    rows = with_running_figures(
+        (tag_transaction_row(row) for row in transactions),
+        (tag_deposit_row(row) for row in deposits),
+        state,
+    )
+    if file_format == "XLSX":
+        _write_xlsx(path, rows)
+    else:
+        _write_csv(path, rows)
+    return driver, path
+
+
+def _render_job(args):
+    return render_statement(*args)
+
+
+def _notify(driver, file_url, period, notify):
+    from tuktuk_management.utils.job_queues import enqueue_job, NOTIFICATIONS
+
+    link = get_url(file_url)
+    if notify == "Email" and driver.driver_email:
+        # sendmail goes through the email queue; nothing is sent inline
+        frappe.sendmail(
+            recipients=[driver.driver_email],
+            subject=f"Sunny TukTuk statement {period}",
+            message=f"Dear {driver.driver_name},<br><br>Your statement for {period} is ready: "
+                    f"<a href='{link}'>{link}</a>",
+        )
+    elif notify == "SMS" and driver.driver_primary_phone:
+        enqueue_job(
+            "tuktuk_management.api.sms_notifications.send_sms",
+            queue=NOTIFICATIONS,
+            dedupe_key=f"statement_sms::{driver.name}::{period}",
+            phone_number=driver.driver_primary_phone,
+            message=f"Hi {driver.driver_name}, your Sunny TukTuk statement for {period} is ready: {link}",
+        )
+
+
+def generate_bulk_statements(from_date, to_date, file_format="CSV", notify=None, user=None):
+    """
+    Render and store a statement for every driver with activity (or a deposit
+    balance) in the period.
+
+    Args:
+        notify: None, "Email" or "SMS" - send each driver a link to the statement
+
+    Returns:
+        dict: statements, seconds, statements_per_minute
+    """
+    started = time.monotonic()
+    from_date, to_date = getdate(from_date), getdate(to_date)
+    period = f"{from_date} to {to_date}"
+    extension = "xlsx" if file_format == "XLSX" else "csv"
+
+    transactions, deposits, opening = prefetch_statement_data(from_date, to_date)
+    drivers = {
+        d.name: d
+        for d in frappe.db.sql("""
+            SELECT name, driver_name, driver_email, driver_primary_phone
+            FROM `tabTukTuk Driver`
+        """, as_dict=1)
+    }
+    driver_names = sorted(
+        name for name in set(transactions) | set(deposits) | {d for d, b in opening.items() if b}
+        if name in drivers
+    )
+
+    folder = frappe.get_site_path("private", "files")
+    os.makedirs(folder, exist_ok=True)
+    jobs = []
+    for name in driver_names:
+        file_name = f"statement-{name}-{from_date}-{to_date}.{extension}"
+        jobs.append((
+            name, transactions.get(name, []), deposits.get(name, []), opening.get(name, 0),
+            os.path.join(folder, file_name), file_format,
+        ))
+
+    with ProcessPoolExecutor(max_workers=STATEMENT_WORKERS) as executor:
+        rendered = list(executor.map(_render_job, jobs, chunksize=8))
+
+    for name, path in rendered:
+        file_name = os.path.basename(path)
+        file_url = f"/private/files/{file_name}"
+        if not frappe.db.exists("File", {"file_url": file_url, "attached_to_name": name}):
+            frappe.get_doc({
+                "doctype": "File",
+                "file_name": file_name,
+                "file_url": file_url,
+                "is_private": 1,
+                "attached_to_doctype": "TukTuk Driver",
+                "attached_to_name": name,
+            }).insert(ignore_permissions=True)
+        if notify:
+            _notify(drivers[name], file_url, period, notify)
+    frappe.db.commit()
+
+    seconds = time.monotonic() - started
+    result = {
+        "statements": len(rendered),
+        "seconds": round(seconds, 1),
+        "statements_per_minute": round(len(rendered) / seconds * 60, 1) if seconds else 0,
+    }
+    frappe.logger("tuktuk_management").info(f"Bulk statements {period}: {result}")
+    if user:
+        frappe.publish_realtime("bulk_statements_ready", dict(result, period=period), user=user)
+    return result
+
+
+@frappe.whitelist()
+def enqueue_monthly_statements(month_date=None, file_format="CSV", notify=None):
+    """Queue statements for every driver for the month containing month_date (default: last month)"""
+    frappe.only_for(["System Manager", "Tuktuk Manager"])
+    if file_format not in ("CSV", "XLSX"):
+        frappe.throw("File format must be CSV or XLSX")
+    if notify not in (None, "", "Email", "SMS"):
+        frappe.throw("Notify must be Email or SMS")
+
+    from tuktuk_management.utils.job_queues import enqueue_job, REPORTS
+
+    month_start = get_first_day(getdate(month_date) if month_date else add_months(getdate(), -1))
+    month_end = get_last_day(month_start)
+    enqueue_job(
+        "tuktuk_management.api.bulk_statements.generate_bulk_statements",
+        queue=REPORTS,
+        dedupe_key=f"bulk_statements::{month_start}::{file_format}",
+        from_date=month_start,
+        to_date=month_end,
+        file_format=file_format,
+        notify=notify or None,
+        user=frappe.session.user,
+    )
+    return {"success": True, "message": f"Statements for {month_start:%B %Y} queued"}
@@ -475,6 +475,26 @@ def validate_csv_structure(csv_content):
         return {"valid": False, "error": str(e)}
 
 # Background job for large CSV processing
+@frappe.whitelist()
+def enqueue_large_csv_processing(file_url, mapping_type="auto"):
+    """Queue a large CSV file for processing on the telemetry queue"""
+    from tuktuk_management.utils.job_queues import enqueue_job, TELEMETRY
+    
+    job = enqueue_job(
+        "tuktuk_management.api.csv_integration.process_large_csv_background",
+        queue=TELEMETRY,
+        dedupe_key=f"csv::{file_url}",
+        file_url=file_url,
+        mapping_type=mapping_type,
+        user_email=frappe.session.user
+    )
+    
+    return {
+        "success": True,
+        "queued": bool(job),
+        "message": "CSV queued for processing. You will be notified when it completes."
+    }
+
 @frappe.whitelist()
 def process_large_csv_background(file_url, mapping_type="auto", user_email=None):
     """
@@ -0,0 +1,402 @@
+# ~/frappe-bench/apps/tuktuk_management/tuktuk_management/api/daily_report.py
+"""
+Daily report metrics
+
+All daily report figures come from compute_daily_report_metrics(): the day's
+rows of the driver daily rollup (see driver_rollup.py), one scan of TukTuk
+Driver and one grouped vehicle-status count. The same metrics dict feeds the
+email text, the saved TukTuk Daily Report document and its per-driver
+TukTuk Driver Day Status rows.
+
+backfill_daily_reports() rebuilds a date range of reports from one grouped
+pass over transactions per (business date, party), without sending email.
+"""
+
+import frappe
+from frappe.utils import add_days, flt, getdate, get_datetime, now
+
+from tuktuk_management.api.driver_rollup import get_day_rows
+from tuktuk_management.api.driver_status import save_day_statuses
+from tuktuk_management.api.transaction_archive import transaction_source
+
+EXCLUDED_TYPES = ("Adjustment", "Driver Repayment")
+
+
+def get_business_day_range(report_date):
+    """
+    [start, end) datetimes of a business date in the operating (system) timezone.
+    Transaction timestamps are stored in the same timezone, so a plain range
+    comparison is equivalent to DATE(timestamp) = report_date but index-friendly.
+    """
+    report_date = getdate(report_date)
+    return (
+        get_datetime(f"{report_date} 00:00:00"),
+        get_datetime(f"{add_days(report_date, 1)} 00:00:00"),
+    )
+
+
+def get_vehicle_status_counts():
+    """Vehicle counts per status with one grouped query"""
+    rows = frappe.db.sql("""
+        SELECT status, COUNT(*) AS cnt
+        FROM `tabTukTuk Vehicle`
+        GROUP BY status
+    """, as_dict=True)
+    return {row.status: row.cnt for row in rows}
+
+
+def compute_daily_report_metrics(report_date=None):
+    """
+    Compute every daily report figure for a business date.
+
+    Returns:
+        dict: metrics keyed like the TukTuk Daily Report fields, plus the
+              driver lists and per-driver totals
+    """
+    report_date = getdate(report_date or frappe.utils.today())
+
+    settings = frappe.get_single("TukTuk Settings")
+    target_threshold = flt(settings.global_daily_target) or 3000
+
+    # One scan of drivers feeds inactive, below-target and at-risk figures
+    drivers = frappe.db.sql("""
+        SELECT name, assigned_tuktuk, daily_target, consecutive_misses
+        FROM `tabTukTuk Driver`
+    """, as_dict=True)
+
+    # Per-driver (and per-substitute) day totals come from the daily rollup
+    return build_daily_metrics(
+        report_date, get_day_rows(report_date), drivers, target_threshold, get_vehicle_status_counts()
+    )
+
+
+def build_daily_metrics(report_date, rows, drivers, target_threshold, vehicle_counts):
+    """
+    Daily report metrics from a day's per-party totals.
+
+    Args:
+        rows: per driver/substitute totals with driver, trips, revenue, driver_share, target_contribution
+        drivers: dicts with name, assigned_tuktuk, daily_target, consecutive_misses
+        vehicle_counts: {status: count}
+    """
+    total_revenue = sum(flt(r.revenue) for r in rows)
+    total_driver_share = sum(flt(r.driver_share) for r in rows)
+    total_target_contribution = sum(flt(r.target_contribution) for r in rows)
+    transaction_count = sum(r.trips for r in rows)
+
+    contribution_by_driver = {r.driver: flt(r.target_contribution) for r in rows if r.driver and r.trips}
+    drivers_at_target = len([d for d, c in contribution_by_driver.items() if c >= target_threshold])
+    total_drivers = len(contribution_by_driver) or 1
+
+    inactive_drivers = 0
+    drivers_below_target_list = []
+    drivers_at_risk_list = []
+    driver_statuses = []
+    for d in drivers:
+        if not d.assigned_tuktuk:
+            inactive_drivers += 1
+            continue
+        driver_target = flt(d.daily_target) or target_threshold
+        achieved = contribution_by_driver.get(d.name, 0)
+        target_met = achieved >= driver_target
+        at_risk = (d.consecutive_misses or 0) >= 2
+        if not target_met:
+            drivers_below_target_list.append(d.name)
+        if at_risk:
+            drivers_at_risk_list.append(d.name)
+        driver_statuses.append({
+            "driver": d.name,
+            "daily_target": driver_target,
+            "achieved": achieved,
+            "target_met": target_met,
+            "at_risk": at_risk,
+            "consecutive_misses": d.consecutive_misses or 0,
+        })
+
+    return {
+        "report_date": report_date,
+        "total_revenue": total_revenue,
+        "total_driver_payments": total_driver_share,
+        "total_target_contributions": total_target_contribution,
+        "transaction_count": transaction_count,
+        "drivers_at_target": drivers_at_target,
+        "total_drivers": total_drivers,
+        "target_achievement_rate": drivers_at_target / total_drivers * 100,
+        "inactive_drivers": inactive_drivers,
+        "drivers_below_target": len(drivers_below_target_list),
+        "drivers_below_target_list": drivers_below_target_list,
+        "drivers_at_risk": len(drivers_at_risk_list),
+        "drivers_at_risk_list": drivers_at_risk_list,
+        "active_tuktuks": vehicle_counts.get("Assigned", 0),
+        "available_tuktuks": vehicle_counts.get("Available", 0),
+        "charging_tuktuks": vehicle_counts.get("Charging", 0),
+        "contribution_by_driver": contribution_by_driver,
+        "driver_statuses": driver_statuses,
+        "target_threshold": target_threshold,
+    }
+
+
+def build_daily_report_text(metrics):
+    """Plain-text daily report used for the email and the saved report_text"""
+    m = frappe._dict(metrics)
+    return f"""
+📊 SUNNY TUKTUK DAILY REPORT - {m.report_date}
+
+💰 FINANCIAL SUMMARY:
+- Total Revenue: {m.total_revenue:,.0f} KSH
+- Driver Payments: {m.total_driver_payments:,.0f} KSH
+- Target Contributions: {m.total_target_contributions:,.0f} KSH
+- Transaction Count: {m.transaction_count}
+
+👥 DRIVER PERFORMANCE:
+- Drivers at Target: {m.drivers_at_target}
+- Target Achievement Rate: {m.target_achievement_rate:.1f}%
+- Inactive Drivers: {m.inactive_drivers}
+
+⚠️ NEEDS ATTENTION:
+- Drivers who did not meet target: {m.drivers_below_target}
+- Drivers with consecutive misses (≥2): {m.drivers_at_risk}
+
+🚗 FLEET STATUS:
+- Active TukTuks: {m.active_tuktuks}
+- Available TukTuks: {m.available_tuktuks}
+- Charging TukTuks: {m.charging_tuktuks}
+        """
+
+
+def save_daily_report(metrics, report_text, email_sent=True):
+    """Create or update the TukTuk Daily Report for metrics['report_date']"""
+    report_date = metrics["report_date"]
+    existing_report = frappe.db.exists("TukTuk Daily Report", {"report_date": report_date})
+
+    if existing_report:
+        daily_report = frappe.get_doc("TukTuk Daily Report", existing_report)
+    else:
+        daily_report = frappe.new_doc("TukTuk Daily Report")
+        daily_report.report_date = report_date
+
+    daily_report.total_revenue = metrics["total_revenue"]
+    daily_report.total_driver_share = metrics["total_driver_payments"]
+    daily_report.total_target_contribution = metrics["total_target_contributions"]
+    daily_report.total_transactions = metrics["transaction_count"]
+    daily_report.drivers_at_target = metrics["drivers_at_target"]
+    daily_report.total_drivers = metrics["total_drivers"]
+    daily_report.target_achievement_rate = metrics["target_achievement_rate"]
+    daily_report.inactive_drivers = metrics["inactive_drivers"]
+    daily_report.drivers_below_target = metrics["drivers_below_target"]
+    daily_report.drivers_at_risk = metrics["drivers_at_risk"]
+    daily_report.active_tuktuks = metrics["active_tuktuks"]
+    daily_report.available_tuktuks = metrics["available_tuktuks"]
+    daily_report.charging_tuktuks = metrics["charging_tuktuks"]
+    daily_report.report_text = report_text
+
+    if email_sent:
+        daily_report.email_sent = 1
+        daily_report.email_sent_at = now()
+
+    # Driver lists (Long Text fields - comma-separated)
+    daily_report.drivers_below_target_list = ", ".join(metrics["drivers_below_target_list"])
+    daily_report.drivers_at_risk_list = ", ".join(metrics["drivers_at_risk_list"])
+
+    daily_report.save(ignore_permissions=True)
+
+    # Normalised per-driver rows behind weekly / monthly / per-driver queries
+    save_day_statuses(report_date, metrics["driver_statuses"])
+    return daily_report
+
+
+# ===== HISTORICAL BACKFILL =====
+
+BACKFILL_CHUNK_DAYS = 31
+
+_REPORT_FIELDS = (
+    "name", "creation", "modified", "modified_by", "owner", "docstatus", "idx",
+    "report_date", "total_revenue", "total_driver_share", "total_target_contribution",
+    "total_transactions", "drivers_at_target", "total_drivers", "target_achievement_rate",
+    "inactive_drivers", "drivers_below_target", "drivers_below_target_list",
+    "drivers_at_risk", "drivers_at_risk_list", "active_tuktuks", "available_tuktuks",
+    "charging_tuktuks", "report_text", "email_sent", "email_sent_at",
+)
+
+
+def get_totals_by_day(from_date, to_date, table=None):
+    """
+    One grouped pass over [from_date, to_date]: Completed ride totals per
+    (business date, driver or substitute).
+
+    Returns:
+        dict: {business_date: [rows with driver, trips, revenue, driver_share, target_contribution]}
+    """
+    range_start = get_business_day_range(from_date)[0]
+    range_end = get_business_day_range(to_date)[1]
+    source = f"`{table}`" if table else transaction_source(range_start)
+
+    rows = frappe.db.sql(f"""
+        SELECT
+            DATE(timestamp) AS business_date,
+            NULLIF(driver, '') AS driver,
+            COUNT(*) AS trips,
+            SUM(amount) AS revenue,
+            SUM(driver_share) AS driver_share,
+            SUM(target_contribution) AS target_contribution
+        FROM {source} t
+        WHERE timestamp >= %s
+          AND timestamp < %s
+          AND payment_status = 'Completed'
+          AND transaction_type NOT IN %s
+        GROUP BY business_date, NULLIF(driver, ''), COALESCE(NULLIF(driver, ''), substitute_driver)
+    """, (range_start, range_end, EXCLUDED_TYPES), as_dict=True)
+
+    by_day = {}
+    for row in rows:
+        by_day.setdefault(getdate(row.business_date), []).append(row)
+    return by_day
+
+
+def _previous_streaks(before_date):
+    """Consecutive-miss streak of each driver going into before_date, from the day status table"""
+    rows = frappe.db.sql("""
+        SELECT driver, target_met, consecutive_misses
+        FROM `tabTukTuk Driver Day Status`
+        WHERE business_date = %s
+    """, (add_days(before_date, -1),), as_dict=True)
+    return {r.driver: 0 if r.target_met else (r.consecutive_misses or 0) + 1 for r in rows}
+
+
+def _flush_reports(reports, statuses, existing):
+    """Replace the chunk's daily reports and driver statuses in bulk"""
+    replaced = tuple(existing[day].name for day in reports if day in existing)
+    if replaced:
+        frappe.db.sql("DELETE FROM `tabTukTuk Daily Report` WHERE name IN %s", (replaced,))
+    frappe.db.bulk_insert("TukTuk Daily Report", _REPORT_FIELDS, list(reports.values()))
+    for report_date, day_statuses in statuses.items():
+        save_day_statuses(report_date, day_statuses)
+    frappe.db.commit()
+
+
+def backfill_daily_reports(from_date, to_date, user=None):
+    """
+    Rebuild TukTuk Daily Report records (and their driver day statuses) for a
+    date range from one grouped pass over transactions. No emails are sent;
+    existing reports keep their name and email flags.
+
+    Driver history is not stored, so the evaluated drivers of a day are those
+    already recorded in the day status table for it (else the currently assigned
+    drivers), and at-risk is rebuilt from the miss streak across the range.
+    Fleet counts of existing reports are kept; new reports use current counts.
+
+        bench --site <site> execute tuktuk_management.api.daily_report.backfill_daily_reports --kwargs "{'from_date': '2026-01-01', 'to_date': '2026-01-31'}"
+    """
+    from frappe.model.naming import make_autoname
+
+    from_date, to_date = getdate(from_date), getdate(to_date)
+    if to_date < from_date:
+        frappe.throw(f"to_date ({to_date}) cannot be before from_date ({from_date})")
+
+    target_threshold = flt(frappe.db.get_single_value("TukTuk Settings", "global_daily_target")) or 3000
+    drivers = frappe.db.sql("""
+        SELECT name, assigned_tuktuk, daily_target
+        FROM `tabTukTuk Driver`
+    """, as_dict=True)
+    targets = {d.name: d.daily_target for d in drivers}
+    vehicle_counts = get_vehicle_status_counts()
+
+    totals = get_totals_by_day(from_date, to_date)
+    existing = {
+        getdate(r.report_date): r
+        for r in frappe.db.sql("""
+            SELECT name, report_date, active_tuktuks, available_tuktuks, charging_tuktuks,
+                   email_sent, email_sent_at
+            FROM `tabTukTuk Daily Report`
+            WHERE report_date BETWEEN %s AND %s
+        """, (from_date, to_date), as_dict=True)
+    }
+    evaluated = {}
+    for r in frappe.db.sql("""
+        SELECT business_date, driver
+        FROM `tabTukTuk Driver Day Status`
+        WHERE business_date BETWEEN %s AND %s
+    """, (from_date, to_date), as_dict=True):
+        evaluated.setdefault(getdate(r.business_date), []).append(r.driver)
+
+    streaks = _previous_streaks(from_date)
+    total_days = (to_date - from_date).days + 1
+    timestamp = now()
+    owner = user or (frappe.session.user if frappe.session else "Administrator")
+    reports, statuses = {}, {}
+
+    for offset in range(total_days):
+        report_date = getdate(add_days(from_date, offset))
+        current = existing.get(report_date)
+
+        names = evaluated.get(report_date) or [d.name for d in drivers if d.assigned_tuktuk]
+        day_drivers = [
+            frappe._dict(
+                name=name,
+                assigned_tuktuk=1,
+                daily_target=targets.get(name),
+                consecutive_misses=streaks.get(name, 0),
+            )
+            for name in names
+        ]
+        day_drivers += [
+            frappe._dict(name=d.name, assigned_tuktuk=None) for d in drivers if d.name not in names
+        ]
+
+        counts = vehicle_counts
+        if current:
+            counts = {
+                "Assigned": current.active_tuktuks,
+                "Available": current.available_tuktuks,
+                "Charging": current.charging_tuktuks,
+            }
+
+        metrics = build_daily_metrics(report_date, totals.get(report_date, []), day_drivers, target_threshold, counts)
+        for status in metrics["driver_statuses"]:
+            streaks[status["driver"]] = 0 if status["target_met"] else status["consecutive_misses"] + 1
+
+        reports[report_date] = (
+            current.name if current else make_autoname("hash", "TukTuk Daily Report"),
+            timestamp, timestamp, owner, owner, 0, 0,
+            report_date, metrics["total_revenue"], metrics["total_driver_payments"],
+            metrics["total_target_contributions"], metrics["transaction_count"],
+            metrics["drivers_at_target"], metrics["total_drivers"], metrics["target_achievement_rate"],
+            metrics["inactive_drivers"], metrics["drivers_below_target"],
+            ", ".join(metrics["drivers_below_target_list"]),
+            metrics["drivers_at_risk"], ", ".join(metrics["drivers_at_risk_list"]),
+            metrics["active_tuktuks"], metrics["available_tuktuks"], metrics["charging_tuktuks"],
+            build_daily_report_text(metrics),
+            current.email_sent if current else 0,
+            current.email_sent_at if current else None,
+        )
+        statuses[report_date] = metrics["driver_statuses"]
+
+        if len(reports) == BACKFILL_CHUNK_DAYS or offset == total_days - 1:
+            _flush_reports(reports, statuses, existing)
+            reports, statuses = {}, {}
+            if user:
+                frappe.publish_realtime(
+                    "daily_report_backfill_progress",
+                    {"progress": offset + 1, "total": total_days, "report_date": str(report_date)},
+                    user=user,
+                )
+
+    return total_days
+
+
+@frappe.whitelist()
+def enqueue_daily_report_backfill(from_date, to_date):
+    """Rebuild the daily reports of a date range in the background; progress is sent over realtime"""
+    frappe.only_for(["System Manager", "Tuktuk Manager"])
+
+    from tuktuk_management.utils.job_queues import enqueue_job, REPORTS
+
+    enqueue_job(
+        "tuktuk_management.api.daily_report.backfill_daily_reports",
+        queue=REPORTS,
+        dedupe_key=f"daily_report_backfill::{getdate(from_date)}::{getdate(to_date)}",
+        from_date=getdate(from_date),
+        to_date=getdate(to_date),
+        user=frappe.session.user,
+    )
+    return {"success": True, "message": f"Daily report backfill for {from_date} to {to_date} queued"}
@@ -0,0 +1,168 @@
+# ~/frappe-bench/apps/tuktuk_management/tuktuk_management/api/deposit_liability.py
+"""
+Fleet-wide deposit liability
+
+The liability as of a date is the cumulative total of every Driver Deposit
+Transaction up to and including that date: deposited, deducted (target and
+damage deductions), refunded, and the net amount still held. Archived drivers
+keep their rows under Terminated TukTuk Driver and are included.
+
+Month-end totals are stored as TukTuk Deposit Liability Snapshot checkpoints,
+so a snapshot for any date reads the nearest earlier checkpoint and only
+aggregates the deposit rows dated after it. A deposit row added, changed or
+removed on or before a checkpoint's date deletes that checkpoint and every later
+one (invalidate_liability_snapshots); the monthly job re-creates the missing
+month ends.
+"""
+
+import frappe
+from frappe.utils import add_days, flt, get_first_day, get_last_day, getdate, now, today
+
+from tuktuk_management.utils.job_lock import mark_failed, single_flight
+
+SNAPSHOT_DOCTYPE = "TukTuk Deposit Liability Snapshot"
+SNAPSHOT_TABLE = "tabTukTuk Deposit Liability Snapshot"
+PARENT_TYPES = ("TukTuk Driver", "Terminated TukTuk Driver")
+TOTAL_FIELDS = ("total_deposited", "total_deducted", "total_refunded", "total_held")
+
+
+def _deposit_totals(after_date, to_date):
+    """Grouped totals of deposit rows dated in (after_date, to_date]; after_date None = from the start"""
+    conditions = "transaction_date <= %(to_date)s"
+    if after_date:
+        conditions += " AND transaction_date > %(after_date)s"
+
+    totals = frappe.db.sql(f"""
+        SELECT
+            COALESCE(SUM(CASE WHEN amount > 0 AND transaction_type != 'Refund' THEN amount ELSE 0 END), 0) AS total_deposited,
+            COALESCE(SUM(CASE WHEN amount < 0 AND transaction_type != 'Refund' THEN -amount ELSE 0 END), 0) AS total_deducted,
+            COALESCE(SUM(CASE WHEN transaction_type = 'Refund' THEN ABS(amount) ELSE 0 END), 0) AS total_refunded
+        FROM `tabDriver Deposit Transaction`
+        WHERE parenttype IN %(parent_types)s
+          AND {conditions}
+    """, {
+        "parent_types": PARENT_TYPES,
+        "after_date": getdate(after_date) if after_date else None,
+        "to_date": getdate(to_date),
+    }, as_dict=True)[0]
+
+    return frappe._dict({field: flt(totals.get(field)) for field in TOTAL_FIELDS if field != "total_held"})
+
+
+def get_deposit_liability(as_of_date=None):
+    """
+    Deposit liability as of the end of as_of_date.
+
+    Returns:
+        dict: as_of_date, total_deposited, total_deducted, total_refunded, total_held
+    """
+    as_of_date = getdate(as_of_date or today())
+
+    checkpoint = frappe.db.sql(f"""
+        SELECT snapshot_date, total_deposited, total_deducted, total_refunded
+        FROM `{SNAPSHOT_TABLE}`
+        WHERE snapshot_date <= %s
+        ORDER BY snapshot_date DESC
+        LIMIT 1
+    """, (as_of_date,), as_dict=True)
+    checkpoint = checkpoint[0] if checkpoint else None
+
+    if checkpoint and getdate(checkpoint.snapshot_date) == as_of_date:
+        totals = frappe._dict(total_deposited=0, total_deducted=0, total_refunded=0)
+    else:
+        totals = _deposit_totals(checkpoint.snapshot_date if checkpoint else None, as_of_date)
+
+    if checkpoint:
+        for field in ("total_deposited", "total_deducted", "total_refunded"):
+            totals[field] = flt(totals[field]) + flt(checkpoint.get(field))
+
+    totals.total_held = flt(totals.total_deposited - totals.total_deducted - totals.total_refunded, 2)
+    totals.as_of_date = as_of_date
+    return totals
+
+
+def record_liability_snapshot(snapshot_date=None):
+    """
+    Store the checkpoint for snapshot_date (default: last month end).
+    Idempotent: re-running replaces the day's checkpoint.
+    """
+    snapshot_date = getdate(snapshot_date or add_days(get_first_day(today()), -1))
+
+    # Compute from the previous checkpoint, never from this date's own row
+    frappe.db.sql(f"DELETE FROM `{SNAPSHOT_TABLE}` WHERE snapshot_date = %s", (snapshot_date,))
+    totals = get_deposit_liability(snapshot_date)
+
+    user = frappe.session.user if frappe.session else "Administrator"
+    frappe.db.sql(f"""
+        INSERT INTO `{SNAPSHOT_TABLE}`
+            (name, creation, modified, modified_by, owner, docstatus, idx,
+             snapshot_date, total_deposited, total_deducted, total_refunded, total_held)
+        VALUES
+            (%(name)s, %(now)s, %(now)s, %(user)s, %(user)s, 0, 0,
+             %(snapshot_date)s, %(total_deposited)s, %(total_deducted)s, %(total_refunded)s, %(total_held)s)
+    """, {
+        "name": str(snapshot_date),
+        "now": now(),
+        "user": user,
+        "snapshot_date": snapshot_date,
+        "total_deposited": totals.total_deposited,
+        "total_deducted": totals.total_deducted,
+        "total_refunded": totals.total_refunded,
+        "total_held": totals.total_held,
+    })
+    frappe.db.commit()
+    return totals
+
+
+def invalidate_liability_snapshots(changed_date):
+    """Drop the checkpoints that include a deposit row dated changed_date"""
+    frappe.db.sql(f"DELETE FROM `{SNAPSHOT_TABLE}` WHERE snapshot_date >= %s", (getdate(changed_date),))
+
+
+def _record_month_ends(month_end):
+    """Checkpoint every month end from month_end to the last completed month, oldest first"""
+    last_month_end = add_days(get_first_day(today()), -1)
+    month_end = get_last_day(month_end)
+    count = 0
+    while month_end <= last_month_end:
+        record_liability_snapshot(month_end)
+        count += 1
+        month_end = get_last_day(add_days(month_end, 1))
+    return count
+
+
+@single_flight()
+def record_month_end_liability_snapshot():
+    """
+    Monthly scheduler entry: checkpoint the month that just ended, plus any
+    month end after the latest checkpoint that was invalidated since.
+    """
+    try:
+        latest = frappe.db.sql(f"SELECT MAX(snapshot_date) FROM `{SNAPSHOT_TABLE}`")[0][0]
+        if latest:
+            _record_month_ends(add_days(latest, 1))
+        else:
+            backfill_liability_snapshots()
+    except Exception as e:
+        frappe.db.rollback()
+        frappe.log_error(f"Deposit liability snapshot failed: {str(e)}", "Deposit Liability Error")
+        mark_failed(e)
+
+
+def backfill_liability_snapshots():
+    """Checkpoint every completed month since the first deposit transaction, oldest first"""
+    first_date = frappe.db.sql("""
+        SELECT MIN(transaction_date)
+        FROM `tabDriver Deposit Transaction`
+        WHERE parenttype IN %s
+    """, (PARENT_TYPES,))[0][0]
+    if not first_date:
+        return 0
+    return _record_month_ends(first_date)
+
+
+@frappe.whitelist()
+def get_deposit_liability_snapshot(as_of_date=None):
+    """Fleet-wide deposit liability (held, deducted, refunded) as of a date"""
+    frappe.only_for(["System Manager", "Tuktuk Manager"])
+    return get_deposit_liability(as_of_date)
@@ -7,6 +7,8 @@ import re
 import random
 import string
 
+from tuktuk_management.api.driver_rollup import get_party_day_totals
+
 # ===== TUKTUK DRIVER USER ACCOUNT MANAGEMENT =====
 
 @frappe.whitelist()
@@ -242,18 +244,10 @@ def get_tuktuk_driver_dashboard_data():
         for rental in rentals:
             rental.start_time_formatted = format_datetime(rental.start_time, "dd MMM yyyy, hh:mm a")
         
-        # Calculate today's earnings
-        today_transactions = frappe.get_all("TukTuk Transaction",
-                                           filters={
-                                               "driver": tuktuk_driver.name,
-                                               "timestamp": [">=", today()],
-                                               "payment_status": "Completed",
-                                               "transaction_type": ["not in", ["Adjustment", "Driver Repayment"]]  # Exclude adjustments and repayments from earnings
-                                           },
-                                           fields=["driver_share", "target_contribution"])
-        
-        today_earnings = sum([t.driver_share for t in today_transactions])
-        today_target_contribution = sum([t.target_contribution for t in today_transactions])
+        # Calculate today's earnings from the daily rollup (adjustments and repayments excluded)
+        today_totals = get_party_day_totals(tuktuk_driver.name, today())
+        today_earnings = today_totals.driver_share
+        today_target_contribution = today_totals.target_contribution
         
         # Get settings for target calculation
         settings = frappe.get_single("TukTuk Settings")
@@ -395,19 +389,11 @@ def get_driver_performance_data():
         tuktuk_driver = get_current_tuktuk_driver()
         settings = frappe.get_single("TukTuk Settings")
         
-        # Calculate today's performance
-        today_transactions = frappe.get_all("TukTuk Transaction",
-                                           filters={
-                                               "driver": tuktuk_driver.name,
-                                               "timestamp": [">=", today()],
-                                               "payment_status": "Completed",
-                                               "transaction_type": ["not in", ["Adjustment", "Driver Repayment"]]
-                                           },
-                                           fields=["driver_share", "target_contribution", "amount"])
-        
-        today_earnings = sum([t.driver_share for t in today_transactions])
-        today_target_contribution = sum([t.target_contribution for t in today_transactions])
-        today_total = sum([t.amount for t in today_transactions])
+        # Calculate today's performance from the daily rollup
+        today_totals = get_party_day_totals(tuktuk_driver.name, today())
+        today_earnings = today_totals.driver_share
+        today_target_contribution = today_totals.target_contribution
+        today_total = today_totals.revenue
         
         daily_target = tuktuk_driver.daily_target or settings.global_daily_target
         current_balance = tuktuk_driver.current_balance or 0
@@ -420,7 +406,7 @@ def get_driver_performance_data():
             "today_earnings": today_earnings,
             "today_target_contribution": today_target_contribution,
             "today_total": today_total,
-            "today_transaction_count": len(today_transactions),
+            "today_transaction_count": today_totals.trips,
             "operating_hours": {
                 "start": settings.operating_hours_start,
                 "end": settings.operating_hours_end
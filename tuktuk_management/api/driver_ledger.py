@@ -0,0 +1,226 @@
+# ~/frappe-bench/apps/tuktuk_management/tuktuk_management/api/driver_ledger.py
+"""
+Append-only driver balance ledger
+
+Every change to a driver's current_balance or current_deposit_balance is
+recorded as a TukTuk Driver Ledger Entry with its delta and the resulting
+balances. Raw-SQL balance updates (payments, Sunny ID repayments, fixes) call
+record_ledger_event() right after their UPDATE, in the same DB transaction, so
+the recorded balance_after is exactly the value the UPDATE produced. Balance
+changes made by saving the driver document (deposit operations, payouts, the
+daily reset) are recorded by the on_update hook from the doc before save.
+
+At each daily reset every driver gets a checkpoint entry. Verification then
+only replays the entries since the latest checkpoint, and a balance at any past
+time is the balance_after of the last entry at or before it. left_to_target is
+not ledgered: it is derived from the balance and the effective target.
+"""
+
+import frappe
+from frappe.model.naming import make_autoname
+from frappe.utils import flt, get_datetime, now
+
+LEDGER_DOCTYPE = "TukTuk Driver Ledger Entry"
+LEDGER_TABLE = f"tab{LEDGER_DOCTYPE}"
+LEDGER_FIELDS = (
+    "name", "creation", "modified", "modified_by", "owner", "docstatus", "idx",
+    "posting_time", "driver", "event_type", "is_checkpoint",
+    "balance_delta", "balance_after", "deposit_delta", "deposit_after",
+    "reference_doctype", "reference_name", "remarks",
+)
+
+
+def _user():
+    return frappe.session.user if frappe.session else "Administrator"
+
+
+def record_ledger_events(events):
+    """
+    Append ledger entries for balance updates that were just applied.
+
+    Args:
+        events: dicts with driver, event_type and optionally balance_delta,
+            deposit_delta, reference_doctype, reference_name, remarks.
+            Passing balance_before instead of balance_delta derives the delta
+            from the balance now stored (for updates that recompute the balance).
+    """
+    events = [e for e in events if e.get("driver")]
+    if not events:
+        return
+
+    current = {
+        r.name: r
+        for r in frappe.db.sql("""
+            SELECT name, current_balance, current_deposit_balance
+            FROM `tabTukTuk Driver`
+            WHERE name IN %s
+        """, (tuple({e["driver"] for e in events}),), as_dict=True)
+    }
+
+    timestamp, user = now(), _user()
+    values = []
+    for event in events:
+        driver = current.get(event["driver"])
+        if not driver:
+            continue
+        balance_after = flt(driver.current_balance)
+        if event.get("balance_before") is not None:
+            balance_delta = balance_after - flt(event["balance_before"])
+        else:
+            balance_delta = flt(event.get("balance_delta"))
+        values.append((
+            make_autoname("hash", LEDGER_DOCTYPE), timestamp, timestamp, user, user, 0, 0,
+            timestamp, event["driver"], event["event_type"], 0,
+            flt(balance_delta, 2), balance_after,
+            flt(event.get("deposit_delta"), 2), flt(driver.current_deposit_balance),
+            event.get("reference_doctype"), event.get("reference_name"), event.get("remarks"),
+        ))
+
+    if values:
+        frappe.db.bulk_insert(LEDGER_DOCTYPE, LEDGER_FIELDS, values)
+
+
+def record_ledger_event(driver, event_type, balance_delta=0, deposit_delta=0,
+                        reference_doctype=None, reference_name=None, remarks=None):
+    """Append one ledger entry for a balance update applied in the current DB transaction"""
+    record_ledger_events([{
+        "driver": driver,
+        "event_type": event_type,
+        "balance_delta": balance_delta,
+        "deposit_delta": deposit_delta,
+        "reference_doctype": reference_doctype,
+        "reference_name": reference_name,
+        "remarks": remarks,
+    }])
+
+
+def on_driver_update(doc, method=None):
+    """
+    doc_events hook (TukTuk Driver on_update): ledger balance changes made by
+    saving the document. Callers name the event with doc.flags.ledger_event.
+    """
+    before = doc.get_doc_before_save()
+    # Compare with what was stored, not the in-memory doc
+    stored = frappe.db.get_value(
+        "TukTuk Driver", doc.name, ["current_balance", "current_deposit_balance"], as_dict=True
+    )
+    balance_delta = flt(stored.current_balance) - flt(before.current_balance if before else 0)
+    deposit_delta = flt(stored.current_deposit_balance) - flt(before.current_deposit_balance if before else 0)
+    if abs(balance_delta) < 0.005 and abs(deposit_delta) < 0.005:
+        return
+
+    record_ledger_event(
+        doc.name,
+        doc.flags.ledger_event or "Manual Change",
+        balance_delta=balance_delta,
+        deposit_delta=deposit_delta,
+        remarks=doc.flags.ledger_remarks,
+    )
+
+
+def record_checkpoints(remarks=None):
+    """Checkpoint every driver's stored balances (one statement; run at the daily reset)"""
+    timestamp, user = now(), _user()
+    frappe.db.sql(f"""
+        INSERT INTO `{LEDGER_TABLE}`
+            (name, creation, modified, modified_by, owner, docstatus, idx,
+             posting_time, driver, event_type, is_checkpoint,
+             balance_delta, balance_after, deposit_delta, deposit_after, remarks)
+        SELECT
+            CONCAT('CKPT-', name, '-', DATE_FORMAT(%(now)s, '%%Y%%m%%d%%H%%i%%s%%f')),
+            %(now)s, %(now)s, %(user)s, %(user)s, 0, 0,
+            %(now)s, name, 'Checkpoint', 1,
+            0, COALESCE(current_balance, 0), 0, COALESCE(current_deposit_balance, 0), %(remarks)s
+        FROM `tabTukTuk Driver`
+    """, {"now": timestamp, "user": user, "remarks": remarks})
+
+
+def _latest_checkpoints_sql(driver_condition=""):
+    return f"""
+        SELECT c.driver, c.posting_time, c.balance_after, c.deposit_after
+        FROM `{LEDGER_TABLE}` c
+        JOIN (
+            SELECT driver, MAX(posting_time) AS posting_time
+            FROM `{LEDGER_TABLE}`
+            WHERE is_checkpoint = 1 {driver_condition}
+            GROUP BY driver
+        ) latest ON latest.driver = c.driver AND latest.posting_time = c.posting_time
+        WHERE c.is_checkpoint = 1
+    """
+
+
+def verify_ledgers(driver=None):
+    """
+    Compare every driver's stored balances with latest checkpoint + deltas since.
+
+    Returns:
+        list: one dict per driver with stored, ledger and difference figures
+    """
+    params = {}
+    driver_condition, where = "", ""
+    if driver:
+        driver_condition = "AND driver = %(driver)s"
+        where = "WHERE d.name = %(driver)s"
+        params["driver"] = driver
+
+    rows = frappe.db.sql(f"""
+        SELECT
+            d.name AS driver,
+            d.current_balance AS stored_balance,
+            d.current_deposit_balance AS stored_deposit,
+            cp.posting_time AS checkpoint_time,
+            COALESCE(cp.balance_after, 0) + COALESCE(SUM(e.balance_delta), 0) AS ledger_balance,
+            COALESCE(cp.deposit_after, 0) + COALESCE(SUM(e.deposit_delta), 0) AS ledger_deposit,
+            COUNT(e.name) AS events_since_checkpoint
+        FROM `tabTukTuk Driver` d
+        LEFT JOIN ({_latest_checkpoints_sql(driver_condition)}) cp ON cp.driver = d.name
+        LEFT JOIN `{LEDGER_TABLE}` e
+            ON e.driver = d.name
+            AND e.is_checkpoint = 0
+            AND (cp.posting_time IS NULL OR e.posting_time > cp.posting_time)
+        {where}
+        GROUP BY d.name, d.current_balance, d.current_deposit_balance,
+                 cp.posting_time, cp.balance_after, cp.deposit_after
+        ORDER BY d.name
+    """, params, as_dict=True)
+
+    for row in rows:
+        row.balance_difference = flt(flt(row.stored_balance) - flt(row.ledger_balance), 2)
+        row.deposit_difference = flt(flt(row.stored_deposit) - flt(row.ledger_deposit), 2)
+        row.is_consistent = abs(row.balance_difference) <= 0.01 and abs(row.deposit_difference) <= 0.01
+    return rows
+
+
+@frappe.whitelist()
+def verify_driver_ledgers(driver=None):
+    """Ledger check of one driver (or all): only entries since the latest checkpoint are replayed"""
+    frappe.only_for(["System Manager", "Tuktuk Manager"])
+    rows = verify_ledgers(driver)
+    inconsistent = [r for r in rows if not r.is_consistent]
+    return {
+        "success": True,
+        "drivers_checked": len(rows),
+        "inconsistent": len(inconsistent),
+        "details": inconsistent if not driver else rows,
+    }
+
+
+def get_balance_at(driver, at):
+    """Target and deposit balance of the driver at datetime `at`, from the last ledger entry before it"""
+    row = frappe.db.sql(f"""
+        SELECT posting_time, balance_after, deposit_after
+        FROM `{LEDGER_TABLE}`
+        WHERE driver = %s AND posting_time <= %s
+        ORDER BY posting_time DESC, is_checkpoint DESC
+        LIMIT 1
+    """, (driver, get_datetime(at)), as_dict=True)
+    if not row:
+        return frappe._dict(balance=0, deposit=0, as_of=None)
+    return frappe._dict(balance=flt(row[0].balance_after), deposit=flt(row[0].deposit_after), as_of=row[0].posting_time)
+
+
+@frappe.whitelist()
+def get_driver_balance_at(driver, at):
+    """Whitelisted get_balance_at"""
+    frappe.only_for(["System Manager", "Tuktuk Manager"])
+    return get_balance_at(driver, at)
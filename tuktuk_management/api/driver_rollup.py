@@ -0,0 +1,285 @@
+# ~/frappe-bench/apps/tuktuk_management/tuktuk_management/api/driver_rollup.py
+"""
+Per-driver per-day earnings rollup
+
+`tabTukTuk Driver Daily Rollup` holds one row per (driver or substitute,
+business date) with the totals of that day's Completed TukTuk Transactions:
+trips, revenue, driver_share, target_contribution, adjustments and repayments.
+
+The rollup is kept current by the TukTuk Transaction controller (on_update /
+on_trash), i.e. in the same DB transaction as the payment insert. Updates are
+atomic upserts of deltas, so concurrent payments for the same driver never lose
+an increment. Dashboards, reports and reconciliation read these rows instead of
+summing the full transaction history.
+
+Rebuild from scratch (or for a date range) with:
+    bench --site <site> execute tuktuk_management.api.driver_rollup.rebuild_driver_daily_rollup
+"""
+
+import frappe
+from frappe.utils import add_days, add_months, flt, get_first_day, getdate, now, today
+
+from tuktuk_management.api.transaction_archive import transaction_source
+from tuktuk_management.utils.report_cache import clear_report_cache, invalidate_for_date
+
+ROLLUP_DOCTYPE = "TukTuk Driver Daily Rollup"
+ROLLUP_TABLE = "tabTukTuk Driver Daily Rollup"
+
+TOTAL_FIELDS = (
+    "trips", "revenue", "driver_share", "target_contribution",
+    "adjustments", "adjustment_amount", "repayments", "repayment_amount",
+)
+
+_UPSERT_SQL = f"""
+    INSERT INTO `{ROLLUP_TABLE}`
+        (name, creation, modified, modified_by, owner, docstatus, idx,
+         business_date, driver, substitute_driver,
+         trips, revenue, driver_share, target_contribution,
+         adjustments, adjustment_amount, repayments, repayment_amount)
+    VALUES
+        (%(name)s, %(now)s, %(now)s, %(user)s, %(user)s, 0, 0,
+         %(business_date)s, %(driver)s, %(substitute_driver)s,
+         %(trips)s, %(revenue)s, %(driver_share)s, %(target_contribution)s,
+         %(adjustments)s, %(adjustment_amount)s, %(repayments)s, %(repayment_amount)s)
+    ON DUPLICATE KEY UPDATE
+        trips = trips + VALUES(trips),
+        revenue = revenue + VALUES(revenue),
+        driver_share = driver_share + VALUES(driver_share),
+        target_contribution = target_contribution + VALUES(target_contribution),
+        adjustments = adjustments + VALUES(adjustments),
+        adjustment_amount = adjustment_amount + VALUES(adjustment_amount),
+        repayments = repayments + VALUES(repayments),
+        repayment_amount = repayment_amount + VALUES(repayment_amount),
+        modified = VALUES(modified)
+"""
+
+
+def rollup_name(party, business_date):
+    return f"{party}::{getdate(business_date)}"
+
+
+def _empty_totals():
+    return frappe._dict({field: 0 for field in TOTAL_FIELDS})
+
+
+def _transaction_deltas(doc):
+    """
+    Rollup row key and deltas a transaction contributes, or None if it
+    contributes nothing (not Completed, no driver, no timestamp).
+    """
+    if doc.get("payment_status") != "Completed" or not doc.get("timestamp"):
+        return None
+
+    driver = doc.get("driver") or None
+    substitute_driver = None if driver else (doc.get("substitute_driver") or None)
+    party = driver or substitute_driver
+    if not party:
+        return None
+
+    business_date = getdate(doc.get("timestamp"))
+    deltas = _empty_totals()
+    amount = flt(doc.get("amount"))
+
+    if doc.get("transaction_type") == "Adjustment":
+        deltas.adjustments = 1
+        deltas.adjustment_amount = amount
+    elif doc.get("transaction_type") == "Driver Repayment":
+        deltas.repayments = 1
+        deltas.repayment_amount = amount
+    else:
+        deltas.trips = 1
+        deltas.revenue = amount
+        deltas.driver_share = flt(doc.get("driver_share"))
+        deltas.target_contribution = flt(doc.get("target_contribution"))
+
+    deltas.update({
+        "name": rollup_name(party, business_date),
+        "business_date": business_date,
+        "driver": driver,
+        "substitute_driver": substitute_driver,
+    })
+    return deltas
+
+
+def _apply(deltas, sign):
+    values = dict(deltas)
+    for field in TOTAL_FIELDS:
+        values[field] = sign * values[field]
+    values["now"] = now()
+    values["user"] = frappe.session.user if frappe.session else "Administrator"
+    frappe.db.sql(_UPSERT_SQL, values)
+
+
+def on_transaction_update(doc, method=None):
+    """Move the transaction's contribution from its previous state to its current one"""
+    new = _transaction_deltas(doc)
+    before = doc.get_doc_before_save()
+    old = _transaction_deltas(before) if before else None
+
+    if old == new:
+        return
+    if old:
+        _apply(old, -1)
+        invalidate_for_date(old.business_date)
+    if new:
+        _apply(new, 1)
+        invalidate_for_date(new.business_date)
+
+
+def on_transaction_trash(doc, method=None):
+    deltas = _transaction_deltas(doc)
+    if deltas:
+        _apply(deltas, -1)
+        invalidate_for_date(deltas.business_date)
+
+
+# ===== READ HELPERS =====
+
+def get_party_day_totals(party, business_date=None):
+    """Totals of one driver or substitute for one business date (zeros if no row)"""
+    business_date = getdate(business_date or today())
+    row = frappe.db.get_value(
+        ROLLUP_DOCTYPE, rollup_name(party, business_date), list(TOTAL_FIELDS), as_dict=True
+    )
+    totals = _empty_totals()
+    if row:
+        totals.update({field: row.get(field) or 0 for field in TOTAL_FIELDS})
+    return totals
+
+
+def get_driver_range_totals(driver, from_date, to_date):
+    """Totals of a regular driver over [from_date, to_date] (business dates, inclusive)"""
+    sums = ", ".join(f"COALESCE(SUM({field}), 0) AS {field}" for field in TOTAL_FIELDS)
+    return frappe.db.sql(f"""
+        SELECT {sums}
+        FROM `{ROLLUP_TABLE}`
+        WHERE driver = %s
+          AND business_date BETWEEN %s AND %s
+    """, (driver, getdate(from_date), getdate(to_date)), as_dict=True)[0]
+
+
+def get_driver_daily_rows(driver, from_date, to_date):
+    """Per-day rollup rows of a regular driver over [from_date, to_date]"""
+    return frappe.db.sql(f"""
+        SELECT business_date, {", ".join(TOTAL_FIELDS)}
+        FROM `{ROLLUP_TABLE}`
+        WHERE driver = %s
+          AND business_date BETWEEN %s AND %s
+        ORDER BY business_date
+    """, (driver, getdate(from_date), getdate(to_date)), as_dict=True)
+
+
+def get_day_rows(business_date, table=ROLLUP_TABLE):
+    """Every rollup row (drivers and substitutes) for a business date"""
+    return frappe.db.sql(f"""
+        SELECT driver, substitute_driver, {", ".join(TOTAL_FIELDS)}
+        FROM `{table}`
+        WHERE business_date = %s
+    """, (getdate(business_date),), as_dict=True)
+
+
+# ===== BACKFILL =====
+
+def _rebuild_range(from_date, to_date, table=ROLLUP_TABLE, source_table=None):
+    """
+    Replace the rollup rows for [from_date, to_date] with one grouped pass over transactions.
+    table / source_table point the rebuild at scratch tables (benchmarks).
+    """
+    day_start = f"{getdate(from_date)} 00:00:00"
+    day_end = f"{add_days(to_date, 1)} 00:00:00"
+    source = f"`{source_table}`" if source_table else transaction_source(day_start)
+
+    frappe.db.sql(f"""
+        DELETE FROM `{table}`
+        WHERE business_date BETWEEN %s AND %s
+    """, (getdate(from_date), getdate(to_date)))
+
+    frappe.db.sql(f"""
+        INSERT INTO `{table}`
+            (name, creation, modified, modified_by, owner, docstatus, idx,
+             business_date, driver, substitute_driver,
+             trips, revenue, driver_share, target_contribution,
+             adjustments, adjustment_amount, repayments, repayment_amount)
+        SELECT
+            CONCAT(t.party, '::', t.business_date), %(now)s, %(now)s, %(user)s, %(user)s, 0, 0,
+            t.business_date, t.driver, t.substitute_driver,
+            t.trips, t.revenue, t.driver_share, t.target_contribution,
+            t.adjustments, t.adjustment_amount, t.repayments, t.repayment_amount
+        FROM (
+            SELECT
+                COALESCE(NULLIF(driver, ''), substitute_driver) AS party,
+                DATE(timestamp) AS business_date,
+                NULLIF(driver, '') AS driver,
+                CASE WHEN COALESCE(driver, '') = '' THEN substitute_driver END AS substitute_driver,
+                SUM(transaction_type NOT IN ('Adjustment', 'Driver Repayment')) AS trips,
+                SUM(CASE WHEN transaction_type NOT IN ('Adjustment', 'Driver Repayment') THEN amount ELSE 0 END) AS revenue,
+                SUM(CASE WHEN transaction_type NOT IN ('Adjustment', 'Driver Repayment') THEN driver_share ELSE 0 END) AS driver_share,
+                SUM(CASE WHEN transaction_type NOT IN ('Adjustment', 'Driver Repayment') THEN target_contribution ELSE 0 END) AS target_contribution,
+                SUM(transaction_type = 'Adjustment') AS adjustments,
+                SUM(CASE WHEN transaction_type = 'Adjustment' THEN amount ELSE 0 END) AS adjustment_amount,
+                SUM(transaction_type = 'Driver Repayment') AS repayments,
+                SUM(CASE WHEN transaction_type = 'Driver Repayment' THEN amount ELSE 0 END) AS repayment_amount
+            FROM {source} t
+            WHERE timestamp >= %(day_start)s
+              AND timestamp < %(day_end)s
+              AND payment_status = 'Completed'
+              AND COALESCE(NULLIF(driver, ''), substitute_driver) IS NOT NULL
+            GROUP BY party, business_date, driver, substitute_driver
+        ) t
+    """, {
+        "now": now(),
+        "user": frappe.session.user if frappe.session else "Administrator",
+        "day_start": day_start,
+        "day_end": day_end,
+    })
+
+
+def rebuild_driver_daily_rollup(from_date=None, to_date=None):
+    """
+    Rebuild the rollup from TukTuk Transaction, one calendar month per DB transaction.
+    Without dates the whole transaction history is rebuilt.
+    """
+    if not from_date or not to_date:
+        bounds = frappe.db.sql(f"""
+            SELECT DATE(MIN(timestamp)) AS first_day, DATE(MAX(timestamp)) AS last_day
+            FROM {transaction_source()} t
+        """, as_dict=True)[0]
+        if not bounds.first_day:
+            print("No transactions to roll up")
+            return 0
+        from_date = from_date or bounds.first_day
+        to_date = to_date or bounds.last_day
+
+    from_date, to_date = getdate(from_date), getdate(to_date)
+    if not from_date or not to_date:
+        return 0
+
+    chunk_start = from_date
+    months = 0
+    while chunk_start <= to_date:
+        chunk_end = min(add_days(add_months(get_first_day(chunk_start), 1), -1), to_date)
+        _rebuild_range(chunk_start, chunk_end)
+        frappe.db.commit()
+        clear_report_cache()
+        months += 1
+        print(f"Rolled up {chunk_start} → {chunk_end}")
+        chunk_start = getdate(add_days(chunk_end, 1))
+
+    return months
+
+
+@frappe.whitelist()
+def enqueue_rollup_rebuild(from_date=None, to_date=None):
+    """Rebuild the driver daily rollup in the background (reports queue)"""
+    frappe.only_for("System Manager")
+
+    from tuktuk_management.utils.job_queues import enqueue_job, REPORTS
+
+    enqueue_job(
+        "tuktuk_management.api.driver_rollup.rebuild_driver_daily_rollup",
+        queue=REPORTS,
+        dedupe_key=f"driver_rollup::{from_date}::{to_date}",
+        from_date=from_date,
+        to_date=to_date,
+    )
+    return {"success": True, "message": "Driver daily rollup rebuild queued"}
@@ -0,0 +1,354 @@
+# ~/frappe-bench/apps/tuktuk_management/tuktuk_management/api/driver_statement.py
+"""
+Driver statement engine
+
+Streams a driver's ride transactions and deposit movements in timestamp order.
+Both sources are read in keyset-paginated batches from sargable queries
+(driver + timestamp range on TukTuk Transaction, parent + transaction_date on
+Driver Deposit Transaction) and merged lazily, so memory use is bounded by the
+batch size rather than the statement length. The deposit balance and the
+driver's cumulative earnings are carried along as running figures.
+
+Used by the TukTuk Driver Statement report, the paginated statement API
+(get_statement_page), the background CSV/XLSX export and the bulk month-end
+statements (bulk_statements.py), which share the row columns and the
+DB-free with_running_figures() merge.
+"""
+
+import base64
+import csv
+import heapq
+import json
+import os
+
+import frappe
+from frappe import _
+from frappe.utils import add_days, cint, flt, get_datetime, getdate, now_datetime
+
+from tuktuk_management.api.transaction_archive import transaction_source
+
+BATCH_SIZE = 500
+MAX_PAGE_SIZE = 1000
+
+EXPORT_COLUMNS = [
+    ("posting_date", "Date"),
+    ("transaction_type", "Transaction Type"),
+    ("transaction_id", "Transaction ID"),
+    ("description", "Description"),
+    ("revenue", "Trip Revenue"),
+    ("driver_share", "Driver Share"),
+    ("target_contribution", "Target Contribution"),
+    ("deposit_amount", "Deposit Amount"),
+    ("balance_after", "Deposit Balance"),
+    ("running_earnings", "Running Earnings"),
+]
+
+
+# Statement row columns, shared by the per-driver and the bulk (all drivers) queries
+TRANSACTION_COLUMNS = """
+        DATE(tt.timestamp) as posting_date,
+        CASE
+            WHEN tt.transaction_type = 'Adjustment' THEN 'Adjustment Transaction'
+            WHEN tt.transaction_type = 'Driver Repayment' THEN 'Driver Repayment'
+            ELSE 'Ride Payment'
+        END as transaction_type,
+        tt.transaction_id,
+        tt.name as reference,
+        'TukTuk Transaction' as ref_doctype,
+        CASE
+            WHEN tt.transaction_type = 'Adjustment' THEN CONCAT('Adjustment: ', tt.customer_phone)
+            WHEN tt.transaction_type = 'Driver Repayment' THEN CONCAT('Driver Repayment: ', tt.customer_phone)
+            ELSE CONCAT('Customer: ', tt.customer_phone)
+        END as description,
+        tt.amount as revenue,
+        tt.driver_share,
+        tt.target_contribution,
+        0 as deposit_amount,
+        NULL as balance_after,
+        tt.timestamp as sort_timestamp
+"""
+
+DEPOSIT_COLUMNS = """
+        ddt.transaction_date as posting_date,
+        CONCAT('Deposit - ', ddt.transaction_type) as transaction_type,
+        ddt.transaction_reference as transaction_id,
+        ddt.parent as reference,
+        'TukTuk Driver' as ref_doctype,
+        COALESCE(ddt.description, ddt.transaction_type) as description,
+        0 as revenue,
+        0 as driver_share,
+        0 as target_contribution,
+        ddt.amount as deposit_amount,
+        ddt.balance_after_transaction as balance_after,
+        ddt.idx
+"""
+
+
+def tag_transaction_row(row):
+    row._key = (get_datetime(row.sort_timestamp), 0, row.reference)
+    row._position = ("t", str(row.sort_timestamp), row.reference)
+    return row
+
+
+def tag_deposit_row(row):
+    # Deposits sort after the day's rides, as in the original statement
+    row._key = (get_datetime(f"{row.posting_date} 23:59:59"), 1, row.idx)
+    row._position = ("d", str(row.posting_date), row.idx)
+    return row
+
+
+def _transaction_rows(driver, from_date, to_date, after=None):
+    """Completed transactions of the driver in timestamp order, fetched in batches"""
+    range_start = f"{getdate(from_date)} 00:00:00"
+    range_end = f"{add_days(to_date, 1)} 00:00:00"
+    last_ts, last_name = after or (None, None)
+    source = transaction_source(range_start)
+
+    while True:
+        keyset = ""
+        params = {"driver": driver, "range_start": range_start, "range_end": range_end, "limit": BATCH_SIZE}
+        if last_ts:
+            keyset = "AND (tt.timestamp > %(last_ts)s OR (tt.timestamp = %(last_ts)s AND tt.name > %(last_name)s))"
+            params.update({"last_ts": last_ts, "last_name": last_name})
+
+        rows = frappe.db.sql(f"""
+            SELECT
+                {TRANSACTION_COLUMNS}
+            FROM {source} tt
+            WHERE tt.driver = %(driver)s
+              AND tt.timestamp >= %(range_start)s
+              AND tt.timestamp < %(range_end)s
+              AND tt.payment_status = 'Completed'
+              {keyset}
+            ORDER BY tt.timestamp, tt.name
+            LIMIT %(limit)s
+        """, params, as_dict=1)
+
+        for row in rows:
+            yield tag_transaction_row(row)
+
+        if len(rows) < BATCH_SIZE:
+            return
+        last_ts, last_name = rows[-1].sort_timestamp, rows[-1].reference
+
+
+def _deposit_rows(driver, from_date, to_date, after=None):
+    """Deposit movements of the driver in date order, fetched in batches"""
+    last_date, last_idx = after or (None, None)
+
+    while True:
+        keyset = ""
+        params = {
+            "driver": driver,
+            "from_date": getdate(from_date),
+            "to_date": getdate(to_date),
+            "limit": BATCH_SIZE,
+        }
+        if last_date:
+            keyset = "AND (ddt.transaction_date > %(last_date)s OR (ddt.transaction_date = %(last_date)s AND ddt.idx > %(last_idx)s))"
+            params.update({"last_date": last_date, "last_idx": last_idx})
+
+        rows = frappe.db.sql(f"""
+            SELECT
+                {DEPOSIT_COLUMNS}
+            FROM `tabDriver Deposit Transaction` ddt
+            WHERE ddt.parent = %(driver)s
+              AND ddt.parenttype = 'TukTuk Driver'
+              AND ddt.transaction_date BETWEEN %(from_date)s AND %(to_date)s
+              {keyset}
+            ORDER BY ddt.transaction_date, ddt.idx
+            LIMIT %(limit)s
+        """, params, as_dict=1)
+
+        for row in rows:
+            yield tag_deposit_row(row)
+
+        if len(rows) < BATCH_SIZE:
+            return
+        last_date, last_idx = rows[-1].posting_date, rows[-1].idx
+
+
+def get_opening_deposit_balance(driver, from_date):
+    """Deposit balance after the last deposit movement before from_date"""
+    balance = frappe.db.sql("""
+        SELECT balance_after_transaction
+        FROM `tabDriver Deposit Transaction`
+        WHERE parent = %s
+          AND parenttype = 'TukTuk Driver'
+          AND transaction_date < %s
+        ORDER BY transaction_date DESC, idx DESC
+        LIMIT 1
+    """, (driver, getdate(from_date)))
+    return flt(balance[0][0]) if balance else 0.0
+
+
+def iter_statement(driver, from_date, to_date, cursor=None):
+    """
+    Yield statement rows in order with running figures.
+
+    Each yielded row carries `_cursor`: the opaque cursor to resume right after it.
+    """
+    state = decode_cursor(cursor) if cursor else {
+        "t": None,
+        "d": None,
+        "balance": get_opening_deposit_balance(driver, from_date),
+        "earnings": 0.0,
+    }
+
+    return with_running_figures(
+        _transaction_rows(driver, from_date, to_date, state["t"]),
+        _deposit_rows(driver, from_date, to_date, state["d"]),
+        state,
+    )
+
+
+def with_running_figures(transaction_rows, deposit_rows, state):
+    """
+    Merge tagged transaction and deposit rows (each already in order) and
+    carry the running deposit balance and earnings. Needs no DB access.
+    """
+    merged = heapq.merge(transaction_rows, deposit_rows, key=lambda row: row._key)
+
+    for row in merged:
+        source, position, tiebreak = row._position
+        if source == "d":
+            if row.balance_after is not None:
+                state["balance"] = flt(row.balance_after)
+            else:
+                state["balance"] += flt(row.deposit_amount)
+            state["d"] = [position, tiebreak]
+        else:
+            if row.transaction_type == "Ride Payment":
+                state["earnings"] += flt(row.driver_share)
+            state["t"] = [position, tiebreak]
+
+        row.balance_after = state["balance"]
+        row.running_earnings = state["earnings"]
+        row._cursor = encode_cursor(state)
+
+        for internal in ("_key", "_position", "sort_timestamp", "idx"):
+            row.pop(internal, None)
+        yield row
+
+
+def encode_cursor(state):
+    return base64.urlsafe_b64encode(json.dumps(state, default=str).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        return {
+            "t": state.get("t"),
+            "d": state.get("d"),
+            "balance": flt(state.get("balance")),
+            "earnings": flt(state.get("earnings")),
+        }
+    except Exception:
+        frappe.throw(_("Invalid statement cursor"))
+
+
+def _check_access(driver):
+    if not frappe.has_permission("TukTuk Driver", "read", doc=driver):
+        frappe.throw(_("Not permitted to view this driver's statement"), frappe.PermissionError)
+
+
+@frappe.whitelist()
+def get_statement_page(driver, from_date, to_date, cursor=None, page_size=100):
+    """
+    One page of a driver statement.
+
+    Returns:
+        dict: rows, next_cursor (None on the last page)
+    """
+    _check_access(driver)
+    page_size = min(max(cint(page_size), 1), MAX_PAGE_SIZE)
+
+    rows = []
+    next_cursor = None
+    for row in iter_statement(driver, from_date, to_date, cursor):
+        if len(rows) == page_size:
+            break
+        next_cursor = row.pop("_cursor")
+        rows.append(row)
+    else:
+        next_cursor = None
+
+    return {"rows": rows, "next_cursor": next_cursor}
+
+
+# ===== EXPORT =====
+
+@frappe.whitelist()
+def export_driver_statement(driver, from_date, to_date, file_format="CSV"):
+    """Queue a CSV/XLSX export; the file is attached to the driver and announced over realtime"""
+    _check_access(driver)
+    if file_format not in ("CSV", "XLSX"):
+        frappe.throw(_("File format must be CSV or XLSX"))
+
+    from tuktuk_management.utils.job_queues import enqueue_job, REPORTS
+
+    enqueue_job(
+        "tuktuk_management.api.driver_statement.build_statement_export",
+        queue=REPORTS,
+        dedupe_key=f"statement::{driver}::{from_date}::{to_date}::{file_format}",
+        driver=driver,
+        from_date=from_date,
+        to_date=to_date,
+        file_format=file_format,
+        user=frappe.session.user,
+    )
+    return {"success": True, "message": _("Statement export queued. You will be notified when it is ready.")}
+
+
+def _write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow([label for field, label in EXPORT_COLUMNS])
+        for row in rows:
+            writer.writerow([row.get(field) for field, label in EXPORT_COLUMNS])
+
+
+def _write_xlsx(path, rows):
+    from openpyxl import Workbook
+
+    # write_only workbooks stream rows to disk instead of building the sheet in memory
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Statement")
+    sheet.append([label for field, label in EXPORT_COLUMNS])
+    for row in rows:
+        sheet.append([row.get(field) for field, label in EXPORT_COLUMNS])
+    workbook.save(path)
+
+
+def build_statement_export(driver, from_date, to_date, file_format="CSV", user=None):
+    """Stream the statement straight to a private file and attach it to the driver"""
+    extension = "xlsx" if file_format == "XLSX" else "csv"
+    file_name = f"statement-{driver}-{getdate(from_date)}-{getdate(to_date)}-{now_datetime():%H%M%S}.{extension}"
+    path = frappe.get_site_path("private", "files", file_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    rows = iter_statement(driver, from_date, to_date)
+    if extension == "xlsx":
+        _write_xlsx(path, rows)
+    else:
+        _write_csv(path, rows)
+
+    file_doc = frappe.get_doc({
+        "doctype": "File",
+        "file_name": file_name,
+        "file_url": f"/private/files/{file_name}",
+        "is_private": 1,
+        "attached_to_doctype": "TukTuk Driver",
+        "attached_to_name": driver,
+    })
+    file_doc.insert(ignore_permissions=True)
+    frappe.db.commit()
+
+    if user:
+        frappe.publish_realtime(
+            "driver_statement_export_ready",
+            {"driver": driver, "file_url": file_doc.file_url, "file_name": file_name},
+            user=user,
+        )
+    return file_doc.file_url
@@ -0,0 +1,144 @@
+# ~/frappe-bench/apps/tuktuk_management/tuktuk_management/api/driver_status.py
+"""
+Per-day driver target status
+
+`tabTukTuk Driver Day Status` holds one row per (business date, assigned
+driver): the driver's target, the target contribution achieved, whether the
+target was met and whether the driver was at risk (two or more consecutive
+misses). Rows are written alongside the TukTuk Daily Report, so weekly, monthly
+and per-driver questions ("how many days did driver X miss this month") are
+indexed aggregates instead of re-parsing the report's comma-separated lists.
+"""
+
+import frappe
+from frappe.utils import cint, flt, getdate, now
+
+from tuktuk_management.api.driver_rollup import rollup_name
+
+STATUS_DOCTYPE = "TukTuk Driver Day Status"
+STATUS_TABLE = "tabTukTuk Driver Day Status"
+STATUS_FIELDS = (
+    "name", "creation", "modified", "modified_by", "owner", "docstatus", "idx",
+    "business_date", "driver", "daily_target", "achieved", "target_met", "at_risk", "consecutive_misses",
+)
+
+
+def save_day_statuses(business_date, statuses):
+    """
+    Replace the status rows of a business date.
+
+    Args:
+        business_date: Report date
+        statuses: iterable of dicts with driver, daily_target, achieved, target_met, at_risk, consecutive_misses
+    """
+    business_date = getdate(business_date)
+    timestamp = now()
+    user = frappe.session.user if frappe.session else "Administrator"
+
+    frappe.db.sql(f"DELETE FROM `{STATUS_TABLE}` WHERE business_date = %s", (business_date,))
+
+    values = [
+        (
+            rollup_name(s["driver"], business_date), timestamp, timestamp, user, user, 0, 0,
+            business_date, s["driver"], flt(s.get("daily_target")), flt(s.get("achieved")),
+            cint(s.get("target_met")), cint(s.get("at_risk")), cint(s.get("consecutive_misses")),
+        )
+        for s in statuses
+    ]
+    if values:
+        frappe.db.bulk_insert(STATUS_DOCTYPE, STATUS_FIELDS, values)
+
+
+def get_period_status(from_date, to_date):
+    """
+    Distinct drivers below target / at risk over [from_date, to_date].
+
+    Returns:
+        dict: drivers_below_target (sorted list), drivers_at_risk (sorted list)
+    """
+    rows = frappe.db.sql(f"""
+        SELECT
+            driver,
+            SUM(target_met = 0) AS missed_days,
+            SUM(at_risk) AS at_risk_days
+        FROM `{STATUS_TABLE}`
+        WHERE business_date BETWEEN %s AND %s
+        GROUP BY driver
+        ORDER BY driver
+    """, (getdate(from_date), getdate(to_date)), as_dict=True)
+
+    return frappe._dict(
+        drivers_below_target=[r.driver for r in rows if r.missed_days],
+        drivers_at_risk=[r.driver for r in rows if r.at_risk_days],
+    )
+
+
+def get_driver_status_totals(driver, from_date, to_date):
+    """Days evaluated, met, missed and at risk for one driver over [from_date, to_date]"""
+    return frappe.db.sql(f"""
+        SELECT
+            COUNT(*) AS days,
+            COALESCE(SUM(target_met), 0) AS met_days,
+            COALESCE(SUM(target_met = 0), 0) AS missed_days,
+            COALESCE(SUM(at_risk), 0) AS at_risk_days,
+            COALESCE(SUM(achieved), 0) AS achieved
+        FROM `{STATUS_TABLE}`
+        WHERE driver = %s
+          AND business_date BETWEEN %s AND %s
+    """, (driver, getdate(from_date), getdate(to_date)), as_dict=True)[0]
+
+
+@frappe.whitelist()
+def get_driver_target_history(driver, from_date, to_date):
+    """Met / missed / at-risk day counts of a driver over a date range"""
+    if not frappe.has_permission("TukTuk Driver", "read", doc=driver):
+        frappe.throw("Not permitted to view this driver", frappe.PermissionError)
+    return get_driver_status_totals(driver, from_date, to_date)
+
+
+def backfill_day_statuses_from_reports():
+    """
+    Populate status rows for existing TukTuk Daily Reports.
+
+    Missed / at-risk come from the reports' stored lists; drivers with rollup
+    activity that day and not in the below-target list are recorded as met.
+    Targets use the drivers' current settings.
+    """
+    global_target = flt(frappe.db.get_single_value("TukTuk Settings", "global_daily_target")) or 3000
+    targets = {
+        d.name: flt(d.daily_target) or global_target
+        for d in frappe.db.sql("SELECT name, daily_target FROM `tabTukTuk Driver`", as_dict=True)
+    }
+
+    reports = frappe.db.sql("""
+        SELECT report_date, drivers_below_target_list, drivers_at_risk_list
+        FROM `tabTukTuk Daily Report`
+        ORDER BY report_date
+    """, as_dict=True)
+
+    for report in reports:
+        below = {d.strip() for d in str(report.drivers_below_target_list or "").split(",") if d.strip()}
+        at_risk = {d.strip() for d in str(report.drivers_at_risk_list or "").split(",") if d.strip()}
+        achieved = {
+            r.driver: flt(r.target_contribution)
+            for r in frappe.db.sql("""
+                SELECT driver, target_contribution
+                FROM `tabTukTuk Driver Daily Rollup`
+                WHERE business_date = %s AND driver IS NOT NULL
+            """, (report.report_date,), as_dict=True)
+        }
+
+        drivers = (below | at_risk | set(achieved)) & set(targets)
+        save_day_statuses(report.report_date, [
+            {
+                "driver": driver,
+                "daily_target": targets[driver],
+                "achieved": achieved.get(driver, 0),
+                "target_met": driver not in below,
+                "at_risk": driver in at_risk,
+            }
+            for driver in sorted(drivers)
+        ])
+        frappe.db.commit()
+
+    return len(reports)
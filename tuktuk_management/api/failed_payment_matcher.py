@@ -0,0 +1,382 @@
+# ~/frappe-bench/apps/tuktuk_management/tuktuk_management/api/failed_payment_matcher.py
+"""
+Failed payment matcher
+
+Payments made to a wrong BillRefNumber land in Failed Transaction Log. For every
+unresolved (Confirmation-stage) failure the matcher scores candidate drivers from:
+
+  - phone history:  who the customer's phone paid over the last LOOKBACK_DAYS
+                    (one grouped query for all failing phones)
+  - account:        near misses of a vehicle mpesa_account or a Sunny ID
+                    (normalised, then one edit / transposition away)
+  - activity:       the candidate took rides on that vehicle the same day
+
+and stores the best candidate on the log when it is clear enough (MIN_SCORE and
+MIN_MARGIN over the runner-up). Approved suggestions are applied in a payments
+job through the normal process_uncaptured_payment path, one failure at a time.
+"""
+
+import re
+
+import frappe
+from frappe.utils import add_days, cint, flt, getdate, now_datetime
+
+from tuktuk_management.api.transaction_archive import transaction_source
+
+LOOKBACK_DAYS = 180
+ID_CHUNK = 1000
+
+PHONE_WEIGHT = 50
+ACCOUNT_WEIGHT = 35
+ACTIVITY_WEIGHT = 15
+MIN_SCORE = 40
+MIN_MARGIN = 10
+
+DRIVER = "TukTuk Driver"
+SUBSTITUTE = "TukTuk Substitute Driver"
+
+# Characters customers type for digits on a numeric account
+DIGIT_LOOKALIKES = str.maketrans({"O": "0", "I": "1", "L": "1", "S": "5", "B": "8"})
+
+
+def normalise_account(value):
+    return re.sub(r"[^0-9A-Z]", "", str(value or "").upper())
+
+
+def edit_distance(a, b):
+    """Optimal string alignment distance (edits plus adjacent transpositions)"""
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        previous2, previous = previous, current
+    return previous[len(b)]
+
+
+def account_candidates(account, vehicle_accounts, sunny_ids):
+    """
+    Vehicles / Sunny ID drivers the account was probably meant for.
+
+    Returns:
+        list: (kind, name, weight, reason) - exact after normalisation scores
+            full weight, one edit away shares a reduced weight among all such
+    """
+    typed = normalise_account(account)
+    if not typed:
+        return []
+    numeric = typed.translate(DIGIT_LOOKALIKES)
+
+    exact, near = [], []
+    for kind, accounts in (("vehicle", vehicle_accounts), ("sunny_id", sunny_ids)):
+        for target, name in accounts.items():
+            guess = numeric if target.isdigit() else typed
+            if guess == target or (target.isdigit() and guess.lstrip("0") == target.lstrip("0")):
+                exact.append((kind, name, ACCOUNT_WEIGHT, f"account {account} reads as {target}"))
+            elif abs(len(guess) - len(target)) <= 1 and edit_distance(guess, target) == 1:
+                near.append((kind, name, target))
+
+    if exact:
+        return exact
+    share = ACCOUNT_WEIGHT * 0.7 / len(near) if near else 0
+    return [(kind, name, share, f"account {account} is one keystroke from {target}") for kind, name, target in near]
+
+
+def _load_accounts():
+    vehicle_accounts = {
+        normalise_account(r.mpesa_account): r.name
+        for r in frappe.db.sql("""
+            SELECT name, mpesa_account FROM `tabTukTuk Vehicle`
+            WHERE IFNULL(mpesa_account, '') != ''
+        """, as_dict=True)
+    }
+    sunny_ids = {
+        normalise_account(r.sunny_id): r.name
+        for r in frappe.db.sql("""
+            SELECT name, sunny_id FROM `tabTukTuk Driver`
+            WHERE IFNULL(sunny_id, '') != ''
+        """, as_dict=True)
+    }
+    return vehicle_accounts, sunny_ids
+
+
+def _phone_history(phones):
+    """{phone: [(doctype, party, tuktuk, rides, last_seen)]} over LOOKBACK_DAYS"""
+    history = {}
+    since = f"{add_days(getdate(), -LOOKBACK_DAYS)} 00:00:00"
+    phones = list(phones)
+    for i in range(0, len(phones), ID_CHUNK):
+        for r in frappe.db.sql(f"""
+            SELECT
+                customer_phone,
+                IF(COALESCE(driver, '') != '', %s, %s) AS party_doctype,
+                COALESCE(NULLIF(driver, ''), substitute_driver) AS party,
+                tuktuk,
+                COUNT(*) AS rides,
+                MAX(timestamp) AS last_seen
+            FROM {transaction_source(since)} t
+            WHERE customer_phone IN %s
+              AND timestamp >= %s
+              AND payment_status = 'Completed'
+              AND transaction_type NOT IN ('Adjustment', 'Driver Repayment')
+              AND COALESCE(NULLIF(driver, ''), substitute_driver) IS NOT NULL
+            GROUP BY customer_phone, party_doctype, party, tuktuk
+        """, (DRIVER, SUBSTITUTE, tuple(phones[i:i + ID_CHUNK]), since), as_dict=True):
+            history.setdefault(r.customer_phone, []).append(r)
+    return history
+
+
+def _day_activity(days):
+    """{(date, tuktuk): {(doctype, party): rides}} for the failures' days"""
+    activity = {}
+    for day in days:
+        for r in frappe.db.sql("""
+            SELECT
+                tuktuk,
+                IF(COALESCE(driver, '') != '', %s, %s) AS party_doctype,
+                COALESCE(NULLIF(driver, ''), substitute_driver) AS party,
+                COUNT(*) AS rides
+            FROM `tabTukTuk Transaction`
+            WHERE timestamp >= %s AND timestamp < %s
+              AND payment_status = 'Completed'
+              AND transaction_type NOT IN ('Adjustment', 'Driver Repayment')
+              AND COALESCE(NULLIF(driver, ''), substitute_driver) IS NOT NULL
+            GROUP BY tuktuk, party_doctype, party
+        """, (DRIVER, SUBSTITUTE, f"{day} 00:00:00", f"{add_days(day, 1)} 00:00:00"), as_dict=True):
+            activity.setdefault((day, r.tuktuk), {})[(r.party_doctype, r.party)] = r.rides
+    return activity
+
+
+def _vehicle_party(tuktuk, day, activity):
+    """Who drove the vehicle that day (most rides), else who is on it now"""
+    riders = activity.get((day, tuktuk))
+    if riders:
+        return max(riders, key=riders.get)
+
+    from tuktuk_management.api.tuktuk import get_active_driver_for_vehicle
+    active = get_active_driver_for_vehicle(tuktuk)
+    return (active["doctype"], active["driver_name"]) if active else None
+
+
+def score_failure(failure, history, activity, vehicle_accounts, sunny_ids, assigned):
+    """
+    Ranked candidates for one failure.
+
+    Returns:
+        list: dicts with doctype, party, tuktuk, score (0-100) and reasons, best first
+    """
+    day = getdate(failure.transaction_time)
+    candidates = {}
+
+    def add(doctype, party, tuktuk, points, reason):
+        if not party or not tuktuk:
+            return
+        candidate = candidates.setdefault((doctype, party, tuktuk), {
+            "doctype": doctype, "party": party, "tuktuk": tuktuk, "score": 0, "reasons": []
+        })
+        candidate["score"] += points
+        candidate["reasons"].append(reason)
+
+    rides = history.get(failure.customer_phone, [])
+    total_rides = sum(r.rides for r in rides)
+    for r in rides:
+        add(r.party_doctype, r.party, r.tuktuk, PHONE_WEIGHT * r.rides / total_rides,
+            f"phone paid {r.party} on {r.tuktuk} {r.rides} of {total_rides} times")
+
+    for kind, name, points, reason in account_candidates(failure.account_number, vehicle_accounts, sunny_ids):
+        if kind == "vehicle":
+            party = _vehicle_party(name, day, activity)
+            if party:
+                add(party[0], party[1], name, points, reason)
+        else:
+            add(DRIVER, name, assigned.get(name), points, reason)
+
+    for (doctype, party, tuktuk), candidate in candidates.items():
+        if activity.get((day, tuktuk), {}).get((doctype, party)):
+            candidate["score"] += ACTIVITY_WEIGHT
+            candidate["reasons"].append(f"took rides on {tuktuk} that day")
+
+    ranked = sorted(candidates.values(), key=lambda c: c["score"], reverse=True)
+    for candidate in ranked:
+        candidate["score"] = flt(min(candidate["score"], 100), 1)
+    return ranked
+
+
+def refresh_suggestions(names=None):
+    """
+    Score every unresolved failure (or the given ones) and store the suggestions.
+    Failures whose receipt has since been recorded are marked Processed.
+
+    Returns:
+        list: one dict per failure with its suggestion (or None) and runner-up score
+    """
+    conditions, params = ["status = 'Failed'", "failure_stage = 'Confirmation'"], []
+    if names:
+        conditions.append("name IN %s")
+        params.append(tuple(names))
+    failures = frappe.db.sql(f"""
+        SELECT name, transaction_id, customer_phone, amount, transaction_time, account_number
+        FROM `tabFailed Transaction Log`
+        WHERE {' AND '.join(conditions)}
+        ORDER BY transaction_time
+    """, params, as_dict=True)
+    if not failures:
+        return []
+
+    # Already resolved by hand
+    recorded = {}
+    receipts = [f.transaction_id for f in failures]
+    for i in range(0, len(receipts), ID_CHUNK):
+        recorded.update(frappe.db.sql("""
+            SELECT transaction_id, name FROM `tabTukTuk Transaction`
+            WHERE transaction_id IN %s
+        """, (tuple(receipts[i:i + ID_CHUNK]),)))
+
+    pending = [f for f in failures if f.transaction_id not in recorded]
+    vehicle_accounts, sunny_ids = _load_accounts()
+    assigned = dict(frappe.db.sql("""
+        SELECT name, assigned_tuktuk FROM `tabTukTuk Driver`
+        WHERE IFNULL(sunny_id, '') != '' AND IFNULL(assigned_tuktuk, '') != ''
+    """))
+    history = _phone_history({f.customer_phone for f in pending if f.customer_phone})
+    activity = _day_activity(sorted({getdate(f.transaction_time) for f in pending}))
+
+    results = []
+    for failure in failures:
+        if failure.transaction_id in recorded:
+            frappe.db.set_value("Failed Transaction Log", failure.name, {
+                "status": "Processed",
+                "resolved_transaction": recorded[failure.transaction_id],
+            }, update_modified=False)
+            continue
+
+        ranked = score_failure(failure, history, activity, vehicle_accounts, sunny_ids, assigned)
+        best = ranked[0] if ranked else None
+        runner_up = ranked[1]["score"] if len(ranked) > 1 else 0
+        if best and (best["score"] < MIN_SCORE or best["score"] - runner_up < MIN_MARGIN):
+            reason = "; ".join(best["reasons"]) + f" (not suggested: {best['score']} vs {runner_up})"
+            best = None
+        else:
+            reason = "; ".join(best["reasons"]) if best else "No candidate"
+
+        frappe.db.set_value("Failed Transaction Log", failure.name, {
+            "suggested_driver_doctype": best["doctype"] if best else None,
+            "suggested_driver": best["party"] if best else None,
+            "suggested_tuktuk": best["tuktuk"] if best else None,
+            "match_score": best["score"] if best else 0,
+            "match_reason": reason,
+        }, update_modified=False)
+        results.append({
+            "name": failure.name,
+            "transaction_id": failure.transaction_id,
+            "amount": flt(failure.amount),
+            "account_number": failure.account_number,
+            "customer_phone": failure.customer_phone,
+            "suggestion": best,
+            "runner_up_score": runner_up,
+            "reason": reason,
+        })
+
+    frappe.db.commit()
+    return results
+
+
+@frappe.whitelist()
+def get_failed_payment_suggestions(refresh=1):
+    """Unresolved failed payments with their suggested driver (rescored unless refresh=0)"""
+    frappe.only_for(["System Manager", "Tuktuk Manager"])
+    if cint(refresh):
+        return refresh_suggestions()
+    return frappe.get_all(
+        "Failed Transaction Log",
+        filters={"status": "Failed", "failure_stage": "Confirmation"},
+        fields=["name", "transaction_id", "amount", "account_number", "customer_phone",
+                "suggested_driver_doctype", "suggested_driver", "suggested_tuktuk",
+                "match_score", "match_reason"],
+        order_by="transaction_time",
+    )
+
+
+@frappe.whitelist()
+def approve_failed_payment_matches(names, action_type="send_share"):
+    """Apply the stored suggestions of the given failures in a payments job"""
+    frappe.only_for(["System Manager", "Tuktuk Manager"])
+    names = frappe.parse_json(names) if isinstance(names, str) else names
+    if not names:
+        frappe.throw("Select at least one failed transaction")
+    if action_type not in ("send_share", "deposit_share"):
+        frappe.throw("Invalid action type. Must be 'send_share' or 'deposit_share'")
+
+    from tuktuk_management.utils.job_queues import enqueue_job, PAYMENTS
+
+    enqueue_job(
+        "tuktuk_management.api.failed_payment_matcher.apply_matches",
+        queue=PAYMENTS,
+        dedupe_key=f"failed_payment_matches::{frappe.generate_hash(','.join(sorted(names)), 10)}",
+        names=list(names),
+        action_type=action_type,
+        user=frappe.session.user,
+    )
+    return {"success": True, "message": f"Applying {len(names)} matched payments in the background"}
+
+
+def apply_matches(names, action_type="send_share", user=None):
+    """Process each approved failure as an uncaptured payment of its suggested driver"""
+    from tuktuk_management.api.tuktuk import process_uncaptured_payment, process_uncaptured_payment_substitute
+
+    applied, errors = [], []
+    for name in names:
+        failure = frappe.db.get_value("Failed Transaction Log", name, [
+            "name", "status", "transaction_id", "customer_phone", "amount",
+            "suggested_driver_doctype", "suggested_driver", "suggested_tuktuk"
+        ], as_dict=True)
+        if not failure or failure.status != "Failed":
+            continue
+        if not failure.suggested_driver:
+            errors.append({"name": name, "message": "No suggested driver"})
+            continue
+
+        if failure.suggested_driver_doctype == SUBSTITUTE:
+            if action_type != "send_share":
+                errors.append({"name": name, "message": "Substitute payments can only be sent as driver share"})
+                continue
+            result = process_uncaptured_payment_substitute(
+                failure.suggested_driver, failure.suggested_tuktuk,
+                failure.transaction_id, failure.customer_phone, failure.amount
+            )
+        else:
+            result = process_uncaptured_payment(
+                failure.suggested_driver, failure.suggested_tuktuk,
+                failure.transaction_id, failure.customer_phone, failure.amount, action_type
+            )
+
+        if not result.get("success"):
+            errors.append({"name": name, "message": result.get("message") or result.get("error")})
+            continue
+
+        frappe.db.set_value("Failed Transaction Log", name, {
+            "status": "Processed",
+            "resolved_transaction": frappe.db.get_value(
+                "TukTuk Transaction", {"transaction_id": failure.transaction_id}, "name"
+            ),
+        })
+        frappe.get_doc("Failed Transaction Log", name).add_comment(
+            "Comment",
+            f"Applied to {failure.suggested_driver} ({failure.suggested_tuktuk}) as {action_type} "
+            f"by {user or 'Administrator'} on {now_datetime()}"
+        )
+        frappe.db.commit()
+        applied.append(name)
+
+    if errors:
+        frappe.log_error(
+            "\n".join(f"{e['name']}: {e['message']}" for e in errors),
+            "Failed Payment Matching - Not Applied"
+        )
+    result = {"applied": len(applied), "errors": errors}
+    if user:
+        frappe.publish_realtime("failed_payment_matches_applied", result, user=user)
+    return result
@@ -0,0 +1,434 @@
+# ~/frappe-bench/apps/tuktuk_management/tuktuk_management/api/mpesa_statement_diff.py
+"""
+M-Pesa paybill statement vs ledger diff
+
+Streams a paybill statement export (the org portal CSV) once, keeping per
+business day:
+  - C2B receipts:      {receipt: (amount, account)}            (hashed lookup)
+  - B2C disbursements: {phone key: [(amount, receipt), ...]}   (sorted arrays)
+
+and compares them with our records in 7-day range queries:
+  - C2B against TukTuk Transaction (Payment, Target Reduction/Deposit) and
+    Failed Transaction Log; receipts not found in their day's range are looked
+    up by ID in chunks, so timestamp drift across midnight is not a mismatch.
+  - B2C against the driver_share of transactions with b2c_payment_sent, per
+    recipient phone. Petty cash payouts are recognised by their receipt.
+
+Mismatch categories:
+  Missing          on the statement, not in our records
+  Extra            in our records, not on the statement
+  Amount Mismatch  same receipt (C2B) or same recipient and day (B2C), different amount
+  Wrong Driver     C2B credited to another vehicle/driver than the account paid to;
+                   B2C amount sent to another driver's phone
+
+    bench --site <site> execute tuktuk_management.api.mpesa_statement_diff.diff_statement_file --kwargs "{'path': '/path/to/statement.csv'}"
+"""
+
+import csv
+import os
+import re
+import time
+
+import frappe
+from frappe.utils import add_days, flt, get_datetime, getdate, now_datetime
+
+from tuktuk_management.api.transaction_archive import transaction_source
+
+CHUNK_DAYS = 7
+ID_CHUNK = 1000
+C2B_TYPES = ("Payment", "Target Reduction/Deposit")
+CATEGORIES = ("Missing", "Extra", "Amount Mismatch", "Wrong Driver")
+
+# Statement column -> accepted header spellings
+COLUMNS = {
+    "receipt": ("Receipt No.", "Receipt No", "Receipt", "TransID", "Transaction ID"),
+    "time": ("Completion Time", "Completion time", "TransTime", "Transaction Time"),
+    "paid_in": ("Paid In", "Paid in", "Credit"),
+    "withdrawn": ("Withdrawn", "Paid Out", "Debit"),
+    "account": ("A/C No.", "A/C No", "Account No.", "BillRefNumber"),
+    "party": ("Other Party Info", "Other party info", "Details"),
+    "status": ("Transaction Status", "Status"),
+}
+
+
+def _amount(value):
+    return abs(flt(str(value or "").replace(",", "").strip()))
+
+
+def phone_key(value):
+    """
+    Comparable key of a phone number, full or masked (2547****123): country
+    prefix plus the next two digits and the last three digits.
+    """
+    raw = re.sub(r"[^0-9*]", "", str(value or "").split(" - ")[0])
+    if raw.startswith("0"):
+        raw = "254" + raw[1:]
+    elif raw.startswith("7") or raw.startswith("1"):
+        raw = "254" + raw
+    if len(raw) < 9:
+        return None
+    return raw[:5] + raw[-3:]
+
+
+def read_statement(path):
+    """Yield statement rows as dicts with receipt, time, paid_in, withdrawn, account, party"""
+    with open(path, newline="", encoding="utf-8-sig") as handle:
+        reader = csv.reader(handle)
+        index = None
+        for line in reader:
+            if index is None:
+                # Portal exports start with a header block; find the column row
+                cells = [c.strip() for c in line]
+                found = {
+                    key: next((cells.index(a) for a in aliases if a in cells), None)
+                    for key, aliases in COLUMNS.items()
+                }
+                if found["receipt"] is not None and found["time"] is not None:
+                    index = found
+                continue
+
+            def cell(key):
+                i = index[key]
+                return line[i].strip() if i is not None and i < len(line) else ""
+
+            receipt = cell("receipt")
+            if not receipt:
+                continue
+            status = cell("status")
+            if status and status.lower() != "completed":
+                continue
+            yield {
+                "receipt": receipt,
+                "time": get_datetime(cell("time")),
+                "paid_in": _amount(cell("paid_in")),
+                "withdrawn": _amount(cell("withdrawn")),
+                "account": cell("account").upper(),
+                "party": cell("party"),
+            }
+
+        if index is None:
+            frappe.throw("Not an M-Pesa statement export: no Receipt No. / Completion Time columns found")
+
+
+def load_statement(path):
+    """
+    One streaming pass over the statement.
+
+    Returns:
+        tuple: (c2b {day: {receipt: (amount, account)}},
+                b2c {day: {phone key: sorted [(amount, receipt)]}},
+                first day, last day)
+    """
+    c2b, b2c = {}, {}
+    first = last = None
+    for row in read_statement(path):
+        day = row["time"].date()
+        first = day if first is None or day < first else first
+        last = day if last is None or day > last else last
+
+        if row["paid_in"]:
+            c2b.setdefault(day, {})[row["receipt"]] = (row["paid_in"], row["account"])
+        elif row["withdrawn"]:
+            key = phone_key(row["party"])
+            if key:
+                b2c.setdefault(day, {}).setdefault(key, []).append((row["withdrawn"], row["receipt"]))
+
+    for phones in b2c.values():
+        for amounts in phones.values():
+            amounts.sort()
+    return c2b, b2c, first, last
+
+
+def _day_chunks(first, last):
+    start = first
+    while start <= last:
+        end = min(add_days(start, CHUNK_DAYS - 1), last)
+        yield start, end
+        start = add_days(end, 1)
+
+
+def _mismatch(category, flow, day, receipt=None, statement_amount=None, ledger_amount=None,
+              account=None, reference=None, detail=None):
+    return {
+        "category": category, "flow": flow, "date": str(day), "receipt": receipt,
+        "statement_amount": statement_amount, "ledger_amount": ledger_amount,
+        "account": account, "reference": reference, "detail": detail,
+    }
+
+
+# ===== C2B =====
+
+def _account_routes():
+    """Paybill account -> (field, expected value) the receipt must be credited to"""
+    routes = {
+        (r.mpesa_account or "").strip().upper(): ("tuktuk", r.name)
+        for r in frappe.db.sql("SELECT name, mpesa_account FROM `tabTukTuk Vehicle` WHERE IFNULL(mpesa_account, '') != ''", as_dict=True)
+    }
+    routes.update({
+        (r.sunny_id or "").strip().upper(): ("driver", r.name)
+        for r in frappe.db.sql("SELECT name, sunny_id FROM `tabTukTuk Driver` WHERE IFNULL(sunny_id, '') != ''", as_dict=True)
+    })
+    return routes
+
+
+def _c2b_records(start, end):
+    range_start, range_end = f"{start} 00:00:00", f"{add_days(end, 1)} 00:00:00"
+    ours = {
+        r.transaction_id: r
+        for r in frappe.db.sql(f"""
+            SELECT name, transaction_id, amount, tuktuk, driver, timestamp
+            FROM {transaction_source(range_start)} t
+            WHERE timestamp >= %s AND timestamp < %s
+              AND transaction_type IN %s
+        """, (range_start, range_end, C2B_TYPES), as_dict=True)
+    }
+    failed = {
+        r.transaction_id: r
+        for r in frappe.db.sql("""
+            SELECT name, transaction_id, amount, account_number
+            FROM `tabFailed Transaction Log`
+            WHERE transaction_time >= %s AND transaction_time < %s
+        """, (range_start, range_end), as_dict=True)
+    }
+    return ours, failed
+
+
+def _c2b_by_id(receipts):
+    """Transactions / failed logs for receipts outside their day's range, in ID chunks"""
+    ours, failed = {}, {}
+    receipts = list(receipts)
+    for i in range(0, len(receipts), ID_CHUNK):
+        chunk = tuple(receipts[i:i + ID_CHUNK])
+        for r in frappe.db.sql(f"""
+            SELECT name, transaction_id, amount, tuktuk, driver, timestamp
+            FROM {transaction_source()} t
+            WHERE transaction_id IN %s
+        """, (chunk,), as_dict=True):
+            ours[r.transaction_id] = r
+        for r in frappe.db.sql("""
+            SELECT name, transaction_id, amount, account_number
+            FROM `tabFailed Transaction Log`
+            WHERE transaction_id IN %s
+        """, (chunk,), as_dict=True):
+            failed[r.transaction_id] = r
+    return ours, failed
+
+
+def diff_c2b(c2b, first, last):
+    mismatches = []
+    routes = _account_routes()
+    seen = set()
+    unplaced = {}  # receipt -> (day, amount, account) not found in its day's range
+
+    def compare(receipt, day, amount, account, record):
+        if abs(flt(record.amount) - amount) > 0.009:
+            mismatches.append(_mismatch(
+                "Amount Mismatch", "C2B", day, receipt, amount, flt(record.amount), account, record.name
+            ))
+        route = routes.get(account)
+        if route and record.get(route[0]) and record.get(route[0]) != route[1]:
+            mismatches.append(_mismatch(
+                "Wrong Driver", "C2B", day, receipt, amount, flt(record.amount), account, record.name,
+                f"Paid to {route[0]} {route[1]}, recorded on {record.get(route[0])}"
+            ))
+
+    for start, end in _day_chunks(first, last):
+        ours, failed = _c2b_records(start, end)
+        for day in sorted(d for d in c2b if start <= d <= end):
+            for receipt, (amount, account) in c2b[day].items():
+                seen.add(receipt)
+                if receipt in ours:
+                    compare(receipt, day, amount, account, ours[receipt])
+                elif receipt in failed:
+                    if abs(flt(failed[receipt].amount) - amount) > 0.009:
+                        mismatches.append(_mismatch(
+                            "Amount Mismatch", "C2B", day, receipt, amount, flt(failed[receipt].amount),
+                            account, failed[receipt].name, "Failed Transaction Log"
+                        ))
+                else:
+                    unplaced[receipt] = (day, amount, account)
+
+        # Recorded in the range but not on the statement
+        for receipt, record in ours.items():
+            if receipt not in seen:
+                mismatches.append(_mismatch(
+                    "Extra", "C2B", getdate(record.timestamp), receipt, None, flt(record.amount),
+                    None, record.name
+                ))
+
+    ours, failed = _c2b_by_id(unplaced)
+    for receipt, (day, amount, account) in unplaced.items():
+        if receipt in ours:
+            compare(receipt, day, amount, account, ours[receipt])
+        elif receipt not in failed:
+            mismatches.append(_mismatch("Missing", "C2B", day, receipt, amount, None, account))
+
+    # Extras that appear on the statement in a later chunk were matched by ID above
+    return [m for m in mismatches if not (m["category"] == "Extra" and m["receipt"] in seen)]
+
+
+# ===== B2C =====
+
+def _b2c_records(start, end):
+    """{day: {phone key: sorted [(driver share, transaction, party)]}}"""
+    range_start, range_end = f"{start} 00:00:00", f"{add_days(end, 1)} 00:00:00"
+    payouts = {}
+    for r in frappe.db.sql(f"""
+        SELECT
+            t.name, t.timestamp, t.driver_share,
+            COALESCE(NULLIF(t.driver, ''), t.substitute_driver) AS party,
+            COALESCE(d.mpesa_number, s.mpesa_number) AS phone
+        FROM {transaction_source(range_start)} t
+        LEFT JOIN `tabTukTuk Driver` d ON d.name = t.driver
+        LEFT JOIN `tabTukTuk Substitute Driver` s ON s.name = t.substitute_driver
+        WHERE t.timestamp >= %s AND t.timestamp < %s
+          AND t.b2c_payment_sent = 1
+          AND t.driver_share > 0
+    """, (range_start, range_end), as_dict=True):
+        key = phone_key(r.phone) or f"?{r.party}"
+        payouts.setdefault(getdate(r.timestamp), {}).setdefault(key, []).append(
+            (flt(r.driver_share, 2), r.name, r.party)
+        )
+    for phones in payouts.values():
+        for shares in phones.values():
+            shares.sort()
+    return payouts
+
+
+def _petty_cash_receipts(receipts):
+    found = set()
+    receipts = list(receipts)
+    for i in range(0, len(receipts), ID_CHUNK):
+        found.update(r[0] for r in frappe.db.sql("""
+            SELECT mpesa_transaction_id FROM `tabTukTuk Petty Cash`
+            WHERE mpesa_transaction_id IN %s
+        """, (tuple(receipts[i:i + ID_CHUNK]),)))
+    return found
+
+
+def _match_sorted(paid, owed):
+    """Two-pointer match of equal amounts; returns the unmatched remainder of both sorted lists"""
+    i = j = 0
+    left_paid, left_owed = [], []
+    while i < len(paid) and j < len(owed):
+        if abs(paid[i][0] - owed[j][0]) <= 0.009:
+            i += 1
+            j += 1
+        elif paid[i][0] < owed[j][0]:
+            left_paid.append(paid[i])
+            i += 1
+        else:
+            left_owed.append(owed[j])
+            j += 1
+    return left_paid + paid[i:], left_owed + owed[j:]
+
+
+def diff_b2c(b2c, first, last):
+    mismatches = []
+    petty_cash = _petty_cash_receipts(
+        receipt for phones in b2c.values() for amounts in phones.values() for amount, receipt in amounts
+    )
+
+    for start, end in _day_chunks(first, last):
+        payouts = _b2c_records(start, end)
+        days = {d for d in list(b2c) + list(payouts) if start <= d <= end}
+        for day in sorted(days):
+            paid_by_phone = b2c.get(day, {})
+            owed_by_phone = payouts.get(day, {})
+            stray_paid, stray_owed = [], []
+
+            for key in set(paid_by_phone) | set(owed_by_phone):
+                paid = [p for p in paid_by_phone.get(key, []) if p[1] not in petty_cash]
+                left_paid, left_owed = _match_sorted(paid, owed_by_phone.get(key, []))
+                # Same recipient and day, different amounts
+                for (amount, receipt), (share, name, party) in zip(left_paid, left_owed):
+                    mismatches.append(_mismatch(
+                        "Amount Mismatch", "B2C", day, receipt, amount, share, key, name, party
+                    ))
+                n = min(len(left_paid), len(left_owed))
+                stray_paid.extend((amount, receipt, key) for amount, receipt in left_paid[n:])
+                stray_owed.extend((share, name, party, key) for share, name, party in left_owed[n:])
+
+            # An unmatched disbursement equal to another driver's unpaid share went to the wrong phone
+            stray_owed.sort(key=lambda o: o[0])
+            for amount, receipt, key in sorted(stray_paid):
+                match = next((o for o in stray_owed if abs(o[0] - amount) <= 0.009), None)
+                if match:
+                    stray_owed.remove(match)
+                    mismatches.append(_mismatch(
+                        "Wrong Driver", "B2C", day, receipt, amount, match[0], key, match[1],
+                        f"Share of {match[2]} (phone {match[3]}) sent to {key}"
+                    ))
+                else:
+                    mismatches.append(_mismatch("Missing", "B2C", day, receipt, amount, None, key))
+            for share, name, party, key in stray_owed:
+                mismatches.append(_mismatch("Extra", "B2C", day, None, None, share, key, name, party))
+
+    return mismatches
+
+
+# ===== ENTRY POINTS =====
+
+def _write_report(mismatches, first, last):
+    folder = frappe.get_site_path("private", "files")
+    os.makedirs(folder, exist_ok=True)
+    file_name = f"mpesa-diff-{first}-{last}-{now_datetime():%H%M%S}.csv"
+    with open(os.path.join(folder, file_name), "w", newline="") as handle:
+        writer = csv.DictWriter(handle, fieldnames=list(mismatches[0]) if mismatches else ["category"])
+        writer.writeheader()
+        writer.writerows(mismatches)
+
+    # Register the CSV so it is downloadable (and access-checked) like any private file
+    file_doc = frappe.get_doc({
+        "doctype": "File",
+        "file_name": file_name,
+        "file_url": f"/private/files/{file_name}",
+        "is_private": 1,
+    })
+    file_doc.insert(ignore_permissions=True)
+    return file_doc.file_url
+
+
+def diff_statement_file(path):
+    """
+    Diff a statement CSV at `path` against TukTuk Transaction and Failed Transaction Log.
+
+    Returns:
+        dict: period, receipts/disbursements read, counts per flow and category,
+            seconds, report file_url and the first 500 mismatches
+    """
+    started = time.monotonic()
+    c2b, b2c, first, last = load_statement(path)
+    if first is None:
+        return {"success": False, "message": "The statement has no completed rows"}
+
+    mismatches = diff_c2b(c2b, first, last) + diff_b2c(b2c, first, last)
+    mismatches.sort(key=lambda m: (m["date"], m["flow"], m["category"]))
+
+    counts = {
+        flow: {category: 0 for category in CATEGORIES} for flow in ("C2B", "B2C")
+    }
+    for m in mismatches:
+        counts[m["flow"]][m["category"]] += 1
+
+    result = {
+        "success": True,
+        "from_date": str(first),
+        "to_date": str(last),
+        "c2b_receipts": sum(len(r) for r in c2b.values()),
+        "b2c_disbursements": sum(len(a) for p in b2c.values() for a in p.values()),
+        "counts": counts,
+        "mismatch_count": len(mismatches),
+        "file_url": _write_report(mismatches, first, last),
+        "mismatches": mismatches[:500],
+    }
+    result["seconds"] = round(time.monotonic() - started, 2)
+    return result
+
+
+@frappe.whitelist()
+def diff_mpesa_statement(file_url):
+    """Diff an uploaded paybill statement export (File URL) against our records"""
+    frappe.only_for(["System Manager", "Tuktuk Manager"])
+    file_doc = frappe.get_doc("File", {"file_url": file_url})
+    return diff_statement_file(file_doc.get_full_path())
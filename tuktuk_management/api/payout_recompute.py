@@ -0,0 +1,312 @@
+# ~/frappe-bench/apps/tuktuk_management/tuktuk_management/api/payout_recompute.py
+"""
+Retroactive payout recomputation
+
+When a driver's fare percentage or daily target was configured wrongly for a
+period, the period's Payment transactions are re-split with the correct values.
+The split of a payment depends on the driver's running balance that business
+day (target met -> 100% to the driver), and contributions never decrease the
+balance, so a payment is split exactly when the contributions before it that
+day, all split at the new percentage, are still below the target. That running
+sum is one window function, so the whole period is recomputed in one query.
+With target sharing off for the driver every payment is split.
+
+recompute_driver_payouts(..., dry_run=1) returns the per-transaction diff. With
+dry_run=0 the changes are applied in one DB transaction:
+  - bulk update of driver_share / target_contribution
+  - one Adjustment transaction carrying the net driver share difference
+    (paid out or recovered separately, like manual adjustments)
+  - today's contribution difference applied to current_balance, with a
+    "Payout Recompute" ledger entry
+  - the driver daily rollup and the revenue series rebuilt and cached reports
+    evicted for the period
+"""
+
+import frappe
+from frappe.utils import add_days, cint, flt, getdate, now, now_datetime, today
+
+from tuktuk_management.api.driver_ledger import record_ledger_event
+from tuktuk_management.api.transaction_archive import ARCHIVE_TABLE, get_archive_cutoff
+from tuktuk_management.utils.report_cache import invalidate_for_date
+
+UPDATE_CHUNK = 500
+
+
+def _effective_config(driver, fare_percentage=None, daily_target=None):
+    """Fare percentage, daily target and target sharing flag to recompute with"""
+    settings = frappe.get_single("TukTuk Settings")
+    driver_doc = frappe.db.get_value(
+        "TukTuk Driver", driver,
+        ["name", "driver_name", "assigned_tuktuk", "fare_percentage", "daily_target", "target_sharing_override"],
+        as_dict=True
+    )
+    if not driver_doc:
+        frappe.throw(f"TukTuk Driver {driver} not found")
+
+    percentage = flt(fare_percentage) or flt(driver_doc.fare_percentage) or flt(settings.global_fare_percentage) or 50
+    target = flt(daily_target) or flt(driver_doc.daily_target) or flt(settings.global_daily_target)
+    if not 0 <= percentage <= 100:
+        frappe.throw("Fare percentage must be between 0 and 100")
+
+    # Same resolution as the live payment flow
+    if driver_doc.target_sharing_override == "Enable":
+        sharing = 1
+    elif driver_doc.target_sharing_override == "Disable":
+        sharing = 0
+    else:
+        sharing = cint(getattr(settings, "enable_target_sharing", 1))
+    return driver_doc, percentage, target, sharing
+
+
+def _has_archived_rows(driver, from_date, to_date):
+    """True if some of the driver's transactions in the period are in the archive table"""
+    cutoff = get_archive_cutoff()
+    if not cutoff or from_date >= cutoff.date():
+        return False
+    return bool(frappe.db.sql(f"""
+        SELECT 1 FROM `{ARCHIVE_TABLE}`
+        WHERE driver = %s
+          AND timestamp >= %s
+          AND timestamp < %s
+        LIMIT 1
+    """, (driver, f"{from_date} 00:00:00", f"{add_days(to_date, 1)} 00:00:00")))
+
+
+def get_recomputed_rows(driver, from_date, to_date, fare_percentage, daily_target, target_sharing=1):
+    """
+    Every revenue transaction of the driver in the period with its current and
+    recomputed split. Without target sharing every payment is split at the
+    percentage, whatever the running balance.
+    """
+    return frappe.db.sql("""
+        SELECT
+            r.name, r.transaction_id, r.timestamp, r.business_date, r.transaction_type, r.amount,
+            r.driver_share, r.target_contribution, r.running_before,
+            CASE
+                WHEN r.transaction_type != 'Payment' THEN r.driver_share
+                WHEN %(sharing)s = 1 AND r.running_before >= %(target)s THEN r.amount
+                ELSE r.amount * %(percentage)s / 100
+            END AS new_driver_share,
+            CASE
+                WHEN r.transaction_type != 'Payment' THEN r.target_contribution
+                WHEN %(sharing)s = 1 AND r.running_before >= %(target)s THEN 0
+                ELSE r.amount - r.amount * %(percentage)s / 100
+            END AS new_target_contribution
+        FROM (
+            SELECT
+                name, transaction_id, timestamp, DATE(timestamp) AS business_date,
+                transaction_type, amount, driver_share, target_contribution,
+                COALESCE(SUM(
+                    CASE WHEN transaction_type = 'Payment'
+                         THEN amount - amount * %(percentage)s / 100
+                         ELSE target_contribution END
+                ) OVER (
+                    PARTITION BY DATE(timestamp)
+                    ORDER BY timestamp, name
+                    ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                ), 0) AS running_before
+            FROM `tabTukTuk Transaction`
+            WHERE driver = %(driver)s
+              AND timestamp >= %(day_start)s
+              AND timestamp < %(day_end)s
+              AND payment_status = 'Completed'
+              AND transaction_type NOT IN ('Adjustment', 'Driver Repayment')
+        ) r
+        ORDER BY r.timestamp, r.name
+    """, {
+        "driver": driver,
+        "day_start": f"{getdate(from_date)} 00:00:00",
+        "day_end": f"{add_days(getdate(to_date), 1)} 00:00:00",
+        "percentage": fare_percentage,
+        "target": daily_target,
+        "sharing": cint(target_sharing),
+    }, as_dict=True)
+
+
+def diff_rows(rows):
+    """Changed transactions plus per-day and total share / contribution differences"""
+    changes, days = [], {}
+    for row in rows:
+        share_delta = flt(row.new_driver_share) - flt(row.driver_share)
+        contribution_delta = flt(row.new_target_contribution) - flt(row.target_contribution)
+        if abs(share_delta) < 0.005 and abs(contribution_delta) < 0.005:
+            continue
+        changes.append({
+            "name": row.name,
+            "transaction_id": row.transaction_id,
+            "timestamp": row.timestamp,
+            "amount": flt(row.amount),
+            "driver_share": flt(row.driver_share, 2),
+            "new_driver_share": flt(row.new_driver_share, 2),
+            "target_contribution": flt(row.target_contribution, 2),
+            "new_target_contribution": flt(row.new_target_contribution, 2),
+            "balance_before": flt(row.running_before, 2),
+        })
+        day = days.setdefault(str(row.business_date), {"transactions": 0, "share_delta": 0, "contribution_delta": 0})
+        day["transactions"] += 1
+        day["share_delta"] += share_delta
+        day["contribution_delta"] += contribution_delta
+
+    for day in days.values():
+        day["share_delta"] = flt(day["share_delta"], 2)
+        day["contribution_delta"] = flt(day["contribution_delta"], 2)
+    return changes, days
+
+
+def _bulk_update(changes):
+    """CASE updates of driver_share / target_contribution, UPDATE_CHUNK rows per statement"""
+    timestamp = now()
+    for i in range(0, len(changes), UPDATE_CHUNK):
+        chunk = changes[i:i + UPDATE_CHUNK]
+        share_cases = " ".join("WHEN %s THEN %s" for _ in chunk)
+        contribution_cases = " ".join("WHEN %s THEN %s" for _ in chunk)
+        params = []
+        for change in chunk:
+            params += [change["name"], change["new_driver_share"]]
+        for change in chunk:
+            params += [change["name"], change["new_target_contribution"]]
+        params += [timestamp, tuple(change["name"] for change in chunk)]
+        frappe.db.sql(f"""
+            UPDATE `tabTukTuk Transaction`
+            SET driver_share = CASE name {share_cases} END,
+                target_contribution = CASE name {contribution_cases} END,
+                modified = %s
+            WHERE name IN %s
+        """, params)
+
+
+def _create_adjustment(driver_doc, share_delta, from_date, to_date, percentage, target):
+    """Adjustment transaction recording the net driver share owed (> 0) or overpaid (< 0)"""
+    direction = "owed to driver" if share_delta > 0 else "overpaid to driver"
+    transaction = frappe.get_doc({
+        "doctype": "TukTuk Transaction",
+        "transaction_id": f"RCP-{now_datetime().strftime('%Y%m%d%H%M%S')}-{driver_doc.name}",
+        "transaction_type": "Adjustment",
+        "tuktuk": driver_doc.assigned_tuktuk or frappe.db.get_value(
+            "TukTuk Transaction", {"driver": driver_doc.name}, "tuktuk", order_by="timestamp desc"
+        ),
+        "driver": driver_doc.name,
+        "driver_type": "Regular",
+        "amount": abs(flt(share_delta, 2)),
+        "driver_share": 0,
+        "target_contribution": 0,
+        "customer_phone": "RECOMPUTE",
+        "timestamp": now_datetime(),
+        "payment_status": "Completed",
+        "b2c_payment_sent": 1
+    })
+    transaction.insert(ignore_permissions=True)
+    transaction.add_comment(
+        "Comment",
+        f"Payout recompute {from_date} to {to_date} at {percentage}% / target {target}: "
+        f"KSH {abs(flt(share_delta, 2)):.2f} {direction}"
+    )
+    return transaction
+
+
+@frappe.whitelist()
+def recompute_driver_payouts(driver, from_date, to_date, fare_percentage=None, daily_target=None, dry_run=1):
+    """
+    Re-split a driver's payments for [from_date, to_date] with the given (or the
+    driver's current) fare percentage and daily target.
+
+    Returns:
+        dict: configuration used, changed transactions, per-day and total differences,
+            and with dry_run=0 the adjustment transaction and balance change applied
+    """
+    frappe.only_for(["System Manager", "Tuktuk Manager"])
+
+    from_date, to_date = getdate(from_date), getdate(to_date)
+    if from_date > to_date:
+        frappe.throw("From date must be before to date")
+    # Restored periods stay before the cutoff, so check for the rows themselves
+    if _has_archived_rows(driver, from_date, to_date):
+        frappe.throw(
+            f"Some transactions of {driver} between {from_date} and {to_date} are archived. "
+            "Restore the period with restore_archived_transactions, then recompute it "
+            "before the nightly archive job runs again."
+        )
+
+    driver_doc, percentage, target, sharing = _effective_config(driver, fare_percentage, daily_target)
+    rows = get_recomputed_rows(driver, from_date, to_date, percentage, target, sharing)
+    changes, days = diff_rows(rows)
+
+    share_delta = flt(sum(d["share_delta"] for d in days.values()), 2)
+    balance_delta = flt(days.get(str(getdate(today())), {}).get("contribution_delta"), 2)
+    result = {
+        "success": True,
+        "dry_run": bool(cint(dry_run)),
+        "driver": driver,
+        "from_date": str(from_date),
+        "to_date": str(to_date),
+        "fare_percentage": percentage,
+        "daily_target": target,
+        "target_sharing": bool(sharing),
+        "transactions_checked": len(rows),
+        "transactions_changed": len(changes),
+        "share_delta": share_delta,
+        "contribution_delta": flt(sum(d["contribution_delta"] for d in days.values()), 2),
+        "balance_delta": balance_delta,
+        "days": days,
+        "changes": changes,
+    }
+    if cint(dry_run) or not changes:
+        return result
+
+    try:
+        # Serialise with payments of this driver until the recompute commits
+        frappe.db.sql("SELECT name FROM `tabTukTuk Driver` WHERE name = %s FOR UPDATE", (driver,))
+
+        _bulk_update(changes)
+
+        if abs(share_delta) >= 0.01:
+            adjustment = _create_adjustment(driver_doc, share_delta, from_date, to_date, percentage, target)
+            result["adjustment"] = adjustment.name
+
+        # Only today's contributions are still part of the running balance
+        if abs(balance_delta) >= 0.01:
+            global_target = flt(frappe.db.get_single_value("TukTuk Settings", "global_daily_target"))
+            frappe.db.sql("""
+                UPDATE `tabTukTuk Driver`
+                SET current_balance = current_balance + %s,
+                    left_to_target = GREATEST(
+                        0,
+                        COALESCE(NULLIF(daily_target, 0), %s) - (current_balance + %s)
+                    )
+                WHERE name = %s
+            """, (balance_delta, global_target, balance_delta, driver))
+            record_ledger_event(
+                driver, "Payout Recompute", balance_delta=balance_delta,
+                reference_doctype="TukTuk Transaction", reference_name=result.get("adjustment"),
+                remarks=f"Recompute {from_date} to {to_date}: {len(changes)} transactions"
+            )
+
+        from tuktuk_management.api.driver_rollup import _rebuild_range
+        _rebuild_range(min(days), max(days))
+
+        frappe.get_doc("TukTuk Driver", driver).add_comment(
+            "Comment",
+            f"Payouts recomputed {from_date} to {to_date} at {percentage}% / target {target}: "
+            f"{len(changes)} transactions, driver share {share_delta:+.2f}, balance {balance_delta:+.2f}"
+        )
+        frappe.db.commit()
+    except Exception as e:
+        frappe.db.rollback()
+        frappe.log_error(f"Payout recompute failed for {driver}: {str(e)}", "Payout Recompute Error")
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+    for day in days:
+        invalidate_for_date(day)
+
+    # drivers_at_target of the hourly series depends on the contributions (commits itself)
+    try:
+        from tuktuk_management.api.revenue_series import rebuild_revenue_series
+        rebuild_revenue_series(min(days), max(days))
+    except Exception as e:
+        frappe.log_error(
+            f"Revenue series rebuild after payout recompute for {driver} failed: {str(e)}",
+            "Payout Recompute Error"
+        )
+
+    result["applied"] = True
+    return result
@@ -27,6 +27,7 @@ def withdraw_driver_balance(driver_name: str):
 
         # Zero out the balance after initiating payout
         driver.current_balance = 0
+        driver.flags.ledger_event = "Payout"
         driver.save(ignore_permissions=True)
         frappe.db.commit()
 
@@ -0,0 +1,327 @@
+# ~/frappe-bench/apps/tuktuk_management/tuktuk_management/api/period_report.py
+"""
+Monthly and quarterly period reports
+
+A period is split into sub-periods (weeks of a month, months of a quarter).
+Each sub-period's partial aggregate is computed from the stored daily data -
+TukTuk Daily Report rows and TukTuk Driver Day Status rows - on its own
+thread with its own DB connection, and the partials are merged. Every partial
+field is a sum, a min/max or a per-driver count, so merging is exact.
+
+The result is saved as a TukTuk Period Report. A range of periods can be
+regenerated in one background job with enqueue_period_reports().
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import frappe
+from frappe.utils import add_days, add_months, cint, flt, get_first_day, get_last_day, getdate, now
+
+from tuktuk_management.utils.job_lock import mark_failed, single_flight
+
+PERIOD_DOCTYPE = "TukTuk Period Report"
+MONTH = "Month"
+QUARTER = "Quarter"
+MAX_WORKERS = 4
+
+_SUM_FIELDS = (
+    "days_count", "total_revenue", "total_driver_share", "total_target_contribution",
+    "total_transactions", "sum_drivers_at_target", "sum_total_drivers",
+    "sum_target_achievement_rate", "sum_inactive_drivers", "sum_active_tuktuks",
+    "sum_available_tuktuks", "sum_charging_tuktuks",
+)
+
+
+def get_period_bounds(period_type, any_date):
+    """[start, end] dates of the calendar month or quarter containing any_date"""
+    start = get_first_day(getdate(any_date))
+    if period_type == QUARTER:
+        start = start.replace(month=3 * ((start.month - 1) // 3) + 1)
+        return start, get_last_day(add_months(start, 2))
+    return start, get_last_day(start)
+
+
+def get_sub_periods(period_type, start, end):
+    """Months of a quarter, or 7-day slices of a month"""
+    sub_periods = []
+    cursor = getdate(start)
+    while cursor <= end:
+        if period_type == QUARTER:
+            sub_end = get_last_day(cursor)
+        else:
+            sub_end = min(getdate(add_days(cursor, 6)), end)
+        sub_periods.append((cursor, sub_end))
+        cursor = getdate(add_days(sub_end, 1))
+    return sub_periods
+
+
+# ===== PARTIAL AGGREGATES =====
+
+def compute_partial(from_date, to_date):
+    """Mergeable aggregate of the stored daily data for [from_date, to_date]"""
+    totals = frappe.db.sql("""
+        SELECT
+            COUNT(*) AS days_count,
+            COALESCE(SUM(total_revenue), 0) AS total_revenue,
+            COALESCE(SUM(total_driver_share), 0) AS total_driver_share,
+            COALESCE(SUM(total_target_contribution), 0) AS total_target_contribution,
+            COALESCE(SUM(total_transactions), 0) AS total_transactions,
+            COALESCE(SUM(drivers_at_target), 0) AS sum_drivers_at_target,
+            COALESCE(SUM(total_drivers), 0) AS sum_total_drivers,
+            COALESCE(SUM(target_achievement_rate), 0) AS sum_target_achievement_rate,
+            COALESCE(SUM(inactive_drivers), 0) AS sum_inactive_drivers,
+            COALESCE(SUM(active_tuktuks), 0) AS sum_active_tuktuks,
+            COALESCE(SUM(available_tuktuks), 0) AS sum_available_tuktuks,
+            COALESCE(SUM(charging_tuktuks), 0) AS sum_charging_tuktuks
+        FROM `tabTukTuk Daily Report`
+        WHERE report_date BETWEEN %s AND %s
+    """, (from_date, to_date), as_dict=True)[0]
+
+    partial = {field: flt(totals.get(field)) for field in _SUM_FIELDS}
+
+    extremes = frappe.db.sql("""
+        (SELECT 'best' AS kind, report_date, total_revenue
+         FROM `tabTukTuk Daily Report`
+         WHERE report_date BETWEEN %(from_date)s AND %(to_date)s
+         ORDER BY total_revenue DESC, report_date LIMIT 1)
+        UNION ALL
+        (SELECT 'worst' AS kind, report_date, total_revenue
+         FROM `tabTukTuk Daily Report`
+         WHERE report_date BETWEEN %(from_date)s AND %(to_date)s
+         ORDER BY total_revenue ASC, report_date LIMIT 1)
+    """, {"from_date": from_date, "to_date": to_date}, as_dict=True)
+    partial["best_day"] = partial["worst_day"] = None
+    for row in extremes:
+        partial[f"{row.kind}_day"] = (getdate(row.report_date), flt(row.total_revenue))
+
+    status = frappe.db.sql("""
+        SELECT driver, SUM(target_met = 0) AS missed_days, SUM(at_risk) AS at_risk_days
+        FROM `tabTukTuk Driver Day Status`
+        WHERE business_date BETWEEN %s AND %s
+        GROUP BY driver
+    """, (from_date, to_date), as_dict=True)
+    partial["missed_days"] = {r.driver: cint(r.missed_days) for r in status if r.missed_days}
+    partial["at_risk_days"] = {r.driver: cint(r.at_risk_days) for r in status if r.at_risk_days}
+
+    return partial
+
+
+def merge_partials(partials):
+    merged = {field: 0 for field in _SUM_FIELDS}
+    merged.update(best_day=None, worst_day=None, missed_days={}, at_risk_days={})
+
+    for partial in partials:
+        for field in _SUM_FIELDS:
+            merged[field] += partial[field]
+        if partial["best_day"] and (not merged["best_day"] or partial["best_day"][1] > merged["best_day"][1]):
+            merged["best_day"] = partial["best_day"]
+        if partial["worst_day"] and (not merged["worst_day"] or partial["worst_day"][1] < merged["worst_day"][1]):
+            merged["worst_day"] = partial["worst_day"]
+        for key in ("missed_days", "at_risk_days"):
+            for driver, days in partial[key].items():
+                merged[key][driver] = merged[key].get(driver, 0) + days
+
+    return merged
+
+
+def _compute_partial_on_thread(site, from_date, to_date):
+    # Each worker thread needs its own Frappe context and DB connection
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        return compute_partial(from_date, to_date)
+    finally:
+        frappe.destroy()
+
+
+def compute_period(period_type, start, end, parallel=True):
+    sub_periods = get_sub_periods(period_type, start, end)
+
+    if not parallel or len(sub_periods) == 1:
+        return merge_partials(compute_partial(s, e) for s, e in sub_periods)
+
+    site = frappe.local.site
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(sub_periods))) as executor:
+        futures = [executor.submit(_compute_partial_on_thread, site, s, e) for s, e in sub_periods]
+        return merge_partials(f.result() for f in futures)
+
+
+# ===== REPORT =====
+
+def build_period_report_data(period_type, start, end, merged):
+    days = merged["days_count"] or 0
+
+    def avg(field):
+        return merged[field] / days if days else 0
+
+    below_target = sorted(merged["missed_days"])
+    at_risk = sorted(merged["at_risk_days"])
+    best = merged["best_day"] or (None, 0)
+    worst = merged["worst_day"] or (None, 0)
+
+    data = {
+        "period_type": period_type,
+        "period_start": start,
+        "period_end": end,
+        "days_count": cint(days),
+        "total_revenue": merged["total_revenue"],
+        "total_driver_share": merged["total_driver_share"],
+        "total_target_contribution": merged["total_target_contribution"],
+        "total_transactions": cint(merged["total_transactions"]),
+        "avg_daily_revenue": avg("total_revenue"),
+        "avg_daily_transactions": avg("total_transactions"),
+        "avg_drivers_at_target": avg("sum_drivers_at_target"),
+        "avg_total_drivers": avg("sum_total_drivers"),
+        "avg_target_achievement_rate": avg("sum_target_achievement_rate"),
+        "avg_inactive_drivers": avg("sum_inactive_drivers"),
+        "drivers_below_target": len(below_target),
+        "total_missed_days": sum(merged["missed_days"].values()),
+        "drivers_below_target_list": ", ".join(below_target),
+        "drivers_at_risk": len(at_risk),
+        "drivers_at_risk_list": ", ".join(at_risk),
+        "avg_active_tuktuks": avg("sum_active_tuktuks"),
+        "avg_available_tuktuks": avg("sum_available_tuktuks"),
+        "avg_charging_tuktuks": avg("sum_charging_tuktuks"),
+        "best_performing_day": best[0],
+        "best_day_revenue": best[1],
+        "worst_performing_day": worst[0],
+        "worst_day_revenue": worst[1],
+    }
+
+    data["report_text"] = f"""
+📊 SUNNY TUKTUK {period_type.upper()} REPORT - {start} to {end}
+
+💰 FINANCIAL SUMMARY:
+- Total Revenue: {data['total_revenue']:,.0f} KSH
+- Total Driver Share: {data['total_driver_share']:,.0f} KSH
+- Total Target Contributions: {data['total_target_contribution']:,.0f} KSH
+- Total Transactions: {data['total_transactions']}
+- Average Daily Revenue: {data['avg_daily_revenue']:,.0f} KSH
+- Average Daily Transactions: {data['avg_daily_transactions']:.1f}
+
+👥 DRIVER PERFORMANCE:
+- Average Drivers at Target: {data['avg_drivers_at_target']:.1f}
+- Average Total Drivers: {data['avg_total_drivers']:.1f}
+- Average Target Achievement Rate: {data['avg_target_achievement_rate']:.1f}%
+- Average Inactive Drivers: {data['avg_inactive_drivers']:.1f}
+
+⚠️ NEEDS ATTENTION:
+- Drivers Below Target: {data['drivers_below_target']} ({data['total_missed_days']} missed driver-days)
+- Drivers At Risk: {data['drivers_at_risk']}
+
+🚗 FLEET STATUS:
+- Average Active TukTuks: {data['avg_active_tuktuks']:.1f}
+- Average Available TukTuks: {data['avg_available_tuktuks']:.1f}
+- Average Charging TukTuks: {data['avg_charging_tuktuks']:.1f}
+
+📈 INSIGHTS:
+- Best Performing Day: {data['best_performing_day']} ({data['best_day_revenue']:,.0f} KSH)
+- Worst Performing Day: {data['worst_performing_day']} ({data['worst_day_revenue']:,.0f} KSH)
+- Days Count: {data['days_count']}
+        """
+    return data
+
+
+def save_period_report(data):
+    existing = frappe.db.exists(PERIOD_DOCTYPE, {
+        "period_type": data["period_type"],
+        "period_start": data["period_start"],
+    })
+    report = frappe.get_doc(PERIOD_DOCTYPE, existing) if existing else frappe.new_doc(PERIOD_DOCTYPE)
+    report.update(data)
+    report.generated_at = now()
+    report.save(ignore_permissions=True)
+    return report
+
+
+@frappe.whitelist()
+def generate_period_report(period_type=MONTH, period_date=None, save_to_db=True):
+    """
+    Generate the month or quarter report containing period_date (default: the previous period).
+
+    Returns:
+        dict: period report data
+    """
+    frappe.only_for(["System Manager", "Tuktuk Manager"])
+    if period_type not in (MONTH, QUARTER):
+        frappe.throw(f"Period type must be {MONTH} or {QUARTER}")
+
+    if not period_date:
+        previous = add_months(getdate(), -3 if period_type == QUARTER else -1)
+        period_date = previous
+
+    start, end = get_period_bounds(period_type, period_date)
+    merged = compute_period(period_type, start, end)
+    if not merged["days_count"]:
+        frappe.throw(f"No daily reports found for {start} to {end}")
+
+    data = build_period_report_data(period_type, start, end, merged)
+
+    if cint(save_to_db):
+        report = save_period_report(data)
+        frappe.db.commit()
+        data["saved_to_db"] = True
+        data["report_name"] = report.name
+
+    return data
+
+
+def regenerate_period_reports(period_type, from_date, to_date):
+    """Regenerate every period of period_type overlapping [from_date, to_date]"""
+    start, end = get_period_bounds(period_type, from_date)
+    to_date = getdate(to_date)
+    generated = []
+
+    while start <= to_date:
+        try:
+            merged = compute_period(period_type, start, end)
+            if merged["days_count"]:
+                report = save_period_report(build_period_report_data(period_type, start, end, merged))
+                frappe.db.commit()
+                generated.append(report.name)
+        except Exception as e:
+            frappe.db.rollback()
+            frappe.log_error(f"Period report {period_type} {start} failed: {str(e)}", "Period Report Error")
+        start, end = get_period_bounds(period_type, add_days(end, 1))
+
+    return generated
+
+
+@frappe.whitelist()
+def enqueue_period_reports(period_type=MONTH, from_date=None, to_date=None):
+    """Regenerate a range of monthly/quarterly reports in one background job"""
+    frappe.only_for(["System Manager", "Tuktuk Manager"])
+    if period_type not in (MONTH, QUARTER):
+        frappe.throw(f"Period type must be {MONTH} or {QUARTER}")
+
+    from tuktuk_management.utils.job_queues import enqueue_job, REPORTS
+
+    from_date = getdate(from_date or add_months(getdate(), -1))
+    to_date = getdate(to_date or from_date)
+    enqueue_job(
+        "tuktuk_management.api.period_report.regenerate_period_reports",
+        queue=REPORTS,
+        dedupe_key=f"period_reports::{period_type}::{from_date}::{to_date}",
+        period_type=period_type,
+        from_date=from_date,
+        to_date=to_date,
+    )
+    return {"success": True, "message": f"{period_type} reports for {from_date} to {to_date} queued"}
+
+
+@single_flight()
+def generate_previous_month_report():
+    """Scheduler entry: previous month's report, plus the previous quarter's on quarter start"""
+    try:
+        generate_period_report(MONTH)
+    except Exception as e:
+        frappe.log_error(f"Scheduled monthly period report failed: {str(e)}", "Period Report Error")
+        mark_failed(e)
+
+    # A failed monthly report must not hold back the quarterly one
+    if getdate().month in (1, 4, 7, 10):
+        try:
+            generate_period_report(QUARTER)
+        except Exception as e:
+            frappe.log_error(f"Scheduled quarterly period report failed: {str(e)}", "Period Report Error")
+            mark_failed(e)
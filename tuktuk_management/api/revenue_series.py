@@ -0,0 +1,291 @@
+# ~/frappe-bench/apps/tuktuk_management/tuktuk_management/api/revenue_series.py
+"""
+Materialised revenue time series
+
+`tabTukTuk Revenue Bucket` holds hourly buckets of ride revenue, ride count,
+drivers active and drivers at target. The payment path calls record_payment()
+inside the mpesa_confirmation savepoint, so buckets are updated atomically with
+the transaction. Hourly buckets older than HOURLY_RETENTION_DAYS are compacted
+into daily buckets by a nightly job.
+
+drivers_active / drivers_at_target count the drivers whose first ride of the
+day, or whose crossing of their daily target, fell in that bucket. They are
+therefore additive: summing a day's hourly buckets (or reading its daily
+bucket) gives the drivers active / at target that day, and a running sum over
+a day's hours gives the count "so far".
+
+Dashboards read the buckets through the "TukTuk Revenue Series" Dashboard Chart
+Source, so chart cost no longer depends on the size of the transaction history.
+"""
+
+import frappe
+from frappe.utils import add_days, flt, get_datetime, getdate, now, today
+
+from tuktuk_management.api.transaction_archive import transaction_source
+from tuktuk_management.utils.job_lock import mark_failed, single_flight, set_rows_touched
+
+BUCKET_DOCTYPE = "TukTuk Revenue Bucket"
+BUCKET_TABLE = "tabTukTuk Revenue Bucket"
+HOURLY = "Hourly"
+DAILY = "Daily"
+HOURLY_RETENTION_DAYS = 30
+
+_UPSERT_SQL = f"""
+    INSERT INTO `{BUCKET_TABLE}`
+        (name, creation, modified, modified_by, owner, docstatus, idx,
+         bucket_start, granularity, revenue, rides, drivers_active, drivers_at_target)
+    VALUES
+        (%(name)s, %(now)s, %(now)s, %(user)s, %(user)s, 0, 0,
+         %(bucket_start)s, %(granularity)s, %(revenue)s, %(rides)s, %(drivers_active)s, %(drivers_at_target)s)
+    ON DUPLICATE KEY UPDATE
+        revenue = revenue + VALUES(revenue),
+        rides = rides + VALUES(rides),
+        drivers_active = drivers_active + VALUES(drivers_active),
+        drivers_at_target = drivers_at_target + VALUES(drivers_at_target),
+        modified = VALUES(modified)
+"""
+
+
+def bucket_start(timestamp, granularity=HOURLY):
+    ts = get_datetime(timestamp)
+    if granularity == DAILY:
+        return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def bucket_name(start, granularity=HOURLY):
+    if granularity == DAILY:
+        return f"D::{start:%Y-%m-%d}"
+    return f"H::{start:%Y-%m-%d %H}"
+
+
+def _upsert(start, granularity, revenue=0, rides=0, drivers_active=0, drivers_at_target=0):
+    frappe.db.sql(_UPSERT_SQL, {
+        "name": bucket_name(start, granularity),
+        "now": now(),
+        "user": frappe.session.user if frappe.session else "Administrator",
+        "bucket_start": start,
+        "granularity": granularity,
+        "revenue": flt(revenue),
+        "rides": int(rides),
+        "drivers_active": int(drivers_active),
+        "drivers_at_target": int(drivers_at_target),
+    })
+
+
+def record_payment(timestamp, amount, first_ride_of_day=False, reached_target=False):
+    """
+    Add one completed ride payment to its hourly bucket.
+
+    Args:
+        timestamp: Transaction timestamp
+        amount: Ride amount
+        first_ride_of_day: The driver had no earlier ride today
+        reached_target: This payment took the driver to (or past) the daily target
+    """
+    _upsert(
+        bucket_start(timestamp),
+        HOURLY,
+        revenue=amount,
+        rides=1,
+        drivers_active=1 if first_ride_of_day else 0,
+        drivers_at_target=1 if reached_target else 0,
+    )
+
+
+def crossed_target(balance_before, contribution, target):
+    """True if adding `contribution` takes a balance from below `target` to at/above it"""
+    target = flt(target)
+    if target <= 0:
+        return False
+    return flt(balance_before) < target <= flt(balance_before) + flt(contribution)
+
+
+# ===== READS =====
+
+def get_series(from_datetime, to_datetime, granularity=HOURLY):
+    """
+    Buckets in [from_datetime, to_datetime). Daily series combine daily buckets
+    with hourly buckets not yet compacted.
+
+    Returns:
+        list of dicts: bucket_start, revenue, rides, drivers_active, drivers_at_target
+    """
+    if granularity == DAILY:
+        return frappe.db.sql(f"""
+            SELECT
+                DATE(bucket_start) AS bucket_start,
+                SUM(revenue) AS revenue,
+                SUM(rides) AS rides,
+                SUM(drivers_active) AS drivers_active,
+                SUM(drivers_at_target) AS drivers_at_target
+            FROM `{BUCKET_TABLE}`
+            WHERE bucket_start >= %s AND bucket_start < %s
+            GROUP BY DATE(bucket_start)
+            ORDER BY DATE(bucket_start)
+        """, (from_datetime, to_datetime), as_dict=True)
+
+    return frappe.db.sql(f"""
+        SELECT bucket_start, revenue, rides, drivers_active, drivers_at_target
+        FROM `{BUCKET_TABLE}`
+        WHERE granularity = 'Hourly'
+          AND bucket_start >= %s AND bucket_start < %s
+        ORDER BY bucket_start
+    """, (from_datetime, to_datetime), as_dict=True)
+
+
+def get_day_totals(day=None):
+    """Revenue, rides, drivers active and at target for one business date"""
+    day = getdate(day or today())
+    rows = get_series(f"{day} 00:00:00", f"{add_days(day, 1)} 00:00:00", DAILY)
+    if rows:
+        return rows[0]
+    return frappe._dict(revenue=0, rides=0, drivers_active=0, drivers_at_target=0)
+
+
+# ===== MAINTENANCE =====
+
+@single_flight()
+def compact_revenue_buckets():
+    """Nightly: fold hourly buckets older than HOURLY_RETENTION_DAYS into daily buckets"""
+    try:
+        cutoff = f"{add_days(today(), -HOURLY_RETENTION_DAYS)} 00:00:00"
+
+        frappe.db.sql(f"""
+            INSERT INTO `{BUCKET_TABLE}`
+                (name, creation, modified, modified_by, owner, docstatus, idx,
+                 bucket_start, granularity, revenue, rides, drivers_active, drivers_at_target)
+            SELECT
+                CONCAT('D::', DATE(bucket_start)), %(now)s, %(now)s, 'Administrator', 'Administrator', 0, 0,
+                TIMESTAMP(DATE(bucket_start)), 'Daily',
+                SUM(revenue), SUM(rides), SUM(drivers_active), SUM(drivers_at_target)
+            FROM `{BUCKET_TABLE}`
+            WHERE granularity = 'Hourly' AND bucket_start < %(cutoff)s
+            GROUP BY DATE(bucket_start)
+            ON DUPLICATE KEY UPDATE
+                revenue = revenue + VALUES(revenue),
+                rides = rides + VALUES(rides),
+                drivers_active = drivers_active + VALUES(drivers_active),
+                drivers_at_target = drivers_at_target + VALUES(drivers_at_target),
+                modified = VALUES(modified)
+        """, {"now": now(), "cutoff": cutoff})
+
+        frappe.db.sql(f"""
+            DELETE FROM `{BUCKET_TABLE}`
+            WHERE granularity = 'Hourly' AND bucket_start < %s
+        """, (cutoff,))
+        compacted = frappe.db.sql("SELECT ROW_COUNT()")[0][0]
+        frappe.db.commit()
+
+        set_rows_touched(compacted)
+        return compacted
+
+    except Exception as e:
+        frappe.db.rollback()
+        frappe.log_error(f"Revenue bucket compaction failed: {str(e)}", "Revenue Series Error")
+        mark_failed(e)
+
+
+def rebuild_revenue_series(from_date=None, to_date=None):
+    """
+    Rebuild the buckets for [from_date, to_date] from TukTuk Transaction (backfill / repair).
+    Days older than the hourly retention are written straight as daily buckets.
+
+        bench --site <site> execute tuktuk_management.api.revenue_series.rebuild_revenue_series
+    """
+    if not from_date or not to_date:
+        bounds = frappe.db.sql(f"""
+            SELECT DATE(MIN(timestamp)) AS first_day, DATE(MAX(timestamp)) AS last_day
+            FROM {transaction_source()} t
+        """, as_dict=True)[0]
+        if not bounds.first_day:
+            return 0
+        from_date = from_date or bounds.first_day
+        to_date = to_date or bounds.last_day
+
+    from_date, to_date = getdate(from_date), getdate(to_date)
+    range_start = f"{from_date} 00:00:00"
+    range_end = f"{add_days(to_date, 1)} 00:00:00"
+    global_target = flt(frappe.db.get_single_value("TukTuk Settings", "global_daily_target"))
+    source = transaction_source(range_start)
+
+    # Revenue and rides per hour
+    hours = frappe.db.sql(f"""
+        SELECT
+            DATE_FORMAT(timestamp, '%%Y-%%m-%%d %%H:00:00') AS hour_start,
+            SUM(amount) AS revenue,
+            COUNT(*) AS rides
+        FROM {source} t
+        WHERE timestamp >= %s AND timestamp < %s
+          AND payment_status = 'Completed'
+          AND transaction_type NOT IN ('Adjustment', 'Driver Repayment')
+        GROUP BY hour_start
+    """, (range_start, range_end), as_dict=True)
+
+    # Hour of each party's first ride of the day
+    first_rides = frappe.db.sql(f"""
+        SELECT DATE_FORMAT(f.first_ride, '%%Y-%%m-%%d %%H:00:00') AS hour_start, COUNT(*) AS cnt
+        FROM (
+            SELECT COALESCE(NULLIF(driver, ''), substitute_driver) AS party, DATE(timestamp) AS day,
+                   MIN(timestamp) AS first_ride
+            FROM {source} t
+            WHERE timestamp >= %s AND timestamp < %s
+              AND payment_status = 'Completed'
+              AND transaction_type NOT IN ('Adjustment', 'Driver Repayment')
+            GROUP BY party, day
+        ) f
+        GROUP BY hour_start
+    """, (range_start, range_end), as_dict=True)
+
+    # Hour each party's running target contribution first reached its target
+    crossings = frappe.db.sql(f"""
+        SELECT hour_start, COUNT(*) AS cnt
+        FROM (
+            SELECT r.party, r.day, DATE_FORMAT(MIN(r.timestamp), '%%Y-%%m-%%d %%H:00:00') AS hour_start
+            FROM (
+                SELECT
+                    COALESCE(NULLIF(t.driver, ''), t.substitute_driver) AS party,
+                    DATE(t.timestamp) AS day,
+                    t.timestamp,
+                    SUM(t.target_contribution) OVER (
+                        PARTITION BY COALESCE(NULLIF(t.driver, ''), t.substitute_driver), DATE(t.timestamp)
+                        ORDER BY t.timestamp, t.name
+                    ) AS running,
+                    COALESCE(NULLIF(d.daily_target, 0), NULLIF(s.daily_target, 0), %s) AS target
+                FROM {source} t
+                LEFT JOIN `tabTukTuk Driver` d ON d.name = t.driver
+                LEFT JOIN `tabTukTuk Substitute Driver` s ON s.name = t.substitute_driver
+                WHERE t.timestamp >= %s AND t.timestamp < %s
+                  AND t.payment_status = 'Completed'
+                  AND t.transaction_type NOT IN ('Adjustment', 'Driver Repayment')
+            ) r
+            WHERE r.target > 0 AND r.running >= r.target
+            GROUP BY r.party, r.day
+        ) c
+        GROUP BY hour_start
+    """, (global_target, range_start, range_end), as_dict=True)
+
+    buckets = {}
+    for row in hours:
+        bucket = buckets.setdefault(row.hour_start, {"revenue": 0, "rides": 0, "drivers_active": 0, "drivers_at_target": 0})
+        bucket["revenue"] += flt(row.revenue)
+        bucket["rides"] += row.rides
+    for key, rows in (("drivers_active", first_rides), ("drivers_at_target", crossings)):
+        for row in rows:
+            bucket = buckets.setdefault(row.hour_start, {"revenue": 0, "rides": 0, "drivers_active": 0, "drivers_at_target": 0})
+            bucket[key] += row.cnt
+
+    frappe.db.sql(f"""
+        DELETE FROM `{BUCKET_TABLE}`
+        WHERE bucket_start >= %s AND bucket_start < %s
+    """, (range_start, range_end))
+
+    hourly_from = getdate(add_days(today(), -HOURLY_RETENTION_DAYS))
+    for hour_start, values in buckets.items():
+        start = get_datetime(hour_start)
+        granularity = HOURLY if getdate(start) >= hourly_from else DAILY
+        _upsert(bucket_start(start, granularity), granularity, **values)
+
+    frappe.db.commit()
+    return len(buckets)
+
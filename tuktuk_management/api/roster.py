@@ -511,4 +511,183 @@ def get_driver_schedule(driver_id, start_date=None, end_date=None):
 		
 	except Exception as e:
 		frappe.log_error(f"Get driver schedule error: {str(e)}")
-		return []
\ No newline at end of file
+		return []
+
+def _vehicle_cases(mapping):
+	"""Build a CASE name WHEN ... expression and its values for a bulk UPDATE"""
+	sql = " ".join(["WHEN %s THEN %s"] * len(mapping))
+	values = []
+	for key, value in mapping.items():
+		values.extend([key, value])
+	return sql, values
+
+
+@frappe.whitelist()
+def activate_substitute_assignments(for_date=None):
+	"""
+	Apply the day's roster substitute assignments to the fleet in one batch.
+	
+	Reads the date's rows from the active TukTuk Roster Period, sets
+	current_substitute_driver on every scheduled vehicle and clears it on
+	vehicles whose roster substitute from the previous day is not continuing.
+	Manual assignments are left alone unless a roster substitute takes
+	their vehicle, in which case the manual substitute is unassigned.
+	Called from start_operating_hours so payments route to the substitute
+	from the first ride of the day.
+	
+	Args:
+		for_date: Date to activate (defaults to today)
+	
+	Returns:
+		dict: Counts of vehicles subbed and released
+	"""
+	frappe.only_for(["System Manager", "Tuktuk Manager"])
+	for_date = getdate(for_date or today())
+	previous_date = getdate(add_to_date(for_date, days=-1))
+	
+	todays = frappe.db.sql("""
+		SELECT sa.name, sa.substitute_driver, sa.vehicle
+		FROM `tabTukTuk Substitute Assignment` sa
+		INNER JOIN `tabTukTuk Roster Period` rp ON rp.name = sa.parent
+		WHERE sa.parenttype = 'TukTuk Roster Period'
+		  AND rp.status = 'Active'
+		  AND sa.date = %s
+		  AND IFNULL(sa.vehicle, '') != ''
+		  AND IFNULL(sa.substitute_driver, '') != ''
+	""", (for_date,), as_dict=True)
+	
+	# One vehicle per substitute and one substitute per vehicle
+	vehicle_to_sub = {}
+	assigned_subs = set()
+	applied_rows = []
+	for row in todays:
+		if row.vehicle in vehicle_to_sub or row.substitute_driver in assigned_subs:
+			frappe.log_error(
+				f"Conflicting roster assignment {row.name} on {for_date}: "
+				f"{row.substitute_driver} -> {row.vehicle} skipped",
+				"Roster Activation - Conflict"
+			)
+			continue
+		vehicle_to_sub[row.vehicle] = row.substitute_driver
+		assigned_subs.add(row.substitute_driver)
+		applied_rows.append(row.name)
+	
+	# Roster-driven subs from the previous day that do not continue today
+	previous = frappe.db.sql("""
+		SELECT v.name AS vehicle, v.current_substitute_driver AS substitute_driver
+		FROM `tabTukTuk Substitute Assignment` sa
+		INNER JOIN `tabTukTuk Vehicle` v
+			ON v.name = sa.vehicle
+			AND v.current_substitute_driver = sa.substitute_driver
+		WHERE sa.parenttype = 'TukTuk Roster Period'
+		  AND sa.date = %s
+	""", (previous_date,), as_dict=True)
+	
+	# Vehicles currently held by one of today's subs somewhere else
+	moved = []
+	if assigned_subs:
+		moved = frappe.db.sql("""
+			SELECT name AS vehicle, current_substitute_driver AS substitute_driver
+			FROM `tabTukTuk Vehicle`
+			WHERE current_substitute_driver IN %(subs)s
+		""", {"subs": tuple(assigned_subs)}, as_dict=True)
+	
+	release = {
+		row.vehicle: row.substitute_driver
+		for row in previous + moved
+		if vehicle_to_sub.get(row.vehicle) != row.substitute_driver
+	}
+	for vehicle in vehicle_to_sub:
+		release.pop(vehicle, None)
+	released_subs = set(release.values()) - assigned_subs
+	
+	# Substitutes (manual or roster) currently holding a vehicle that a
+	# different roster substitute takes today lose it
+	if vehicle_to_sub:
+		displaced = frappe.db.sql("""
+			SELECT current_substitute_driver
+			FROM `tabTukTuk Vehicle`
+			WHERE name IN %(vehicles)s
+			  AND IFNULL(current_substitute_driver, '') != ''
+			UNION
+			SELECT name
+			FROM `tabTukTuk Substitute Driver`
+			WHERE assigned_tuktuk IN %(vehicles)s
+		""", {"vehicles": tuple(vehicle_to_sub)})
+		released_subs |= {row[0] for row in displaced} - assigned_subs
+	
+	now = now_datetime()
+	
+	if release:
+		frappe.db.sql("""
+			UPDATE `tabTukTuk Vehicle`
+			SET current_substitute_driver = NULL,
+				substitute_assignment_date = NULL,
+				status = IF(IFNULL(assigned_driver, '') != '', 'Assigned', 'Available'),
+				modified = %(now)s
+			WHERE name IN %(vehicles)s
+		""", {"now": now, "vehicles": tuple(release)})
+	
+	if released_subs:
+		frappe.db.sql("""
+			UPDATE `tabTukTuk Substitute Driver`
+			SET assigned_tuktuk = NULL,
+				assignment_date = NULL,
+				status = IF(status = 'Inactive', status, 'Active'),
+				modified = %(now)s
+			WHERE name IN %(subs)s
+		""", {"now": now, "subs": tuple(released_subs)})
+	
+	if vehicle_to_sub:
+		case_sql, case_values = _vehicle_cases(vehicle_to_sub)
+		frappe.db.sql(f"""
+			UPDATE `tabTukTuk Vehicle`
+			SET current_substitute_driver = CASE name {case_sql} END,
+				substitute_assignment_date = %s,
+				status = 'Subbed',
+				modified = %s
+			WHERE name IN %s
+		""", tuple(case_values) + (now, now, tuple(vehicle_to_sub)))
+		
+		sub_to_vehicle = {sub: vehicle for vehicle, sub in vehicle_to_sub.items()}
+		case_sql, case_values = _vehicle_cases(sub_to_vehicle)
+		frappe.db.sql(f"""
+			UPDATE `tabTukTuk Substitute Driver`
+			SET assigned_tuktuk = CASE name {case_sql} END,
+				assignment_date = %s,
+				status = IF(status = 'Inactive', status, 'On Assignment'),
+				modified = %s
+			WHERE name IN %s
+		""", tuple(case_values) + (now, now, tuple(sub_to_vehicle)))
+	
+	# Track assignment lifecycle on the roster rows
+	frappe.db.sql("""
+		UPDATE `tabTukTuk Substitute Assignment`
+		SET assignment_status = 'Completed'
+		WHERE parenttype = 'TukTuk Roster Period'
+		  AND date < %s
+		  AND assignment_status = 'Active'
+	""", (for_date,))
+	# Rows skipped as conflicts keep their status
+	if applied_rows:
+		frappe.db.sql("""
+			UPDATE `tabTukTuk Substitute Assignment`
+			SET assignment_status = 'Active'
+			WHERE name IN %s
+		""", (tuple(applied_rows),))
+	
+	# Refresh payment routing: drop cached vehicle/substitute docs so
+	# get_active_driver_for_vehicle sees today's substitute
+	for vehicle in set(vehicle_to_sub) | set(release):
+		frappe.clear_document_cache("TukTuk Vehicle", vehicle)
+	for sub in assigned_subs | released_subs:
+		frappe.clear_document_cache("TukTuk Substitute Driver", sub)
+	
+	frappe.db.commit()
+	
+	return {
+		"success": True,
+		"date": str(for_date),
+		"vehicles_subbed": len(vehicle_to_sub),
+		"vehicles_released": len(release)
+	}
@@ -5,6 +5,8 @@ import requests
 import json
 from frappe.utils import flt
 
+from tuktuk_management.utils.job_lock import mark_failed, single_flight, set_rows_touched
+
 # TextBee API Configuration
 TEXTBEE_DEVICE_ID = "692e1467d3fdd9bd6cf9b331"
 TEXTBEE_API_URL = f"https://api.textbee.dev/api/v1/gateway/devices/{TEXTBEE_DEVICE_ID}/send-sms"
@@ -412,7 +414,7 @@ def get_eligible_drivers_for_reminder():
                 "assigned_tuktuk": ["!=", ""],
                 "left_to_target": [">", 0]
             },
-            fields=["name", "driver_name", "mpesa_number", "left_to_target"]
+            fields=["name", "driver_name", "mpesa_number", "left_to_target", "current_balance"]
         )
         
         return drivers
@@ -425,10 +427,12 @@ def get_eligible_drivers_for_reminder():
         return []
 
 
+@single_flight()
 def send_driver_target_reminder():
     """
     Main scheduled task function to send target reminders to drivers
-    Sends SMS to all assigned drivers who haven't reached their daily target
+    Sends SMS to assigned drivers below target who are projected to miss it
+    by end of day (see target_forecast.forecast_end_of_day)
     """
     try:
         # Cache settings to avoid repeated DB queries
@@ -482,6 +486,12 @@ def send_driver_target_reminder():
             )
             return
         
+        # Only remind drivers who are projected to miss at their usual pace
+        from tuktuk_management.api.target_forecast import forecast_end_of_day
+        forecasts = forecast_end_of_day(drivers)
+        on_track_count = len([d for d in drivers if not forecasts[d.name]["likely_to_miss"]])
+        drivers = [d for d in drivers if forecasts[d.name]["likely_to_miss"]]
+        
         # Send SMS to each eligible driver
         success_count = 0
         failure_count = 0
@@ -490,6 +500,7 @@ def send_driver_target_reminder():
             driver_name = driver.get("driver_name", "Driver")
             mpesa_number = driver.get("mpesa_number")
             left_to_target = flt(driver.get("left_to_target", 0))
+            forecast = forecasts[driver.name]
             
             # Validate phone number exists
             if not mpesa_number:
@@ -502,6 +513,8 @@ def send_driver_target_reminder():
             
             # Format the message
             message = f"Hello {driver_name}! You have KES {left_to_target:,.0f} to complete today's target amount."
+            if forecast["projected"] is not None:
+                message += f" At your usual pace you will be KES {forecast['shortfall']:,.0f} short today."
             
             # Send SMS using generic router
             if send_sms(mpesa_number, message):
@@ -509,9 +522,12 @@ def send_driver_target_reminder():
             else:
                 failure_count += 1
         
+        set_rows_touched(success_count)
+
         # Log summary
         frappe.log_error(
             f"Driver Target SMS Reminder Summary:\n"
+            f"Drivers On Track (skipped): {on_track_count}\n"
             f"Total Eligible Drivers: {len(drivers)}\n"
             f"Successfully Sent: {success_count}\n"
             f"Failed: {failure_count}",
@@ -523,6 +539,7 @@ def send_driver_target_reminder():
             f"Critical error in send_driver_target_reminder: {str(e)}",
             "SMS Reminder Critical Error"
         )
+        mark_failed(e)
 
 
 @frappe.whitelist()
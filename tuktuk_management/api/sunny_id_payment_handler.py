@@ -157,6 +157,13 @@ def handle_sunny_id_payment(transaction_id, amount, sunny_id, customer_phone, tr
                 WHERE name = %s
             """, (target_reduction, global_target, target_reduction, deposited_amount, driver_data.name))
 
+            from tuktuk_management.api.driver_ledger import record_ledger_event
+            record_ledger_event(
+                driver_data.name, "Sunny ID Repayment",
+                balance_delta=target_reduction, deposit_delta=deposited_amount,
+                reference_doctype="TukTuk Transaction", reference_name=transaction.name
+            )
+
             # Add deposit transaction to child table using direct SQL INSERT
             # This avoids loading/saving the driver document which would trigger before_save hook
             if deposited_amount > 0:
@@ -0,0 +1,249 @@
+# ~/frappe-bench/apps/tuktuk_management/tuktuk_management/api/target_forecast.py
+"""
+Intraday target-attainment forecaster
+
+Builds per-driver, per-weekday intraday earning curves from TukTuk Transaction
+timestamps: for every hour of the day, the share of the day's target
+contribution a driver has usually collected by then. Curves are aggregated with
+one grouped SQL pass (driver x day x hour) and stored in Redis as
+exponentially-decayed accumulators, so the nightly job only has to fold in the
+days since the last run.
+
+The SMS target reminders use forecast_end_of_day() to text only the drivers who
+are projected to miss, quoting the projected shortfall.
+"""
+
+import frappe
+from frappe.utils import add_days, flt, getdate, now_datetime, today
+
+from tuktuk_management.utils.job_lock import mark_failed, single_flight, set_rows_touched
+
+CURVES_KEY = "tuktuk_intraday_curves"
+META_KEY = "tuktuk_intraday_curves_meta"
+FLEET = "__fleet__"
+
+HOURS = 24
+HISTORY_DAYS = 56  # Initial build window (8 weeks)
+DECAY = 0.85  # Weight kept by older days of the same weekday on every new one
+MIN_HISTORY_WEIGHT = 2.0  # Below this the fleet curve is used instead
+
+
+def _curve_key(driver, weekday):
+    return f"{driver}:{weekday}"
+
+
+def _load_curves():
+    """Cached curves keyed by str (hgetall returns the field names as bytes)"""
+    return {
+        frappe.safe_decode(key): curve
+        for key, curve in (frappe.cache().hgetall(CURVES_KEY) or {}).items()
+    }
+
+
+def _fetch_hourly_totals(from_date, to_date):
+    """
+    Hourly target contribution per driver per day for [from_date, to_date].
+
+    Returns:
+        dict: {(driver, date): [24 hourly sums]}
+    """
+    rows = frappe.db.sql("""
+        SELECT
+            driver,
+            DATE(timestamp) AS day,
+            HOUR(timestamp) AS hr,
+            SUM(target_contribution) AS contribution
+        FROM `tabTukTuk Transaction`
+        WHERE timestamp >= %s
+          AND timestamp < %s
+          AND driver IS NOT NULL
+          AND driver != ''
+          AND transaction_type NOT IN ('Adjustment', 'Driver Repayment')
+          AND payment_status = 'Completed'
+        GROUP BY driver, DATE(timestamp), HOUR(timestamp)
+    """, (f"{from_date} 00:00:00", f"{add_days(to_date, 1)} 00:00:00"), as_dict=True)
+
+    days = {}
+    for row in rows:
+        hourly = days.setdefault((row.driver, getdate(row.day)), [0.0] * HOURS)
+        hourly[int(row.hr)] += flt(row.contribution)
+    return days
+
+
+def _cumulative_share(hourly):
+    """Cumulative share of the day's total collected by the END of each hour"""
+    total = sum(hourly)
+    running = 0.0
+    shares = []
+    for value in hourly:
+        running += value
+        shares.append(running / total if total else 0.0)
+    return shares, total
+
+
+def _fold_day(curve, shares, total):
+    """Fold one day into a decayed accumulator"""
+    if not curve:
+        curve = {"weight": 0.0, "total": 0.0, "shares": [0.0] * HOURS}
+    curve["weight"] = curve["weight"] * DECAY + 1.0
+    curve["total"] = curve["total"] * DECAY + total
+    curve["shares"] = [old * DECAY + new for old, new in zip(curve["shares"], shares)]
+    return curve
+
+
+def update_curves(from_date, to_date):
+    """
+    Fold every day in [from_date, to_date] into the cached curves.
+
+    Returns:
+        int: Number of driver-days folded in
+    """
+    cache = frappe.cache()
+    curves = _load_curves()
+    touched = set()
+    days = _fetch_hourly_totals(from_date, to_date)
+
+    # Oldest first so decay weights the most recent days highest
+    fleet_days = {}
+    fleet_driver_counts = {}
+    for (driver, day), hourly in sorted(days.items(), key=lambda item: item[0][1]):
+        shares, total = _cumulative_share(hourly)
+        if not total:
+            continue
+        key = _curve_key(driver, day.weekday())
+        curves[key] = _fold_day(curves.get(key), shares, total)
+        touched.add(key)
+
+        fleet_hourly = fleet_days.setdefault(day, [0.0] * HOURS)
+        for hr, value in enumerate(hourly):
+            fleet_hourly[hr] += value
+        fleet_driver_counts[day] = fleet_driver_counts.get(day, 0) + 1
+
+    for day, hourly in sorted(fleet_days.items()):
+        shares, total = _cumulative_share(hourly)
+        # Fleet curve tracks the average driver, not the fleet sum
+        key = _curve_key(FLEET, day.weekday())
+        curves[key] = _fold_day(curves.get(key), shares, total / fleet_driver_counts[day])
+        touched.add(key)
+
+    for key in touched:
+        cache.hset(CURVES_KEY, key, curves[key])
+    cache.set_value(META_KEY, {"last_date": str(to_date), "updated_at": str(now_datetime())})
+
+    return len(days)
+
+
+@single_flight()
+def refresh_intraday_curves():
+    """
+    Nightly job: fold the days since the last run into the curves.
+    Does a full build over HISTORY_DAYS when the cache is empty.
+    """
+    try:
+        yesterday = getdate(add_days(today(), -1))
+        meta = frappe.cache().get_value(META_KEY) or {}
+
+        if meta.get("last_date"):
+            from_date = getdate(add_days(meta["last_date"], 1))
+        else:
+            frappe.cache().delete_value(CURVES_KEY)
+            from_date = getdate(add_days(yesterday, -HISTORY_DAYS + 1))
+
+        if from_date > yesterday:
+            return 0
+
+        folded = update_curves(from_date, yesterday)
+        set_rows_touched(folded)
+        return folded
+
+    except Exception as e:
+        frappe.log_error(f"Intraday curve refresh failed: {str(e)}", "Target Forecast Error")
+        mark_failed(e)
+
+
+@frappe.whitelist()
+def rebuild_intraday_curves():
+    """Drop the cached curves and rebuild them from HISTORY_DAYS of transactions"""
+    frappe.only_for(["System Manager", "Tuktuk Manager"])
+    frappe.cache().delete_value(CURVES_KEY)
+    frappe.cache().delete_value(META_KEY)
+    return {"success": True, "driver_days": refresh_intraday_curves() or 0}
+
+
+def _share_at(curve, moment):
+    """Expected share of the day's total collected by `moment`, interpolated within the hour"""
+    shares = [s / curve["weight"] for s in curve["shares"]]
+    hr = moment.hour
+    before = shares[hr - 1] if hr > 0 else 0.0
+    fraction_of_hour = moment.minute / 60.0
+    return min(1.0, before + (shares[hr] - before) * fraction_of_hour)
+
+
+def forecast_end_of_day(drivers, at=None):
+    """
+    Project each driver's end-of-day target attainment.
+
+    Args:
+        drivers: iterable of dicts with name, current_balance, left_to_target
+        at: datetime to forecast from (defaults to now)
+
+    Returns:
+        dict: {driver_name: {target, achieved, projected, shortfall, likely_to_miss, source}}
+              source is "driver", "fleet" or None when there is no usable history
+    """
+    at = at or now_datetime()
+    weekday = at.weekday()
+
+    curves = _load_curves()
+    fleet_curve = curves.get(_curve_key(FLEET, weekday))
+
+    forecasts = {}
+    for d in drivers:
+        achieved = flt(d.get("current_balance"))
+        target = achieved + flt(d.get("left_to_target"))
+
+        curve = curves.get(_curve_key(d.get("name"), weekday))
+        source = "driver"
+        if not curve or curve["weight"] < MIN_HISTORY_WEIGHT:
+            curve, source = fleet_curve, "fleet"
+
+        if not curve or not curve["weight"]:
+            forecasts[d.get("name")] = {
+                "target": target,
+                "achieved": achieved,
+                "projected": None,
+                "shortfall": flt(d.get("left_to_target")),
+                "likely_to_miss": flt(d.get("left_to_target")) > 0,
+                "source": None
+            }
+            continue
+
+        typical_total = curve["total"] / curve["weight"]
+        remaining_share = 1.0 - _share_at(curve, at)
+        projected = achieved + remaining_share * typical_total
+        shortfall = max(0.0, target - projected)
+
+        forecasts[d.get("name")] = {
+            "target": target,
+            "achieved": achieved,
+            "projected": projected,
+            "shortfall": shortfall,
+            "likely_to_miss": shortfall > 0,
+            "source": source
+        }
+
+    return forecasts
+
+
+@frappe.whitelist()
+def get_driver_forecasts():
+    """Current end-of-day forecast for every assigned driver still below target"""
+    drivers = frappe.get_all(
+        "TukTuk Driver",
+        filters={"assigned_tuktuk": ["!=", ""], "left_to_target": [">", 0]},
+        fields=["name", "driver_name", "current_balance", "left_to_target"]
+    )
+    forecasts = forecast_end_of_day(drivers)
+    for d in drivers:
+        d.update(forecasts.get(d.name, {}))
+    return drivers
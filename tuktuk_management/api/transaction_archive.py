@@ -0,0 +1,135 @@
+# ~/frappe-bench/apps/tuktuk_management/tuktuk_management/api/transaction_archive.py
+"""
+Cold archive for TukTuk Transaction
+
+Transactions older than TukTuk Settings.transaction_archive_months whole
+months are moved nightly into `tabTukTuk Transaction Archive`, a table with the
+same columns and indexes. Rows are moved with plain SQL, so the controller
+hooks do not fire and the driver daily rollup and revenue buckets keep their
+totals for archived days.
+
+The archive cutoff is kept in the global defaults. Range readers (statements,
+bulk statements, rollup/series rebuilds, daily report backfill) take their
+FROM clause from transaction_source(range_start): the live table alone when the
+range starts at or after the cutoff, otherwise a UNION ALL of live and archive.
+"""
+
+import frappe
+from frappe.utils import add_months, cint, get_datetime, get_first_day, getdate, today
+
+from tuktuk_management.utils.job_lock import mark_failed, single_flight, set_rows_touched
+
+LIVE_TABLE = "tabTukTuk Transaction"
+ARCHIVE_TABLE = "tabTukTuk Transaction Archive"
+CUTOFF_KEY = "tuktuk_transaction_archive_cutoff"
+BATCH_SIZE = 5000
+
+
+def ensure_archive_table(live_table=LIVE_TABLE, archive_table=ARCHIVE_TABLE):
+    """Create the archive table like the live one and add any columns added to the live table since"""
+    frappe.db.sql_ddl(f"CREATE TABLE IF NOT EXISTS `{archive_table}` LIKE `{live_table}`")
+
+    archive_columns = {
+        r[0] for r in frappe.db.sql(f"SHOW COLUMNS FROM `{archive_table}`")
+    }
+    for column in frappe.db.sql(f"SHOW FULL COLUMNS FROM `{live_table}`", as_dict=True):
+        if column.Field not in archive_columns:
+            default = "" if column.Default is None else f" DEFAULT {frappe.db.escape(column.Default)}"
+            frappe.db.sql_ddl(
+                f"ALTER TABLE `{archive_table}` ADD COLUMN `{column.Field}` {column.Type}{default}"
+            )
+
+
+def _column_list(live_table=LIVE_TABLE):
+    return ", ".join(f"`{r[0]}`" for r in frappe.db.sql(f"SHOW COLUMNS FROM `{live_table}`"))
+
+
+def get_archive_cutoff():
+    """Datetime before which transactions may live in the archive (None: nothing archived)"""
+    value = frappe.db.get_global(CUTOFF_KEY)
+    return get_datetime(value) if value else None
+
+
+def transaction_source(range_start=None):
+    """
+    FROM-clause expression for TukTuk Transaction reads starting at range_start
+    (None = unbounded). Use it aliased: f"FROM {transaction_source(start)} tt".
+    """
+    cutoff = get_archive_cutoff()
+    if not cutoff or (range_start and get_datetime(range_start) >= cutoff):
+        return f"`{LIVE_TABLE}`"
+
+    if not frappe.flags.tuktuk_transaction_columns:
+        frappe.flags.tuktuk_transaction_columns = _column_list()
+    columns = frappe.flags.tuktuk_transaction_columns
+    return (
+        f"(SELECT {columns} FROM `{LIVE_TABLE}` "
+        f"UNION ALL SELECT {columns} FROM `{ARCHIVE_TABLE}`)"
+    )
+
+
+def archive_before(cutoff, live_table=LIVE_TABLE, archive_table=ARCHIVE_TABLE):
+    """Move every row with timestamp < cutoff into the archive, one committed batch at a time"""
+    ensure_archive_table(live_table, archive_table)
+    columns = _column_list(live_table)
+    moved = 0
+
+    while True:
+        names = [r[0] for r in frappe.db.sql(f"""
+            SELECT name FROM `{live_table}`
+            WHERE timestamp < %s
+            ORDER BY timestamp
+            LIMIT {BATCH_SIZE}
+        """, (cutoff,))]
+        if not names:
+            break
+
+        frappe.db.sql(f"""
+            REPLACE INTO `{archive_table}` ({columns})
+            SELECT {columns} FROM `{live_table}` WHERE name IN %s
+        """, (tuple(names),))
+        frappe.db.sql(f"DELETE FROM `{live_table}` WHERE name IN %s", (tuple(names),))
+        frappe.db.commit()
+        moved += len(names)
+
+    return moved
+
+
+@single_flight()
+def archive_old_transactions():
+    """Nightly: archive transactions older than the configured horizon"""
+    try:
+        months = cint(frappe.db.get_single_value("TukTuk Settings", "transaction_archive_months"))
+        if months <= 0:
+            return 0
+
+        cutoff = get_datetime(f"{get_first_day(add_months(today(), -months))} 00:00:00")
+
+        # Publish the cutoff before moving, so readers union the archive as soon as rows leave
+        current = get_archive_cutoff()
+        if not current or cutoff > current:
+            frappe.db.set_global(CUTOFF_KEY, str(cutoff))
+            frappe.db.commit()
+
+        moved = archive_before(cutoff)
+        set_rows_touched(moved)
+        return moved
+
+    except Exception as e:
+        frappe.db.rollback()
+        frappe.log_error(f"Transaction archival failed: {str(e)}", "Transaction Archive Error")
+        mark_failed(e)
+
+
+def restore_archived_transactions(from_date, to_date):
+    """Move archived transactions of [from_date, to_date] back into the live table (e.g. for corrections)"""
+    columns = _column_list()
+    start = f"{getdate(from_date)} 00:00:00"
+    end = f"{getdate(to_date)} 23:59:59.999999"
+
+    frappe.db.sql(f"""
+        REPLACE INTO `{LIVE_TABLE}` ({columns})
+        SELECT {columns} FROM `{ARCHIVE_TABLE}` WHERE timestamp BETWEEN %s AND %s
+    """, (start, end))
+    frappe.db.sql(f"DELETE FROM `{ARCHIVE_TABLE}` WHERE timestamp BETWEEN %s AND %s", (start, end))
+    frappe.db.commit()
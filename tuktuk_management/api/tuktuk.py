@@ -17,6 +17,11 @@ from tuktuk_management.api.sunny_id_payment_handler import (
 # Import B2C payment function from sendpay module
 from tuktuk_management.api.sendpay import send_mpesa_payment
 
+from tuktuk_management.utils.job_lock import single_flight, add_rows_touched, mark_failed
+from tuktuk_management.api.revenue_series import record_payment, crossed_target
+from tuktuk_management.api.driver_ledger import record_ledger_event, record_ledger_events, record_checkpoints
+from tuktuk_management.utils.job_queues import enqueue_job, REPORTS
+
 # PRODUCTION Daraja API Configuration
 PRODUCTION_BASE_URL = "https://api.safaricom.co.ke"
 SANDBOX_BASE_URL = "https://sandbox.safaricom.co.ke"
@@ -65,6 +70,20 @@ def get_active_driver_for_vehicle(tuktuk_name):
         return None
 
 
+def record_ride_in_series(transaction, reached_target):
+    """Add a completed ride payment to the hourly revenue series"""
+    from tuktuk_management.api.driver_rollup import get_party_day_totals
+
+    party = transaction.driver or transaction.substitute_driver
+    day_totals = get_party_day_totals(party, getdate(transaction.timestamp))
+    record_payment(
+        transaction.timestamp,
+        transaction.amount,
+        first_ride_of_day=day_totals.trips == 1,
+        reached_target=reached_target
+    )
+
+
 def process_regular_driver_payment(driver_doc, tuktuk, transaction_id, amount, customer_phone, trans_time):
     """
     Process payment for regular driver with standard target logic.
@@ -143,6 +162,16 @@ def process_regular_driver_payment(driver_doc, tuktuk, transaction_id, amount, c
         """,
         (target_contribution, global_target, target_contribution, driver_doc.name),
     )
+    record_ledger_event(
+        driver_doc.name, "Payment", balance_delta=target_contribution,
+        reference_doctype="TukTuk Transaction", reference_name=transaction.name
+    )
+
+    # Hourly revenue series (same savepoint as the transaction insert)
+    record_ride_in_series(
+        transaction,
+        crossed_target(before_balance, target_contribution, effective_target)
+    )
 
     # LOGGING: Verify the update worked correctly
     after_state = frappe.db.get_value(
@@ -247,25 +276,38 @@ def process_substitute_driver_payment(driver_doc, tuktuk, transaction_id, amount
     })
     transaction.insert(ignore_permissions=True)
     
-    # Update substitute driver stats atomically
+    # Update substitute driver stats atomically. The day counter compares the
+    # stored last_worked_date (assignments are evaluated left to right), not the
+    # in-memory doc, so concurrent first payments of a day count it once.
     frappe.db.sql("""
         UPDATE `tabTukTuk Substitute Driver`
-        SET todays_earnings = todays_earnings + %s,
-            todays_target_contribution = todays_target_contribution + %s,
-            target_balance = target_balance - %s,
-            total_earnings = total_earnings + %s,
-            total_rides = total_rides + 1
-        WHERE name = %s
-    """, (driver_share, target_contribution, target_contribution, driver_share, driver_doc.name))
+        SET todays_earnings = todays_earnings + %(driver_share)s,
+            todays_target_contribution = todays_target_contribution + %(target_contribution)s,
+            target_balance = target_balance - %(target_contribution)s,
+            total_earnings = total_earnings + %(driver_share)s,
+            total_rides = total_rides + 1,
+            total_days_worked = COALESCE(total_days_worked, 0)
+                + IF(last_worked_date IS NOT NULL AND last_worked_date = %(today)s, 0, 1),
+            last_worked_date = %(today)s
+        WHERE name = %(name)s
+    """, {
+        "driver_share": driver_share,
+        "target_contribution": target_contribution,
+        "today": today(),
+        "name": driver_doc.name
+    })
     
-    # Update last worked date if needed
-    if driver_doc.last_worked_date != today():
-        frappe.db.sql("""
-            UPDATE `tabTukTuk Substitute Driver`
-            SET last_worked_date = %s,
-                total_days_worked = total_days_worked + 1
-            WHERE name = %s
-        """, (today(), driver_doc.name))
+    # Hourly revenue series (same savepoint as the transaction insert). The
+    # contribution before this ride is derived from the row we just updated:
+    # driver_doc was loaded before the UPDATE and misses concurrent payments.
+    substitute_target = driver_doc.daily_target or frappe.db.get_single_value("TukTuk Settings", "global_daily_target")
+    todays_contribution = flt(frappe.db.get_value(
+        "TukTuk Substitute Driver", driver_doc.name, "todays_target_contribution"
+    ))
+    record_ride_in_series(
+        transaction,
+        crossed_target(todays_contribution - target_contribution, target_contribution, substitute_target)
+    )
     
     return {
         'transaction_name': transaction.name,
@@ -1105,6 +1147,10 @@ def process_uncaptured_payment(driver, tuktuk, transaction_id, customer_phone, a
                         )
                     WHERE name = %s
                 """, (target_contribution, global_target, target_contribution, driver))
+                record_ledger_event(
+                    driver, "Payment", balance_delta=target_contribution,
+                    reference_doctype="TukTuk Transaction", reference_name=transaction.name
+                )
             
             # Commit before sending B2C payment
             frappe.db.commit()
@@ -1120,6 +1166,10 @@ def process_uncaptured_payment(driver, tuktuk, transaction_id, customer_phone, a
                     payment_success = True
                     transaction.payment_status = "Completed"
                     transaction.save(ignore_permissions=True)
+                    record_ride_in_series(
+                        transaction,
+                        crossed_target(driver_doc.current_balance, target_contribution, target)
+                    )
                     frappe.db.commit()
                     
                     frappe.log_error("Uncaptured Payment - B2C Success",
@@ -1185,6 +1235,10 @@ def process_uncaptured_payment(driver, tuktuk, transaction_id, customer_phone, a
                     )
                 WHERE name = %s
             """, (amount, global_target, amount, driver))
+            record_ledger_event(
+                driver, "Payment", balance_delta=amount,
+                reference_doctype="TukTuk Transaction", reference_name=transaction.name
+            )
             
             frappe.db.commit()
             
@@ -1478,6 +1532,7 @@ def handle_vehicle_status_change(doc, method):
 
 # ===== DAILY OPERATIONS =====
 
+@single_flight()
 def reset_daily_targets_with_deposit():
     """Enhanced reset daily targets with deposit deduction option"""
     
@@ -1632,6 +1687,7 @@ def reset_daily_targets_with_deposit():
             new_target = driver_doc.daily_target or settings.global_daily_target
             driver_doc.left_to_target = new_target
             driver_doc.flags.skip_left_to_target_update = True
+            driver_doc.flags.ledger_event = "Daily Reset"
                 
             driver_doc.save()
             processed_count += 1
@@ -1663,9 +1719,13 @@ def reset_daily_targets_with_deposit():
                 "Target Reset - Substitute Driver Error"
             )
     
+    # Checkpoint every driver's balances; ledger verification starts from here
+    record_checkpoints(remarks=f"Daily reset {today}")
+    
     # Update the last reset date in settings
     frappe.db.set_value("TukTuk Settings", "TukTuk Settings", "last_daily_reset_date", today)
     frappe.db.commit()
+    add_rows_touched(processed_count + substitute_processed_count)
     
     # Log completion summary
     frappe.log_error(
@@ -1784,6 +1844,10 @@ def migrate_negative_balances_to_targets():
                     rollover_target_set_date = NOW()
                 WHERE name = %s
             """, (new_individual_target, driver_data.name))
+            record_ledger_event(
+                driver_data.name, "Debt Rollover", balance_delta=-flt(driver_data.current_balance),
+                remarks=f"Debt of {debt} moved into individual target {new_individual_target}"
+            )
 
             migration_info = {
                 "driver": driver_data.driver_name,
@@ -1835,444 +1899,170 @@ def migrate_negative_balances_to_targets():
             "message": f"Migration failed: {str(e)}"
         }
 
+@single_flight()
 def start_operating_hours():
     """Start of operating hours tasks"""
     try:
         frappe.db.set_value("TukTuk Settings", None, "system_active", 1)
         
-        # Reset any stalled statuses from previous day
-        vehicles = frappe.get_all("TukTuk Vehicle", 
-                                # filters={"status": ["in", ["Charging", "Assigned"]]})
-                                filters={"status": ["in", ["Charging"]]})
-        for vehicle in vehicles:
-            tuktuk = frappe.get_doc("TukTuk Vehicle", vehicle.name)
-            if not frappe.db.exists("TukTuk Rental", {"rented_tuktuk": tuktuk.name, "status": "Active"}):
-                tuktuk.status = "Available"
-                tuktuk.save()
+        # Reset any stalled statuses from previous day:
+        # Charging vehicles with no active rental (anti-join) go back to Available
+        vehicles = frappe.db.sql_list("""
+            SELECT v.name
+            FROM `tabTukTuk Vehicle` v
+            LEFT JOIN `tabTukTuk Rental` r
+                ON r.rented_tuktuk = v.name
+                AND r.status = 'Active'
+            WHERE v.status = 'Charging'
+              AND r.name IS NULL
+        """)
+        
+        if vehicles:
+            set_vehicle_status_bulk(vehicles, "Available")
+            add_rows_touched(len(vehicles))
                 
         frappe.db.commit()
     except Exception as e:
         frappe.log_error(f"Error in start_operating_hours: {str(e)}")
+        mark_failed(e)
+    
+    # Put today's roster substitutes on their vehicles before the first ride
+    try:
+        from tuktuk_management.api.roster import activate_substitute_assignments
+        result = activate_substitute_assignments()
+        add_rows_touched(result["vehicles_subbed"] + result["vehicles_released"])
+    except Exception as e:
+        frappe.db.rollback()
+        frappe.log_error(f"Error activating roster substitutes: {str(e)}", "Roster Activation Error")
+        mark_failed(e)
 
+@single_flight()
 def end_operating_hours():
     """End of operating hours tasks"""
     try:
         frappe.db.set_value("TukTuk Settings", None, "system_active", 0)
-        
-        # Generate end of day report
-        generate_daily_reports()
         frappe.db.commit()
-    except Exception as e:
-        frappe.log_error(f"Error in end_operating_hours: {str(e)}")
-
-def generate_daily_reports():
-    """Generate daily operational reports"""
-    try:
-        # Report date is today (the day that just ended at midnight EAT)
-        report_date = frappe.utils.today()
-        # Use SQL for date-based aggregation to avoid datetime filter issues
-        # Query for today's data (the day that just completed)
-        total_revenue = frappe.db.sql("""
-            SELECT COALESCE(SUM(amount), 0) as revenue
-            FROM `tabTukTuk Transaction`
-            WHERE DATE(timestamp) = CURDATE()
-            AND transaction_type NOT IN ('Adjustment', 'Driver Repayment')
-            AND payment_status = 'Completed'
-        """, as_dict=True)[0].revenue
-
-        total_driver_payments = frappe.db.sql("""
-            SELECT COALESCE(SUM(driver_share), 0) as driver_payments
-            FROM `tabTukTuk Transaction`
-            WHERE DATE(timestamp) = CURDATE()
-            AND transaction_type NOT IN ('Adjustment', 'Driver Repayment')
-            AND payment_status = 'Completed'
-        """, as_dict=True)[0].driver_payments
-
-        total_target_contributions = frappe.db.sql("""
-            SELECT COALESCE(SUM(target_contribution), 0) as target_contrib
-            FROM `tabTukTuk Transaction`
-            WHERE DATE(timestamp) = CURDATE()
-            AND transaction_type NOT IN ('Adjustment', 'Driver Repayment')
-            AND payment_status = 'Completed'
-        """, as_dict=True)[0].target_contrib
-
-        # Get driver performance using configured global target (fallback to 3000)
-        settings = frappe.get_single("TukTuk Settings")
-        target_threshold = settings.global_daily_target or 3000
-
-        # Calculate drivers at target based on actual transactions for today
-        # (Note: This runs AFTER daily reset, so current_balance is already 0)
-        # Sum up target_contribution per driver for today
-        drivers_performance = frappe.db.sql("""
-            SELECT 
-                driver,
-                SUM(target_contribution) as daily_total
-            FROM `tabTukTuk Transaction`
-            WHERE DATE(timestamp) = CURDATE()
-            AND transaction_type NOT IN ('Adjustment', 'Driver Repayment')
-            AND payment_status = 'Completed'
-            GROUP BY driver
-            HAVING daily_total >= %s
-        """, (target_threshold,), as_dict=True)
-        
-        drivers_at_target = len(drivers_performance)
-        
-        # Total drivers for rate calculation (count drivers who had transactions today)
-        total_drivers_query = frappe.db.sql("""
-            SELECT COUNT(DISTINCT driver) as cnt
-            FROM `tabTukTuk Transaction`
-            WHERE DATE(timestamp) = CURDATE()
-            AND transaction_type NOT IN ('Adjustment', 'Driver Repayment')
-        """, as_dict=True)
-        
-        total_drivers = total_drivers_query[0].cnt if total_drivers_query[0].cnt > 0 else 1
-        
-        # Transaction count for report date (excluding adjustments/repayments)
-        transaction_count = frappe.db.sql("""
-            SELECT COUNT(*) as cnt
-            FROM `tabTukTuk Transaction`
-            WHERE DATE(timestamp) = CURDATE()
-            AND transaction_type NOT IN ('Adjustment', 'Driver Repayment')
-        """, as_dict=True)[0].cnt
-        
-        # Count inactive drivers (not assigned to any tuktuk)
-        inactive_drivers = frappe.db.count("TukTuk Driver", {
-            "assigned_tuktuk": ["in", ["", None]]
-        })
         
-        # Count drivers needing attention
-        # Drivers who did not meet their daily target
-        # Use each driver's individual target or fall back to global target
-        # Include all assigned drivers, even those with 0 transactions
-        drivers_below_target_data = frappe.db.sql("""
-            SELECT 
-                d.name as driver,
-                COALESCE(SUM(t.target_contribution), 0) as daily_total,
-                COALESCE(d.daily_target, %s) as driver_target
-            FROM `tabTukTuk Driver` d
-            LEFT JOIN `tabTukTuk Transaction` t 
-                ON d.name = t.driver 
-                AND DATE(t.timestamp) = CURDATE()
-                AND t.transaction_type NOT IN ('Adjustment', 'Driver Repayment')
-                AND t.payment_status = 'Completed'
-            WHERE d.assigned_tuktuk IS NOT NULL 
-            AND d.assigned_tuktuk != ''
-            GROUP BY d.name, d.daily_target
-            HAVING daily_total < driver_target
-        """, (target_threshold,), as_dict=True)
-        
-        drivers_below_target = len(drivers_below_target_data)
-        drivers_below_target_list = [d.driver for d in drivers_below_target_data]
-        
-        # Drivers with consecutive misses >= 2
-        drivers_at_risk_data = frappe.get_all("TukTuk Driver", 
-            filters={
-                "consecutive_misses": [">=", 2],
-                "assigned_tuktuk": ["!=", ""]
-            },
-            fields=["name"]
+        # Generate end of day report in its own job, outside the closing transaction
+        enqueue_job(
+            "tuktuk_management.api.tuktuk.generate_daily_reports",
+            queue=REPORTS,
+            dedupe_key=f"daily_report::{frappe.utils.today()}"
         )
-        drivers_at_risk = len(drivers_at_risk_data)
-        drivers_at_risk_list = [d.name for d in drivers_at_risk_data]
-
-        report = f"""
-📊 SUNNY TUKTUK DAILY REPORT - {report_date}
+    except Exception as e:
+        frappe.log_error(f"Error in end_operating_hours: {str(e)}")
+        mark_failed(e)
 
-💰 FINANCIAL SUMMARY:
-- Total Revenue: {total_revenue:,.0f} KSH
-- Driver Payments: {total_driver_payments:,.0f} KSH
-- Target Contributions: {total_target_contributions:,.0f} KSH
-- Transaction Count: {transaction_count}
+def set_vehicle_status_bulk(vehicle_names, status):
+    """
+    Set status on many vehicles with one UPDATE and drop their cached documents.
+    Bypasses per-document save hooks - only use for plain status transitions.
+    """
+    if not vehicle_names:
+        return
+    
+    frappe.db.sql("""
+        UPDATE `tabTukTuk Vehicle`
+        SET status = %(status)s,
+            modified = %(modified)s,
+            modified_by = %(user)s
+        WHERE name IN %(names)s
+    """, {
+        "status": status,
+        "modified": now_datetime(),
+        "user": frappe.session.user,
+        "names": tuple(vehicle_names)
+    })
+    
+    for name in vehicle_names:
+        frappe.clear_document_cache("TukTuk Vehicle", name)
 
-👥 DRIVER PERFORMANCE:
-- Drivers at Target: {drivers_at_target}
-- Target Achievement Rate: {drivers_at_target/total_drivers*100:.1f}%
-- Inactive Drivers: {inactive_drivers}
+def generate_daily_reports(report_date=None):
+    """Generate daily operational reports"""
+    from tuktuk_management.api.daily_report import (
+        compute_daily_report_metrics, build_daily_report_text, save_daily_report
+    )
 
-⚠️ NEEDS ATTENTION:
-- Drivers who did not meet target: {drivers_below_target}
-- Drivers with consecutive misses (≥2): {drivers_at_risk}
+    try:
+        # Report date is today (the day that just ended at midnight EAT).
+        # All figures come from one grouped pass so the email and the saved
+        # report can never disagree.
+        metrics = compute_daily_report_metrics(report_date or frappe.utils.today())
+        report = build_daily_report_text(metrics)
+        report_date = metrics["report_date"]
 
-🚗 FLEET STATUS:
-- Active TukTuks: {frappe.db.count('TukTuk Vehicle', {'status': 'Assigned'})}
-- Available TukTuks: {frappe.db.count('TukTuk Vehicle', {'status': 'Available'})}
-- Charging TukTuks: {frappe.db.count('TukTuk Vehicle', {'status': 'Charging'})}
-        """
-        
         # Email report to management
         frappe.sendmail(
             recipients=["yuda@sunnytuktuk.com"],
             subject=f"Daily Operations Report - {report_date}",
             message=report
         )
-        
+
         # Save report to database for historical tracking
         try:
-            # Check if report already exists for this date
-            existing_report = frappe.db.exists("TukTuk Daily Report", {"report_date": report_date})
-            
-            if existing_report:
-                # Update existing report
-                daily_report = frappe.get_doc("TukTuk Daily Report", existing_report)
-            else:
-                # Create new report
-                daily_report = frappe.new_doc("TukTuk Daily Report")
-                daily_report.report_date = report_date
-            
-            # Set all the fields
-            daily_report.total_revenue = total_revenue
-            daily_report.total_driver_share = total_driver_payments
-            daily_report.total_target_contribution = total_target_contributions
-            daily_report.total_transactions = transaction_count
-            daily_report.drivers_at_target = drivers_at_target
-            daily_report.total_drivers = total_drivers
-            daily_report.target_achievement_rate = (drivers_at_target/total_drivers*100) if total_drivers > 0 else 0
-            daily_report.inactive_drivers = inactive_drivers
-            daily_report.drivers_below_target = drivers_below_target
-            daily_report.drivers_at_risk = drivers_at_risk
-            daily_report.active_tuktuks = frappe.db.count('TukTuk Vehicle', {'status': 'Assigned'})
-            daily_report.available_tuktuks = frappe.db.count('TukTuk Vehicle', {'status': 'Available'})
-            daily_report.charging_tuktuks = frappe.db.count('TukTuk Vehicle', {'status': 'Charging'})
-            daily_report.report_text = report
-            daily_report.email_sent = 1
-            daily_report.email_sent_at = frappe.utils.now()
-            
-            # Set the driver lists (Long Text fields - comma-separated)
-            daily_report.drivers_below_target_list = ", ".join(drivers_below_target_list) if drivers_below_target_list else ""
-            daily_report.drivers_at_risk_list = ", ".join(drivers_at_risk_list) if drivers_at_risk_list else ""
-            
-            daily_report.save(ignore_permissions=True)
+            save_daily_report(metrics, report, email_sent=True)
             frappe.db.commit()
-            
+
             frappe.log_error("Daily Report Generated and Saved", f"Report saved to database for {report_date}")
-            
+
         except Exception as save_error:
             frappe.log_error(f"Failed to save daily report to database: {str(save_error)}", "Daily Report Save Error")
-        
+
     except Exception as e:
         frappe.log_error(f"Failed to generate daily report: {str(e)}")
 
 @frappe.whitelist()
 def test_daily_report(report_date=None):
     """Generate a test daily report for a specific date"""
-    try:
-        if not report_date:
-            report_date = frappe.utils.today()
-        
-        # Use SQL for date-based aggregation with specific date
-        total_revenue = frappe.db.sql("""
-            SELECT COALESCE(SUM(amount), 0) as revenue
-            FROM `tabTukTuk Transaction`
-            WHERE DATE(timestamp) = %s
-            AND transaction_type NOT IN ('Adjustment', 'Driver Repayment')
-            AND payment_status = 'Completed'
-        """, (report_date,), as_dict=True)[0].revenue
-
-        total_driver_payments = frappe.db.sql("""
-            SELECT COALESCE(SUM(driver_share), 0) as driver_payments
-            FROM `tabTukTuk Transaction`
-            WHERE DATE(timestamp) = %s
-            AND transaction_type NOT IN ('Adjustment', 'Driver Repayment')
-            AND payment_status = 'Completed'
-        """, (report_date,), as_dict=True)[0].driver_payments
+    from tuktuk_management.api.daily_report import compute_daily_report_metrics, build_daily_report_text
 
-        total_target_contributions = frappe.db.sql("""
-            SELECT COALESCE(SUM(target_contribution), 0) as target_contrib
-            FROM `tabTukTuk Transaction`
-            WHERE DATE(timestamp) = %s
-            AND transaction_type NOT IN ('Adjustment', 'Driver Repayment')
-            AND payment_status = 'Completed'
-        """, (report_date,), as_dict=True)[0].target_contrib
-
-        # Get driver performance using configured global target (fallback to 3000)
-        settings = frappe.get_single("TukTuk Settings")
-        target_threshold = settings.global_daily_target or 3000
-
-        # Calculate drivers at target based on actual transactions for that specific date
-        # Sum up target_contribution per driver for the report date
-        drivers_performance = frappe.db.sql("""
-            SELECT 
-                driver,
-                SUM(target_contribution) as daily_total
-            FROM `tabTukTuk Transaction`
-            WHERE DATE(timestamp) = %s
-            AND transaction_type NOT IN ('Adjustment', 'Driver Repayment')
-            AND payment_status = 'Completed'
-            GROUP BY driver
-            HAVING daily_total >= %s
-        """, (report_date, target_threshold), as_dict=True)
-        
-        drivers_at_target = len(drivers_performance)
-        
-        # Total drivers for rate calculation (count drivers who had transactions that day)
-        total_drivers_query = frappe.db.sql("""
-            SELECT COUNT(DISTINCT driver) as cnt
-            FROM `tabTukTuk Transaction`
-            WHERE DATE(timestamp) = %s
-            AND transaction_type NOT IN ('Adjustment', 'Driver Repayment')
-        """, (report_date,), as_dict=True)
-        
-        total_drivers = total_drivers_query[0].cnt if total_drivers_query[0].cnt > 0 else 1
-        
-        # Transaction count for report date (excluding adjustments/repayments)
-        transaction_count = frappe.db.sql("""
-            SELECT COUNT(*) as cnt
-            FROM `tabTukTuk Transaction`
-            WHERE DATE(timestamp) = %s
-            AND transaction_type NOT IN ('Adjustment', 'Driver Repayment')
-        """, (report_date,), as_dict=True)[0].cnt
-        
-        # Count inactive drivers (not assigned to any tuktuk)
-        inactive_drivers = frappe.db.count("TukTuk Driver", {
-            "assigned_tuktuk": ["in", ["", None]]
-        })
-        
-        # Count drivers needing attention
-        # Drivers who did not meet their daily target for the specific date
-        # Use each driver's individual target or fall back to global target
-        # Include all assigned drivers, even those with 0 transactions
-        drivers_below_target_data = frappe.db.sql("""
-            SELECT 
-                d.name as driver,
-                COALESCE(SUM(t.target_contribution), 0) as daily_total,
-                COALESCE(d.daily_target, %s) as driver_target
-            FROM `tabTukTuk Driver` d
-            LEFT JOIN `tabTukTuk Transaction` t 
-                ON d.name = t.driver 
-                AND DATE(t.timestamp) = %s
-                AND t.transaction_type NOT IN ('Adjustment', 'Driver Repayment')
-                AND t.payment_status = 'Completed'
-            WHERE d.assigned_tuktuk IS NOT NULL 
-            AND d.assigned_tuktuk != ''
-            GROUP BY d.name, d.daily_target
-            HAVING daily_total < driver_target
-        """, (target_threshold, report_date), as_dict=True)
-        
-        drivers_below_target = len(drivers_below_target_data)
-        drivers_below_target_list = [d.driver for d in drivers_below_target_data]
-        
-        # Drivers with consecutive misses >= 2 (current status)
-        drivers_at_risk_data = frappe.get_all("TukTuk Driver", 
-            filters={
-                "consecutive_misses": [">=", 2],
-                "assigned_tuktuk": ["!=", ""]
-            },
-            fields=["name"]
-        )
-        drivers_at_risk = len(drivers_at_risk_data)
-        drivers_at_risk_list = [d.name for d in drivers_at_risk_data]
-
-        report = f"""
-📊 SUNNY TUKTUK DAILY REPORT - {report_date}
-
-💰 FINANCIAL SUMMARY:
-- Total Revenue: {total_revenue:,.0f} KSH
-- Driver Payments: {total_driver_payments:,.0f} KSH
-- Target Contributions: {total_target_contributions:,.0f} KSH
-- Transaction Count: {transaction_count}
+    try:
+        metrics = compute_daily_report_metrics(report_date or frappe.utils.today())
+        report = build_daily_report_text(metrics)
 
-👥 DRIVER PERFORMANCE:
-- Drivers at Target: {drivers_at_target}
-- Target Achievement Rate: {drivers_at_target/total_drivers*100:.1f}%
-- Inactive Drivers: {inactive_drivers}
+        frappe.msgprint(f"<pre>{report}</pre>", title=f"Test Daily Report - {metrics['report_date']}")
 
-⚠️ NEEDS ATTENTION:
-- Drivers who did not meet target: {drivers_below_target}
-- Drivers with consecutive misses (≥2): {drivers_at_risk}
+        metrics.pop("contribution_by_driver", None)
+        metrics["report_text"] = report
+        return metrics
 
-🚗 FLEET STATUS:
-- Active TukTuks: {frappe.db.count('TukTuk Vehicle', {'status': 'Assigned'})}
-- Available TukTuks: {frappe.db.count('TukTuk Vehicle', {'status': 'Available'})}
-- Charging TukTuks: {frappe.db.count('TukTuk Vehicle', {'status': 'Charging'})}
-        """
-        
-        frappe.msgprint(f"<pre>{report}</pre>", title=f"Test Daily Report - {report_date}")
-        
-        return {
-            "report_date": report_date,
-            "total_revenue": total_revenue,
-            "total_driver_payments": total_driver_payments,
-            "total_target_contributions": total_target_contributions,
-            "transaction_count": transaction_count,
-            "drivers_at_target": drivers_at_target,
-            "total_drivers": total_drivers,
-            "inactive_drivers": inactive_drivers,
-            "drivers_below_target": drivers_below_target,
-            "drivers_below_target_list": drivers_below_target_list,
-            "drivers_at_risk": drivers_at_risk,
-            "drivers_at_risk_list": drivers_at_risk_list,
-            "report_text": report
-        }
-        
     except Exception as e:
         frappe.throw(f"Failed to generate test daily report: {str(e)}")
 
 @frappe.whitelist()
 def send_daily_report_email(report_date=None, save_to_db=True):
     """Send the daily report email for a specific date"""
+    from tuktuk_management.api.daily_report import (
+        compute_daily_report_metrics, build_daily_report_text, save_daily_report
+    )
+
     try:
-        # Use test_daily_report to get the report data
-        report_data = test_daily_report(report_date)
-        
+        metrics = compute_daily_report_metrics(report_date or frappe.utils.today())
+        report = build_daily_report_text(metrics)
+
         # Send the actual email
         frappe.sendmail(
             recipients=["yuda@sunnytuktuk.com"],
-            subject=f"Daily Operations Report - {report_data['report_date']}",
-            message=report_data['report_text']
+            subject=f"Daily Operations Report - {metrics['report_date']}",
+            message=report
         )
-        
+
         # Save to database if requested
-        if save_to_db:
+        if frappe.utils.cint(save_to_db):
             try:
-                # Check if report already exists for this date
-                existing_report = frappe.db.exists("TukTuk Daily Report", {"report_date": report_data['report_date']})
-                
-                if existing_report:
-                    # Update existing report
-                    daily_report = frappe.get_doc("TukTuk Daily Report", existing_report)
-                else:
-                    # Create new report
-                    daily_report = frappe.new_doc("TukTuk Daily Report")
-                    daily_report.report_date = report_data['report_date']
-                
-                # Set all the fields from report_data
-                daily_report.total_revenue = report_data['total_revenue']
-                daily_report.total_driver_share = report_data['total_driver_payments']
-                daily_report.total_target_contribution = report_data['total_target_contributions']
-                daily_report.total_transactions = report_data['transaction_count']
-                daily_report.drivers_at_target = report_data['drivers_at_target']
-                daily_report.total_drivers = report_data['total_drivers']
-                daily_report.target_achievement_rate = (report_data['drivers_at_target']/report_data['total_drivers']*100) if report_data['total_drivers'] > 0 else 0
-                daily_report.inactive_drivers = report_data['inactive_drivers']
-                daily_report.drivers_below_target = report_data['drivers_below_target']
-                daily_report.drivers_at_risk = report_data['drivers_at_risk']
-                daily_report.active_tuktuks = frappe.db.count('TukTuk Vehicle', {'status': 'Assigned'})
-                daily_report.available_tuktuks = frappe.db.count('TukTuk Vehicle', {'status': 'Available'})
-                daily_report.charging_tuktuks = frappe.db.count('TukTuk Vehicle', {'status': 'Charging'})
-                daily_report.report_text = report_data['report_text']
-                daily_report.email_sent = 1
-                daily_report.email_sent_at = frappe.utils.now()
-                
-                # Set the driver lists (Long Text fields - comma-separated)
-                driver_below_list = report_data.get('drivers_below_target_list', [])
-                daily_report.drivers_below_target_list = ", ".join(driver_below_list) if driver_below_list else ""
-                
-                driver_risk_list = report_data.get('drivers_at_risk_list', [])
-                daily_report.drivers_at_risk_list = ", ".join(driver_risk_list) if driver_risk_list else ""
-                
-                daily_report.save(ignore_permissions=True)
+                save_daily_report(metrics, report, email_sent=True)
                 frappe.db.commit()
-                
+
             except Exception as save_error:
                 frappe.log_error(f"Failed to save daily report: {str(save_error)}", "Daily Report Save Error")
-        
+
         return {
             "success": True,
-            "message": f"Daily report email sent successfully for {report_data['report_date']}",
+            "message": f"Daily report email sent successfully for {metrics['report_date']}",
             "recipient": "yuda@sunnytuktuk.com",
             "saved_to_db": save_to_db
         }
-        
+
     except Exception as e:
         frappe.throw(f"Failed to send daily report email: {str(e)}")
 
@@ -2830,13 +2620,9 @@ def get_system_status():
             "timestamp": [">=", frappe.utils.today()]
         })
         
-        # Calculate today's revenue
-        today_revenue = frappe.db.sql("""
-            SELECT COALESCE(SUM(amount), 0) as revenue
-            FROM `tabTukTuk Transaction`
-            WHERE DATE(timestamp) = CURDATE()
-            AND payment_status = 'Completed'
-        """, as_dict=True)[0].revenue
+        # Today's ride revenue from the hourly revenue series
+        from tuktuk_management.api.revenue_series import get_day_totals
+        today_revenue = flt(get_day_totals(frappe.utils.today()).revenue)
         
         return {
             "environment": "PRODUCTION",
@@ -3132,6 +2918,7 @@ def update_vehicle_statuses():
 
 # ===== BATTERY MANAGEMENT FUNCTIONS =====
 
+@single_flight()
 def check_battery_levels():
     """
     Scheduled task to check battery levels and send alerts
@@ -3139,10 +2926,11 @@ def check_battery_levels():
     """
     try:
         from tuktuk_management.api.battery_utils import check_low_battery_alerts
-        check_low_battery_alerts()
+        add_rows_touched(check_low_battery_alerts())
         frappe.logger().info("Battery level check completed successfully")
     except Exception as e:
         frappe.log_error(f"Battery level check failed: {str(e)}", "Battery Check Error")
+        mark_failed(e)
 
 def update_vehicle_battery_from_telemetry():
     """
@@ -3228,26 +3016,26 @@ def reconcile_driver_balance(driver_name, date=None):
         operating_hours_start = settings.operating_hours_start or "00:05:00"
         
         # Calculate date to reconcile from
-        if date:
-            from_datetime = f"{date} {operating_hours_start}"
-        else:
-            # Use today's operating hours start (6 AM)
-            today = frappe.utils.today()
-            from_datetime = f"{today} {operating_hours_start}"
-        
-        # Query all transactions for this driver since operating hours start
-        transactions = frappe.get_all("TukTuk Transaction",
-                                     filters={
-                                         "driver": driver_name,
-                                         "timestamp": [">=", from_datetime],
-                                         "payment_status": "Completed",
-                                         "transaction_type": ["not in", ["Adjustment", "Driver Repayment"]]
-                                     },
-                                     fields=["name", "transaction_id", "amount", "target_contribution", "timestamp"],
-                                     order_by="timestamp asc")
+        reconcile_date = date or frappe.utils.today()
+        from_datetime = f"{reconcile_date} {operating_hours_start}"
         
-        # Calculate expected balance from transactions
-        calculated_balance = sum([t.target_contribution for t in transactions])
+        # Expected balance = the day's rollup total minus anything collected
+        # before operating hours started (a small indexed range)
+        from tuktuk_management.api.driver_rollup import get_party_day_totals
+        day_totals = get_party_day_totals(driver_name, reconcile_date)
+        
+        before_opening = frappe.db.sql("""
+            SELECT COUNT(*) AS cnt, COALESCE(SUM(target_contribution), 0) AS contribution
+            FROM `tabTukTuk Transaction`
+            WHERE driver = %s
+            AND timestamp >= %s
+            AND timestamp < %s
+            AND payment_status = 'Completed'
+            AND transaction_type NOT IN ('Adjustment', 'Driver Repayment')
+        """, (driver_name, f"{reconcile_date} 00:00:00", from_datetime), as_dict=True)[0]
+        
+        calculated_balance = flt(flt(day_totals.target_contribution) - flt(before_opening.contribution), 2)
+        transactions_count = (day_totals.trips or 0) - (before_opening.cnt or 0)
         
         # Calculate discrepancy
         discrepancy = old_balance - calculated_balance
@@ -3258,7 +3046,7 @@ def reconcile_driver_balance(driver_name, date=None):
             "old_balance": old_balance,
             "calculated_balance": calculated_balance,
             "discrepancy": discrepancy,
-            "transactions_count": len(transactions),
+            "transactions_count": transactions_count,
             "from_datetime": from_datetime,
             "reconciled": False
         }
@@ -3270,7 +3058,7 @@ def reconcile_driver_balance(driver_name, date=None):
                            f"Current Balance: {old_balance}\n"
                            f"Calculated Balance: {calculated_balance}\n"
                            f"Discrepancy: {discrepancy}\n"
-                           f"Transactions: {len(transactions)}\n"
+                           f"Transactions: {transactions_count}\n"
                            f"From: {from_datetime}")
         else:
             result["message"] = "✅ Balance is correct - no discrepancy"
@@ -3341,6 +3129,7 @@ def fix_driver_balance(driver_name, date=None, auto_fix=False):
             )
             WHERE name = %s
         """, (global_target, driver_name))
+        record_ledger_event(driver_name, "Reconciliation Fix", balance_delta=calculated_balance - old_balance)
         
         frappe.db.commit()
         
@@ -3384,6 +3173,10 @@ def reconcile_all_drivers_balances(date=None, auto_fix=False):
     Reconcile balances for all active drivers.
     Useful for daily reconciliation or fixing widespread discrepancies.
     
+    Expected balances of the whole fleet come from one grouped query over the
+    day's transactions and are diffed against the stored balances in SQL; with
+    auto_fix every discrepancy is corrected by a single UPDATE.
+    
     Args:
         date: Optional date to calculate balances from (defaults to today)
         auto_fix: If True, automatically fix all discrepancies found
@@ -3394,49 +3187,148 @@ def reconcile_all_drivers_balances(date=None, auto_fix=False):
     try:
         frappe.flags.ignore_permissions = True
         
-        # Get all drivers with assigned tuktuks (active drivers)
-        drivers = frappe.get_all("TukTuk Driver",
-                                filters={"assigned_tuktuk": ["is", "set"]},
-                                fields=["name", "driver_name"])
+        operating_hours_start = frappe.db.get_single_value("TukTuk Settings", "operating_hours_start") or "00:05:00"
+        global_target = flt(frappe.db.get_single_value("TukTuk Settings", "global_daily_target"))
+        reconcile_date = getdate(date or frappe.utils.today())
+        from_datetime = f"{reconcile_date} {operating_hours_start}"
+        day_end = f"{frappe.utils.add_days(reconcile_date, 1)} 00:00:00"
+        
+        # Stored vs expected balance of every active driver in one pass
+        drivers = frappe.db.sql("""
+            SELECT
+                d.name AS driver_name,
+                d.driver_name AS driver,
+                d.current_balance AS old_balance,
+                ROUND(COALESCE(t.contribution, 0), 2) AS calculated_balance,
+                d.current_balance - ROUND(COALESCE(t.contribution, 0), 2) AS discrepancy,
+                COALESCE(t.transactions_count, 0) AS transactions_count
+            FROM `tabTukTuk Driver` d
+            LEFT JOIN (
+                SELECT driver, COUNT(*) AS transactions_count, SUM(target_contribution) AS contribution
+                FROM `tabTukTuk Transaction`
+                WHERE timestamp >= %(from_datetime)s
+                  AND timestamp < %(day_end)s
+                  AND payment_status = 'Completed'
+                  AND transaction_type NOT IN ('Adjustment', 'Driver Repayment')
+                  AND driver IS NOT NULL AND driver != ''
+                GROUP BY driver
+            ) t ON t.driver = d.name
+            WHERE d.assigned_tuktuk IS NOT NULL AND d.assigned_tuktuk != ''
+            ORDER BY d.name
+        """, {"from_datetime": from_datetime, "day_end": day_end}, as_dict=True)
         
         results = []
-        total_discrepancy = 0
-        drivers_with_issues = 0
-        
-        for driver in drivers:
-            result = reconcile_driver_balance(driver.name, date)
+        with_issues = []
+        for row in drivers:
+            result = {
+                "driver_name": row.driver_name,
+                "driver": row.driver,
+                "old_balance": flt(row.old_balance),
+                "calculated_balance": flt(row.calculated_balance),
+                "discrepancy": flt(row.discrepancy, 2),
+                "transactions_count": row.transactions_count,
+                "from_datetime": from_datetime,
+                "reconciled": False
+            }
+            if result["discrepancy"] != 0:
+                result["message"] = (
+                    f"⚠️ DISCREPANCY DETECTED: {abs(result['discrepancy'])} KSH "
+                    f"{'missing' if result['discrepancy'] < 0 else 'extra'}"
+                )
+                with_issues.append(result)
+            else:
+                result["message"] = "✅ Balance is correct - no discrepancy"
+            results.append(result)
+        
+        total_discrepancy = sum(abs(r["discrepancy"]) for r in with_issues)
+        
+        if auto_fix and with_issues:
+            names = tuple(r["driver_name"] for r in with_issues)
+            
+            # Lock the rows and take the balances the fix replaces: a payment that
+            # landed since the diff is already in them and must not be ledgered
+            # again as part of the fix delta
+            balances_before = dict(frappe.db.sql("""
+                SELECT name, current_balance
+                FROM `tabTukTuk Driver`
+                WHERE name IN %s
+                FOR UPDATE
+            """, (names,)))
+            
+            # One UPDATE recomputes the balance inside the statement, so a payment
+            # landing between the diff and the fix is not lost
+            frappe.db.sql("""
+                UPDATE `tabTukTuk Driver` d
+                LEFT JOIN (
+                    SELECT driver, SUM(target_contribution) AS contribution
+                    FROM `tabTukTuk Transaction`
+                    WHERE timestamp >= %(from_datetime)s
+                      AND timestamp < %(day_end)s
+                      AND payment_status = 'Completed'
+                      AND transaction_type NOT IN ('Adjustment', 'Driver Repayment')
+                      AND driver IN %(names)s
+                    GROUP BY driver
+                ) t ON t.driver = d.name
+                SET
+                    d.current_balance = ROUND(COALESCE(t.contribution, 0), 2),
+                    d.left_to_target = GREATEST(
+                        0,
+                        COALESCE(NULLIF(d.daily_target, 0), %(global_target)s) - ROUND(COALESCE(t.contribution, 0), 2)
+                    )
+                WHERE d.name IN %(names)s
+            """, {
+                "from_datetime": from_datetime,
+                "day_end": day_end,
+                "names": names,
+                "global_target": global_target
+            })
             
-            if "error" not in result:
-                if result["discrepancy"] != 0:
-                    drivers_with_issues += 1
-                    total_discrepancy += abs(result["discrepancy"])
-                    
-                    # Auto-fix if requested
-                    if auto_fix:
-                        fix_result = fix_driver_balance(driver.name, date, auto_fix=True)
-                        result["fixed"] = fix_result.get("success", False)
-                
-                results.append(result)
+            # Audit comments on each fixed driver, written in one insert
+            from frappe.model.naming import make_autoname
+            now = frappe.utils.now()
+            user = frappe.session.user
+            frappe.db.bulk_insert("Comment", (
+                "name", "creation", "modified", "owner", "modified_by", "comment_type",
+                "reference_doctype", "reference_name", "comment_email", "content"
+            ), [(
+                make_autoname("hash", "Comment"), now, now, user, user, "Comment",
+                "TukTuk Driver", r["driver_name"], user,
+                f"Balance reconciliation: Fixed discrepancy of {r['discrepancy']} KSH. "
+                f"Old balance: {r['old_balance']}, New balance: {r['calculated_balance']}"
+            ) for r in with_issues])
+            record_ledger_events([
+                {
+                    "driver": r["driver_name"],
+                    "event_type": "Reconciliation Fix",
+                    "balance_before": balances_before.get(r["driver_name"], r["old_balance"])
+                }
+                for r in with_issues
+            ])
+            
+            frappe.db.commit()
+            for r in with_issues:
+                r["fixed"] = True
         
         summary = {
             "success": True,
             "total_drivers": len(drivers),
             "drivers_checked": len(results),
-            "drivers_with_discrepancies": drivers_with_issues,
+            "drivers_with_discrepancies": len(with_issues),
             "total_discrepancy_amount": total_discrepancy,
             "results": results,
             "auto_fixed": auto_fix
         }
         
-        if drivers_with_issues > 0:
+        if with_issues:
             frappe.log_error("Mass Balance Reconciliation",
-                           f"Found discrepancies in {drivers_with_issues} out of {len(drivers)} drivers\n"
+                           f"Found discrepancies in {len(with_issues)} out of {len(drivers)} drivers\n"
                            f"Total discrepancy amount: {total_discrepancy} KSH\n"
                            f"Auto-fixed: {auto_fix}")
         
         return summary
         
     except Exception as e:
+        frappe.db.rollback()
         frappe.log_error(f"Mass Reconciliation Error: {str(e)}")
         return {
             "success": False,
@@ -3594,13 +3486,14 @@ def process_uncaptured_payment_substitute(substitute_driver, tuktuk, transaction
             
             # Update transaction with B2C result
             if b2c_success:
-                frappe.db.set_value(
-                    "TukTuk Transaction",
-                    transaction.name,
-                    {
-                        "payment_status": "Completed",
-                        "b2c_payment_sent": 1
-                    }
+                # Saved through the document so the daily rollup follows the status change
+                transaction.payment_status = "Completed"
+                transaction.b2c_payment_sent = 1
+                transaction.save(ignore_permissions=True)
+                substitute_target = sub_driver.daily_target or frappe.db.get_single_value("TukTuk Settings", "global_daily_target")
+                record_ride_in_series(
+                    transaction,
+                    crossed_target(sub_driver.todays_target_contribution, target_contribution, substitute_target)
                 )
                 payment_msg = f"Driver share of KSH {driver_share:.2f} sent via M-Pesa B2C"
             else:
@@ -3767,6 +3660,176 @@ def fix_substitute_balance(substitute_driver, correct_balance):
         }
 
 
+def _substitute_expected_sql():
+    """
+    Grouped subquery of every substitute's expected counters: today's figures
+    from the business day's transactions, lifetime figures from all of them
+    (with no upper bound, so they never roll back to the business day).
+    """
+    from tuktuk_management.api.transaction_archive import transaction_source
+
+    return f"""
+        SELECT
+            substitute_driver,
+            ROUND(SUM(IF(timestamp >= %(from_datetime)s AND timestamp < %(day_end)s, driver_share, 0)), 2) AS todays_earnings,
+            ROUND(SUM(IF(timestamp >= %(from_datetime)s AND timestamp < %(day_end)s, target_contribution, 0)), 2) AS todays_target_contribution,
+            ROUND(SUM(driver_share), 2) AS total_earnings,
+            COUNT(*) AS total_rides,
+            COUNT(DISTINCT DATE(timestamp)) AS total_days_worked,
+            MAX(DATE(timestamp)) AS last_worked_date
+        FROM {transaction_source()} t
+        WHERE payment_status = 'Completed'
+          AND transaction_type NOT IN ('Adjustment', 'Driver Repayment')
+          AND substitute_driver IS NOT NULL AND substitute_driver != ''
+        GROUP BY substitute_driver
+    """
+
+
+SUBSTITUTE_COUNTERS = (
+    "todays_earnings", "todays_target_contribution", "target_balance",
+    "total_earnings", "total_rides", "total_days_worked",
+)
+
+
+@frappe.whitelist()
+def reconcile_all_substitute_balances(date=None, auto_fix=False):
+    """
+    Reconcile the counters of all substitute drivers with their transactions.
+    
+    todays_earnings, todays_target_contribution, target_balance, total_earnings,
+    total_rides and total_days_worked are recomputed for the whole fleet by one
+    grouped query and diffed against the stored values in SQL; with auto_fix
+    every drifted substitute is corrected by a single UPDATE.
+    
+    Args:
+        date: Business day of the "today" counters (defaults to today)
+        auto_fix: If True, automatically fix all drift found (only for today:
+            the stored "today" counters always describe the current day)
+    
+    Returns:
+        dict: Summary with the per-counter drift of every substitute that has any
+    """
+    auto_fix = frappe.utils.cint(auto_fix)
+    reconcile_date = getdate(date or frappe.utils.today())
+    if auto_fix and reconcile_date != getdate(frappe.utils.today()):
+        return {
+            "success": False,
+            "error": "Auto-fix is only possible for today's counters"
+        }
+    
+    try:
+        frappe.flags.ignore_permissions = True
+        
+        settings = frappe.get_single("TukTuk Settings")
+        params = {
+            "from_datetime": f"{reconcile_date} {settings.operating_hours_start or '00:05:00'}",
+            "day_end": f"{frappe.utils.add_days(reconcile_date, 1)} 00:00:00",
+            "global_target": flt(settings.global_daily_target) or 3000.0,
+        }
+        
+        expected_sql = _substitute_expected_sql()
+        substitutes = frappe.db.sql(f"""
+            SELECT
+                s.name AS substitute_driver,
+                CONCAT_WS(' ', s.first_name, s.last_name) AS driver,
+                s.todays_earnings, s.todays_target_contribution, s.target_balance,
+                s.total_earnings, s.total_rides, s.total_days_worked,
+                COALESCE(e.todays_earnings, 0) AS expected_todays_earnings,
+                COALESCE(e.todays_target_contribution, 0) AS expected_todays_target_contribution,
+                COALESCE(NULLIF(s.daily_target, 0), %(global_target)s)
+                    - COALESCE(e.todays_target_contribution, 0) AS expected_target_balance,
+                COALESCE(e.total_earnings, 0) AS expected_total_earnings,
+                COALESCE(e.total_rides, 0) AS expected_total_rides,
+                COALESCE(e.total_days_worked, 0) AS expected_total_days_worked
+            FROM `tabTukTuk Substitute Driver` s
+            LEFT JOIN ({expected_sql}) e ON e.substitute_driver = s.name
+            ORDER BY s.name
+        """, params, as_dict=True)
+        
+        with_drift = []
+        total_drift = {field: 0 for field in SUBSTITUTE_COUNTERS}
+        for row in substitutes:
+            drift = {}
+            for field in SUBSTITUTE_COUNTERS:
+                difference = flt(flt(row[field]) - flt(row[f"expected_{field}"]), 2)
+                if difference:
+                    drift[field] = {
+                        "stored": flt(row[field]),
+                        "expected": flt(row[f"expected_{field}"]),
+                        "difference": difference
+                    }
+                    total_drift[field] += abs(difference)
+            if drift:
+                with_drift.append({
+                    "substitute_driver": row.substitute_driver,
+                    "driver": row.driver,
+                    "drift": drift,
+                    "fixed": False
+                })
+        
+        if auto_fix and with_drift:
+            params["names"] = tuple(r["substitute_driver"] for r in with_drift)
+            
+            # Recomputed inside the statement, so a payment landing between the
+            # diff and the fix is not lost
+            frappe.db.sql(f"""
+                UPDATE `tabTukTuk Substitute Driver` s
+                LEFT JOIN ({expected_sql}) e ON e.substitute_driver = s.name
+                SET
+                    s.todays_earnings = COALESCE(e.todays_earnings, 0),
+                    s.todays_target_contribution = COALESCE(e.todays_target_contribution, 0),
+                    s.target_balance = COALESCE(NULLIF(s.daily_target, 0), %(global_target)s)
+                        - COALESCE(e.todays_target_contribution, 0),
+                    s.total_earnings = COALESCE(e.total_earnings, 0),
+                    s.total_rides = COALESCE(e.total_rides, 0),
+                    s.total_days_worked = COALESCE(e.total_days_worked, 0),
+                    s.last_worked_date = COALESCE(e.last_worked_date, s.last_worked_date),
+                    s.average_daily_earnings = IF(
+                        COALESCE(e.total_days_worked, 0) > 0,
+                        COALESCE(e.total_earnings, 0) / e.total_days_worked,
+                        0
+                    )
+                WHERE s.name IN %(names)s
+            """, params)
+            
+            # Audit comments on each fixed substitute, written in one insert
+            from frappe.model.naming import make_autoname
+            now = frappe.utils.now()
+            user = frappe.session.user
+            frappe.db.bulk_insert("Comment", (
+                "name", "creation", "modified", "owner", "modified_by", "comment_type",
+                "reference_doctype", "reference_name", "comment_email", "content"
+            ), [(
+                make_autoname("hash", "Comment"), now, now, user, user, "Comment",
+                "TukTuk Substitute Driver", r["substitute_driver"], user,
+                "Substitute reconciliation: " + ", ".join(
+                    f"{field} {d['stored']} -> {d['expected']}" for field, d in r["drift"].items()
+                )
+            ) for r in with_drift])
+            
+            frappe.db.commit()
+            for r in with_drift:
+                r["fixed"] = True
+        
+        return {
+            "success": True,
+            "substitutes_checked": len(substitutes),
+            "substitutes_with_drift": len(with_drift),
+            "total_drift": {field: flt(amount, 2) for field, amount in total_drift.items()},
+            "results": with_drift,
+            "auto_fixed": bool(auto_fix)
+        }
+        
+    except Exception as e:
+        frappe.db.rollback()
+        frappe.log_error(f"Substitute Reconciliation Error: {str(e)}")
+        return {
+            "success": False,
+            "error": f"Failed to reconcile substitute drivers: {str(e)}"
+        }
+    finally:
+        frappe.flags.ignore_permissions = False
+
 # ===== ATOMIC PAYMENT UPDATE UTILITIES =====
 
 def update_driver_payment_atomic(driver_name, target_contribution, deposit_amount=0):
@@ -3802,6 +3865,7 @@ def update_driver_payment_atomic(driver_name, target_contribution, deposit_amoun
             current_deposit_balance = current_deposit_balance + %s
         WHERE name = %s
     """, (target_contribution, global_target, target_contribution, deposit_amount, driver_name))
+    record_ledger_event(driver_name, "Payment", balance_delta=target_contribution, deposit_delta=deposit_amount)
 
     # Return updated values
     updated_driver = frappe.db.get_value(
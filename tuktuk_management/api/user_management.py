@@ -3,6 +3,8 @@ from frappe import _
 from frappe.utils import now_datetime, get_url, cstr
 import json
 
+from tuktuk_management.utils.job_queues import enqueue_job, NOTIFICATIONS
+
 # Override the default welcome email method
 def override_send_welcome_mail_to_user(original_method):
     """
@@ -84,14 +86,14 @@ def check_and_send_tuktuk_manager_welcome(doc, method=None):
                 frappe.db.commit()
             
             # Send custom welcome email using commit after to ensure it's sent
-            frappe.enqueue(
+            enqueue_job(
                 'tuktuk_management.api.user_management.send_tuktuk_manager_welcome_email',
+                queue=NOTIFICATIONS,
+                dedupe_key=f"welcome::{doc.email}",
+                timeout=300,
                 email=doc.email,
                 full_name=doc.full_name,
-                password=password,
-                queue='default',
-                timeout=300,
-                is_async=True
+                password=password
             )
             
             # Log the action
@@ -4,6 +4,8 @@ import frappe
 from frappe.utils import getdate, add_days, flt
 from datetime import datetime, timedelta
 
+from tuktuk_management.api.driver_status import get_period_status
+
 @frappe.whitelist()
 def generate_weekly_report(week_start_date=None, week_end_date=None, save_to_db=True):
     """
@@ -59,8 +61,7 @@ def generate_weekly_report(week_start_date=None, week_end_date=None, save_to_db=
                 "name", "report_date", "total_revenue", "total_driver_share",
                 "total_target_contribution", "total_transactions",
                 "drivers_at_target", "total_drivers", "target_achievement_rate",
-                "inactive_drivers", "drivers_below_target", "drivers_below_target_list",
-                "drivers_at_risk", "drivers_at_risk_list",
+                "inactive_drivers", "drivers_below_target", "drivers_at_risk",
                 "active_tuktuks", "available_tuktuks", "charging_tuktuks"
             ],
             order_by="report_date asc"
@@ -85,47 +86,17 @@ def generate_weekly_report(week_start_date=None, week_end_date=None, save_to_db=
         avg_target_achievement_rate = sum(flt(dr.target_achievement_rate or 0) for dr in daily_reports) / days_count if days_count > 0 else 0
         avg_inactive_drivers = sum(flt(dr.inactive_drivers or 0) for dr in daily_reports) / days_count if days_count > 0 else 0
         
-        # Get unique drivers who worked during the week
-        all_driver_lists = []
-        for dr in daily_reports:
-            if dr.drivers_below_target_list:
-                drivers = [d.strip() for d in str(dr.drivers_below_target_list).split(",") if d.strip()]
-                all_driver_lists.extend(drivers)
-        
-        unique_active_drivers = len(set(all_driver_lists)) if all_driver_lists else 0
-        
-        # Aggregate attention metrics
-        drivers_below_target_this_week = len(set(
-            d.strip() 
-            for dr in daily_reports 
-            if dr.drivers_below_target_list
-            for d in str(dr.drivers_below_target_list).split(",")
-            if d.strip()
-        ))
-        
-        drivers_at_risk_this_week = len(set(
-            d.strip()
-            for dr in daily_reports
-            if dr.drivers_at_risk_list
-            for d in str(dr.drivers_at_risk_list).split(",")
-            if d.strip()
-        ))
-        
-        # Get unique lists
-        all_below_target = set()
-        for dr in daily_reports:
-            if dr.drivers_below_target_list:
-                drivers = [d.strip() for d in str(dr.drivers_below_target_list).split(",") if d.strip()]
-                all_below_target.update(drivers)
+        # Driver attention lists from the per-day driver status table
+        period_status = get_period_status(week_start_date, week_end_date)
+        all_below_target = period_status.drivers_below_target
+        all_at_risk = period_status.drivers_at_risk
         
-        all_at_risk = set()
-        for dr in daily_reports:
-            if dr.drivers_at_risk_list:
-                drivers = [d.strip() for d in str(dr.drivers_at_risk_list).split(",") if d.strip()]
-                all_at_risk.update(drivers)
+        unique_active_drivers = len(all_below_target)
+        drivers_below_target_this_week = len(all_below_target)
+        drivers_at_risk_this_week = len(all_at_risk)
         
-        drivers_below_target_list = ", ".join(sorted(all_below_target)) if all_below_target else ""
-        drivers_at_risk_list = ", ".join(sorted(all_at_risk)) if all_at_risk else ""
+        drivers_below_target_list = ", ".join(all_below_target)
+        drivers_at_risk_list = ", ".join(all_at_risk)
         
         # Aggregate fleet status
         avg_active_tuktuks = sum(flt(dr.active_tuktuks or 0) for dr in daily_reports) / days_count if days_count > 0 else 0
@@ -74,6 +74,7 @@ whitelisted_methods = [
     "tuktuk_management.api.csv_integration.process_uploaded_file",
     "tuktuk_management.api.csv_integration.get_upload_statistics",
     "tuktuk_management.api.csv_integration.create_sample_csv_data",
+    "tuktuk_management.api.csv_integration.enqueue_large_csv_processing",
 
     # TukTuk Driver Authentication and Portal API endpoints (updated names)
     "tuktuk_management.api.driver_auth.create_tuktuk_driver_user_account",
@@ -110,6 +111,7 @@ whitelisted_methods = [
     # Balance reconciliation methods
     "tuktuk_management.api.tuktuk.reconcile_driver_balance",
     "tuktuk_management.api.tuktuk.fix_driver_balance",
+    "tuktuk_management.api.tuktuk.reconcile_all_substitute_balances",
     "tuktuk_management.api.tuktuk.reconcile_all_drivers_balances",
 
     # Balance reconciliation utilities (2025-12-25)
@@ -117,6 +119,12 @@ whitelisted_methods = [
     "tuktuk_management.api.balance_reconciliation.fix_all_discrepancies",
     "tuktuk_management.api.balance_reconciliation.get_driver_balance_report",
 
+    # Scheduled job status (single-flight locks)
+    "tuktuk_management.utils.job_lock.get_job_status",
+
+    # Background job queue metrics
+    "tuktuk_management.utils.job_queues.get_queue_metrics",
+
     # User management methods
     "tuktuk_management.api.user_management.create_tuktuk_manager_user",
     "tuktuk_management.api.user_management.resend_welcome_email",
@@ -129,8 +137,55 @@ whitelisted_methods = [
     "tuktuk_management.api.sms_notifications.get_all_drivers_for_broadcast",
     "tuktuk_management.api.sms_notifications.send_broadcast_sms",
 
+    # Target attainment forecast
+    "tuktuk_management.api.target_forecast.get_driver_forecasts",
+    "tuktuk_management.api.target_forecast.rebuild_intraday_curves",
+
     # From weekly_report.py
     "tuktuk_management.api.weekly_report.generate_weekly_report",
+
+    # Historical daily report backfill
+    "tuktuk_management.api.daily_report.enqueue_daily_report_backfill",
+
+    # Columnar analytics export
+    "tuktuk_management.api.analytics_export.enqueue_analytics_export",
+    "tuktuk_management.api.analytics_export.reset_analytics_watermark",
+
+    # From period_report.py
+    "tuktuk_management.api.period_report.generate_period_report",
+    "tuktuk_management.api.period_report.enqueue_period_reports",
+
+    # Driver daily earnings rollup
+    "tuktuk_management.api.driver_rollup.enqueue_rollup_rebuild",
+
+    # Driver statement (paged API and CSV/XLSX export)
+    "tuktuk_management.api.driver_statement.get_statement_page",
+    "tuktuk_management.api.driver_statement.export_driver_statement",
+    "tuktuk_management.api.bulk_statements.enqueue_monthly_statements",
+
+    # Fleet-wide deposit liability snapshot
+    "tuktuk_management.api.deposit_liability.get_deposit_liability_snapshot",
+
+    # Per-day driver target status
+    "tuktuk_management.api.driver_status.get_driver_target_history",
+
+    # Append-only driver balance ledger
+    "tuktuk_management.api.driver_ledger.verify_driver_ledgers",
+    "tuktuk_management.api.driver_ledger.get_driver_balance_at",
+
+    # Reconciliation runs
+    "tuktuk_management.api.balance_reconciliation.get_reconciliation_trend",
+    "tuktuk_management.api.balance_reconciliation.get_repeat_discrepancy_drivers",
+
+    # Retroactive payout recomputation
+    "tuktuk_management.api.payout_recompute.recompute_driver_payouts",
+
+    # M-Pesa statement vs ledger diff
+    "tuktuk_management.api.mpesa_statement_diff.diff_mpesa_statement",
+
+    # Failed payment matching
+    "tuktuk_management.api.failed_payment_matcher.get_failed_payment_suggestions",
+    "tuktuk_management.api.failed_payment_matcher.approve_failed_payment_matches",
     
     # Roster API methods
     "tuktuk_management.api.roster.request_switch",
@@ -139,6 +194,7 @@ whitelisted_methods = [
     "tuktuk_management.api.roster.mark_sick_day",
     "tuktuk_management.api.roster.get_pending_switch_requests",
     "tuktuk_management.api.roster.is_driver_scheduled_off",
+    "tuktuk_management.api.roster.activate_substitute_assignments",
     "tuktuk_management.tuktuk_management.doctype.tuktuk_roster_period.tuktuk_roster_period.get_driver_schedule"
 ]
 
@@ -154,7 +210,14 @@ doc_events = {
     # All payment processing is handled by mpesa_confirmation webhook with proper idempotency checks
     "TukTuk Driver": {
         "validate": "tuktuk_management.api.tuktuk.validate_driver",
-        "on_update": "tuktuk_management.api.tuktuk.handle_driver_update"
+        "on_update": [
+            "tuktuk_management.api.tuktuk.handle_driver_update",
+            "tuktuk_management.utils.report_cache.on_deposit_rows_update",
+            "tuktuk_management.api.driver_ledger.on_driver_update"
+        ]
+    },
+    "Terminated TukTuk Driver": {
+        "on_update": "tuktuk_management.utils.report_cache.on_deposit_rows_update"
     },
     "TukTuk Vehicle": {
         "validate": "tuktuk_management.api.tuktuk.validate_vehicle",
@@ -168,6 +231,8 @@ doc_events = {
     }
 }
 # Scheduled Tasks
+# Every entry point below is wrapped with @single_flight (utils/job_lock.py) so
+# overlapping runs are skipped; query run status with utils.job_lock.get_job_status
 scheduler_events = {
     "cron": {
         # Reset daily targets at midnight EAT 
@@ -175,6 +240,26 @@ scheduler_events = {
             "tuktuk_management.api.tuktuk.reset_daily_targets_with_deposit",
             "tuktuk_management.api.tuktuk.end_operating_hours"
         ],
+        # Fold yesterday's transactions into the intraday earning curves
+        "30 0 * * *": [
+            "tuktuk_management.api.target_forecast.refresh_intraday_curves"
+        ],
+        # Compact hourly revenue buckets older than 30 days into daily buckets
+        "45 0 * * *": [
+            "tuktuk_management.api.revenue_series.compact_revenue_buckets"
+        ],
+        # Checkpoint the fleet deposit liability for the month that just ended
+        "15 1 1 * *": [
+            "tuktuk_management.api.deposit_liability.record_month_end_liability_snapshot"
+        ],
+        # Monthly (and, on quarter start, quarterly) period reports
+        "30 1 1 * *": [
+            "tuktuk_management.api.period_report.generate_previous_month_report"
+        ],
+        # Move transactions older than the configured horizon into the archive table
+        "0 2 * * *": [
+            "tuktuk_management.api.transaction_archive.archive_old_transactions"
+        ],
         # Check for operating hours at 6 AM EAT
         "0 3 * * *": [
             "tuktuk_management.api.tuktuk.start_operating_hours"
@@ -0,0 +1,10 @@
+# ~/frappe-bench/apps/tuktuk_management/tuktuk_management/patches/backfill_deposit_liability_snapshots.py
+
+import frappe
+
+def execute():
+    """Create month-end deposit liability checkpoints for past months"""
+    from tuktuk_management.api.deposit_liability import backfill_liability_snapshots
+
+    frappe.reload_doc("tuktuk_management", "doctype", "tuktuk_deposit_liability_snapshot")
+    backfill_liability_snapshots()
@@ -0,0 +1,10 @@
+# ~/frappe-bench/apps/tuktuk_management/tuktuk_management/patches/backfill_driver_daily_rollup.py
+
+import frappe
+
+def execute():
+    """Build the TukTuk Driver Daily Rollup from existing transactions"""
+    from tuktuk_management.api.driver_rollup import rebuild_driver_daily_rollup
+
+    frappe.reload_doc("tuktuk_management", "doctype", "tuktuk_driver_daily_rollup")
+    rebuild_driver_daily_rollup()
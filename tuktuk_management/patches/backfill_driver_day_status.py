@@ -0,0 +1,10 @@
+# ~/frappe-bench/apps/tuktuk_management/tuktuk_management/patches/backfill_driver_day_status.py
+
+import frappe
+
+def execute():
+    """Build TukTuk Driver Day Status rows from the existing daily reports"""
+    from tuktuk_management.api.driver_status import backfill_day_statuses_from_reports
+
+    frappe.reload_doc("tuktuk_management", "doctype", "tuktuk_driver_day_status")
+    backfill_day_statuses_from_reports()
@@ -0,0 +1,10 @@
+# ~/frappe-bench/apps/tuktuk_management/tuktuk_management/patches/backfill_revenue_series.py
+
+import frappe
+
+def execute():
+    """Build the TukTuk Revenue Bucket time series from existing transactions"""
+    from tuktuk_management.api.revenue_series import rebuild_revenue_series
+
+    frappe.reload_doc("tuktuk_management", "doctype", "tuktuk_revenue_bucket")
+    rebuild_revenue_series()
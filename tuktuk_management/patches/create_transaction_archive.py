@@ -0,0 +1,10 @@
+# ~/frappe-bench/apps/tuktuk_management/tuktuk_management/patches/create_transaction_archive.py
+
+import frappe
+
+def execute():
+    """Create the TukTuk Transaction archive table (archival itself stays off until a horizon is set)"""
+    from tuktuk_management.api.transaction_archive import ensure_archive_table
+
+    frappe.reload_doc("tuktuk_management", "doctype", "tuktuk_settings")
+    ensure_archive_table()
@@ -0,0 +1,11 @@
+# ~/frappe-bench/apps/tuktuk_management/tuktuk_management/patches/open_driver_ledger.py
+
+import frappe
+
+def execute():
+    """Opening checkpoint of every driver's balances, so ledger verification has a starting point"""
+    from tuktuk_management.api.driver_ledger import record_checkpoints
+
+    frappe.reload_doc("tuktuk_management", "doctype", "tuktuk_driver_ledger_entry")
+    record_checkpoints(remarks="Ledger opened")
+    frappe.db.commit()
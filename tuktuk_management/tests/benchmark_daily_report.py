@@ -0,0 +1,135 @@
+# ~/frappe-bench/apps/tuktuk_management/tuktuk_management/tests/benchmark_daily_report.py
+"""
+Daily report aggregation benchmark
+
+Seeds a scratch copy of `tabTukTuk Transaction` (same columns and indexes) with
+synthetic rows, rolls it up into a scratch copy of the driver daily rollup, and
+times the old per-metric DATE(timestamp) = %s queries against the rollup read
+(get_day_rows) that compute_daily_report_metrics uses.
+Live data is never touched.
+
+Run (10M rows takes a few minutes to seed):
+    bench --site <site> execute tuktuk_management.tests.benchmark_daily_report.run_benchmark --kwargs "{'rows': 10000000}"
+"""
+
+import time
+
+import frappe
+from frappe.utils import add_days, getdate, today
+
+from tuktuk_management.api.daily_report import EXCLUDED_TYPES
+from tuktuk_management.api.driver_rollup import ROLLUP_TABLE, _rebuild_range, get_day_rows
+
+BENCH_TABLE = "_bench_tuktuk_transaction"
+BENCH_ROLLUP = "_bench_tuktuk_driver_daily_rollup"
+
+
+def seed(rows=10_000_000, days=365, drivers=60):
+    """Create the scratch table and fill it with `rows` transactions spread over `days`"""
+    frappe.db.sql_ddl(f"DROP TABLE IF EXISTS `{BENCH_TABLE}`")
+    frappe.db.sql_ddl(f"CREATE TABLE `{BENCH_TABLE}` LIKE `tabTukTuk Transaction`")
+    frappe.db.sql_ddl("DROP TABLE IF EXISTS `_bench_digits`")
+    frappe.db.sql_ddl("CREATE TABLE `_bench_digits` (d INT PRIMARY KEY)")
+    frappe.db.sql("INSERT INTO `_bench_digits` VALUES (0),(1),(2),(3),(4),(5),(6),(7),(8),(9)")
+
+    start = f"{add_days(today(), -days + 1)} 00:00:00"
+    batch = 1_000_000
+    inserted = 0
+    while inserted < rows:
+        size = min(batch, rows - inserted)
+        # n = 0..999999 from six cross-joined digit tables, offset by the batch start
+        frappe.db.sql(f"""
+            INSERT INTO `{BENCH_TABLE}`
+                (name, transaction_id, transaction_type, driver, amount, driver_share,
+                 target_contribution, timestamp, payment_status, docstatus, idx)
+            SELECT
+                CONCAT('BENCH-', seq.n),
+                CONCAT('BT', seq.n),
+                CASE WHEN seq.n %% 50 = 0 THEN 'Adjustment' ELSE 'Payment' END,
+                CONCAT('DRV-', LPAD(seq.n %% {drivers}, 5, '0')),
+                100,
+                50,
+                50,
+                TIMESTAMP(%s) + INTERVAL FLOOR(seq.n * {days} * 86400 / %s) SECOND,
+                CASE WHEN seq.n %% 40 = 0 THEN 'Failed' ELSE 'Completed' END,
+                0,
+                0
+            FROM (
+                SELECT a.d + b.d * 10 + c.d * 100 + e.d * 1000 + f.d * 10000 + g.d * 100000 + %s AS n
+                FROM `_bench_digits` a, `_bench_digits` b, `_bench_digits` c,
+                     `_bench_digits` e, `_bench_digits` f, `_bench_digits` g
+            ) seq
+            WHERE seq.n < %s
+        """, (start, rows, inserted, inserted + size))
+        frappe.db.commit()
+        inserted += size
+        print(f"Seeded {inserted:,} / {rows:,}")
+
+    frappe.db.sql_ddl("DROP TABLE IF EXISTS `_bench_digits`")
+    frappe.db.sql_ddl(f"ANALYZE TABLE `{BENCH_TABLE}`")
+
+
+def _old_queries(report_date):
+    """The per-metric DATE() queries generate_daily_reports used to run"""
+    base = f"FROM `{BENCH_TABLE}` WHERE DATE(timestamp) = %s AND transaction_type NOT IN %s"
+    completed = base + " AND payment_status = 'Completed'"
+    params = (report_date, EXCLUDED_TYPES)
+    frappe.db.sql(f"SELECT COALESCE(SUM(amount), 0) {completed}", params)
+    frappe.db.sql(f"SELECT COALESCE(SUM(driver_share), 0) {completed}", params)
+    frappe.db.sql(f"SELECT COALESCE(SUM(target_contribution), 0) {completed}", params)
+    frappe.db.sql(f"SELECT driver, SUM(target_contribution) AS t {completed} GROUP BY driver HAVING t >= 3000", params)
+    frappe.db.sql(f"SELECT COUNT(DISTINCT driver) {base}", params)
+    frappe.db.sql(f"SELECT COUNT(*) {base}", params)
+
+
+def seed_rollup(days=365):
+    """Roll the scratch transactions up into a scratch copy of the driver daily rollup"""
+    frappe.db.sql_ddl(f"DROP TABLE IF EXISTS `{BENCH_ROLLUP}`")
+    frappe.db.sql_ddl(f"CREATE TABLE `{BENCH_ROLLUP}` LIKE `{ROLLUP_TABLE}`")
+    _rebuild_range(add_days(today(), -days + 1), today(), table=BENCH_ROLLUP, source_table=BENCH_TABLE)
+    frappe.db.commit()
+    frappe.db.sql_ddl(f"ANALYZE TABLE `{BENCH_ROLLUP}`")
+
+
+def _new_query(report_date):
+    get_day_rows(report_date, table=BENCH_ROLLUP)
+
+
+def _time(fn, report_date, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(report_date)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run_benchmark(rows=10_000_000, repeat=3, reseed=True, cleanup=True):
+    """Seed (optionally), time both read paths for the most recent day and print the results"""
+    rows = int(rows)
+    if reseed or not frappe.db.sql(f"SHOW TABLES LIKE '{BENCH_TABLE}'"):
+        seed(rows)
+    seed_rollup()
+
+    report_date = getdate(today())
+
+    plan_old = frappe.db.sql(
+        f"EXPLAIN SELECT COUNT(*) FROM `{BENCH_TABLE}` WHERE DATE(timestamp) = %s", (report_date,), as_dict=True
+    )
+    plan_new = frappe.db.sql(
+        f"EXPLAIN SELECT COUNT(*) FROM `{BENCH_ROLLUP}` WHERE business_date = %s", (report_date,), as_dict=True
+    )
+
+    old = _time(_old_queries, report_date, int(repeat))
+    new = _time(_new_query, report_date, int(repeat))
+
+    print(f"Rows: {rows:,}  Report date: {report_date}")
+    print(f"Old (6 x DATE(timestamp) = %s):  {old * 1000:,.1f} ms  plan: {plan_old[0].get('type')} key={plan_old[0].get('key')}")
+    print(f"New (rollup rows of the day):    {new * 1000:,.1f} ms  plan: {plan_new[0].get('type')} key={plan_new[0].get('key')}")
+    print(f"Speed-up: {old / new:,.1f}x" if new else "Speed-up: n/a")
+
+    if cleanup:
+        frappe.db.sql_ddl(f"DROP TABLE IF EXISTS `{BENCH_TABLE}`")
+        frappe.db.sql_ddl(f"DROP TABLE IF EXISTS `{BENCH_ROLLUP}`")
+
+    return {"rows": rows, "old_ms": old * 1000, "new_ms": new * 1000}
@@ -0,0 +1,82 @@
+# ~/frappe-bench/apps/tuktuk_management/tuktuk_management/tests/benchmark_transaction_archive.py
+"""
+Transaction archive benchmark
+
+Seeds the scratch transaction table of benchmark_daily_report, times the hot
+paths that still read raw transactions (list view count and first page, the
+daily report backfill pass for today, a driver's last 30 days), archives everything older than the horizon into a scratch archive
+table with archive_before() and times the same queries again.
+Live data is never touched.
+
+Run:
+    bench --site <site> execute tuktuk_management.tests.benchmark_transaction_archive.run_benchmark --kwargs "{'rows': 10000000, 'months': 3}"
+"""
+
+import time
+
+import frappe
+from frappe.utils import add_days, add_months, get_first_day, getdate, today
+
+from tuktuk_management.api.daily_report import get_totals_by_day
+from tuktuk_management.api.transaction_archive import archive_before
+from tuktuk_management.tests.benchmark_daily_report import BENCH_TABLE, seed
+
+BENCH_ARCHIVE = "_bench_tuktuk_transaction_archive"
+
+
+def _hot_paths():
+    month_start = f"{add_days(today(), -29)} 00:00:00"
+    return {
+        "list count": lambda: frappe.db.sql(f"SELECT COUNT(*) FROM `{BENCH_TABLE}`"),
+        "list page": lambda: frappe.db.sql(
+            f"SELECT name, driver, amount, timestamp FROM `{BENCH_TABLE}` ORDER BY modified DESC LIMIT 20"
+        ),
+        "daily backfill": lambda: get_totals_by_day(today(), today(), table=BENCH_TABLE),
+        "driver 30 days": lambda: frappe.db.sql(f"""
+            SELECT name, timestamp, amount, target_contribution
+            FROM `{BENCH_TABLE}`
+            WHERE driver = 'DRV-00001' AND timestamp >= %s AND payment_status = 'Completed'
+            ORDER BY timestamp
+        """, (month_start,)),
+    }
+
+
+def _time_all(repeat):
+    results = {}
+    for label, fn in _hot_paths().items():
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        results[label] = min(timings) * 1000
+    return results
+
+
+def run_benchmark(rows=10_000_000, months=3, repeat=3, reseed=True, cleanup=True):
+    """Time the hot paths on the full table, archive rows older than `months`, time them again"""
+    rows, months, repeat = int(rows), int(months), int(repeat)
+    if reseed or not frappe.db.sql(f"SHOW TABLES LIKE '{BENCH_TABLE}'"):
+        seed(rows)
+    frappe.db.sql_ddl(f"DROP TABLE IF EXISTS `{BENCH_ARCHIVE}`")
+
+    before = _time_all(repeat)
+
+    cutoff = f"{get_first_day(add_months(getdate(today()), -months))} 00:00:00"
+    start = time.perf_counter()
+    moved = archive_before(cutoff, live_table=BENCH_TABLE, archive_table=BENCH_ARCHIVE)
+    archive_seconds = time.perf_counter() - start
+    frappe.db.sql_ddl(f"ANALYZE TABLE `{BENCH_TABLE}`")
+
+    after = _time_all(repeat)
+
+    print(f"Rows: {rows:,}  Archived: {moved:,} (before {cutoff}) in {archive_seconds:,.1f} s")
+    for label in before:
+        speed_up = f"{before[label] / after[label]:,.1f}x" if after[label] else "n/a"
+        print(f"{label:<16} before {before[label]:>10,.1f} ms   after {after[label]:>10,.1f} ms   {speed_up}")
+
+    if cleanup:
+        frappe.db.sql_ddl(f"DROP TABLE IF EXISTS `{BENCH_TABLE}`")
+        frappe.db.sql_ddl(f"DROP TABLE IF EXISTS `{BENCH_ARCHIVE}`")
+
+    return {"rows": rows, "archived": moved, "before_ms": before, "after_ms": after}
@@ -0,0 +1,21 @@
+frappe.provide("frappe.dashboards.chart_sources");
+
+frappe.dashboards.chart_sources["TukTuk Revenue Series"] = {
+    method: "tuktuk_management.tuktuk_management.dashboard_chart_source.tuktuk_revenue_series.tuktuk_revenue_series.get",
+    filters: [
+        {
+            fieldname: "metric",
+            label: __("Metric"),
+            fieldtype: "Select",
+            options: "Revenue\nRides\nDrivers Active\nDrivers At Target\nTarget Achievement Rate",
+            default: "Revenue",
+        },
+        {
+            fieldname: "interval",
+            label: __("Interval"),
+            fieldtype: "Select",
+            options: "\nHourly",
+            description: __("Leave empty to use the chart's time interval"),
+        },
+    ],
+};
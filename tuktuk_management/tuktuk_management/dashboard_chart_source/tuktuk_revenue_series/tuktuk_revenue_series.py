@@ -0,0 +1,85 @@
+# ~/frappe-bench/apps/tuktuk_management/tuktuk_management/tuktuk_management/dashboard_chart_source/tuktuk_revenue_series/tuktuk_revenue_series.py
+
+import frappe
+from frappe.utils import add_days, add_to_date, flt, get_datetime, get_first_day, get_first_day_of_week, getdate, today
+from frappe.utils.dashboard import cache_source
+
+from tuktuk_management.api.revenue_series import DAILY, HOURLY, get_series
+
+METRICS = {
+    "Revenue": "revenue",
+    "Rides": "rides",
+    "Drivers Active": "drivers_active",
+    "Drivers At Target": "drivers_at_target",
+}
+
+TIMESPAN_DAYS = {
+    "Last Week": 7,
+    "Last Month": 30,
+    "Last Quarter": 91,
+    "Last Year": 365,
+}
+
+
+def _period_start(day, time_interval):
+    if time_interval == "Weekly":
+        return get_first_day_of_week(day)
+    if time_interval == "Monthly":
+        return get_first_day(day)
+    return day
+
+
+@frappe.whitelist()
+@cache_source
+def get(chart_name=None, chart=None, no_cache=None, filters=None, from_date=None, to_date=None,
+        timespan=None, time_interval=None, heatmap_year=None):
+    """Revenue / rides / drivers series from the TukTuk Revenue Bucket table"""
+    filters = frappe.parse_json(filters) or {}
+    metric = filters.get("metric") or "Revenue"
+
+    to_date = getdate(to_date or today())
+    if from_date:
+        from_date = getdate(from_date)
+    else:
+        from_date = add_days(to_date, -(TIMESPAN_DAYS.get(timespan) or 7) + 1)
+
+    if filters.get("interval") == HOURLY:
+        rows = get_series(f"{from_date} 00:00:00", f"{add_days(to_date, 1)} 00:00:00", HOURLY)
+        by_key = {get_datetime(r.bucket_start): r for r in rows}
+        keys = []
+        moment = get_datetime(f"{from_date} 00:00:00")
+        end = get_datetime(f"{add_days(to_date, 1)} 00:00:00")
+        while moment < end:
+            keys.append(moment)
+            moment = add_to_date(moment, hours=1)
+        labels = [f"{k:%d %b %H:00}" for k in keys]
+    else:
+        rows = get_series(f"{from_date} 00:00:00", f"{add_days(to_date, 1)} 00:00:00", DAILY)
+        by_key = {}
+        for r in rows:
+            key = _period_start(getdate(r.bucket_start), time_interval)
+            period = by_key.setdefault(key, frappe._dict(revenue=0, rides=0, drivers_active=0, drivers_at_target=0))
+            for field in METRICS.values():
+                period[field] += flt(r.get(field))
+        keys = []
+        day = from_date
+        while day <= to_date:
+            key = _period_start(day, time_interval)
+            if key not in keys:
+                keys.append(key)
+            day = add_days(day, 1)
+        labels = [str(k) for k in keys]
+
+    values = []
+    for key in keys:
+        row = by_key.get(key) or {}
+        if metric == "Target Achievement Rate":
+            active = flt(row.get("drivers_active"))
+            values.append(round(flt(row.get("drivers_at_target")) / active * 100, 1) if active else 0)
+        else:
+            values.append(flt(row.get(METRICS.get(metric, "revenue"))))
+
+    return {
+        "labels": labels,
+        "datasets": [{"name": metric, "values": values}],
+    }
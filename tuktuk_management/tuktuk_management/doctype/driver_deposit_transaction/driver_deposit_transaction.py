@@ -1,4 +1,11 @@
+import frappe
 from frappe.model.document import Document
 
 class DriverDepositTransaction(Document):
-    pass
\ No newline at end of file
+    pass
+
+
+def on_doctype_update():
+    # Per-driver totals group on parent; liability snapshots scan by transaction_date
+    frappe.db.add_index("Driver Deposit Transaction", ["parent", "transaction_date"])
+    frappe.db.add_index("Driver Deposit Transaction", ["transaction_date"])
@@ -1,5 +1,11 @@
+import frappe
 from frappe.model.document import Document
 
 class FailedTransactionLog(Document):
 	pass
 
+
+def on_doctype_update():
+	# The payment matcher and the statement diff look failures up by status and receipt
+	frappe.db.add_index("Failed Transaction Log", ["status", "transaction_time"])
+	frappe.db.add_index("Failed Transaction Log", ["transaction_id"])
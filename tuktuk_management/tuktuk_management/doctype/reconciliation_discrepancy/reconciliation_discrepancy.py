@@ -0,0 +1,9 @@
+import frappe
+from frappe.model.document import Document
+
+class ReconciliationDiscrepancy(Document):
+    pass
+
+
+def on_doctype_update():
+    frappe.db.add_index("Reconciliation Discrepancy", ["driver", "discrepancy_type"])
@@ -1,9 +1,67 @@
 # Copyright (c) 2024, Yuda Media and Contributors
 # See license.txt
 
-# import frappe
+from datetime import datetime, time
+from unittest.mock import patch
+
+import frappe
 from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_days, getdate
+
+from tuktuk_management.api import target_forecast
 
 
 class TestTukTukDriver(FrappeTestCase):
 	pass
+
+
+class TestIntradayForecast(FrappeTestCase):
+	driver = "_Test Forecast Driver"
+
+	def setUp(self):
+		# Keep the test curves apart from the site's real ones
+		self.keys = patch.multiple(
+			target_forecast,
+			CURVES_KEY="test_tuktuk_intraday_curves",
+			META_KEY="test_tuktuk_intraday_curves_meta",
+		)
+		self.keys.start()
+		frappe.cache().delete_value(target_forecast.CURVES_KEY)
+
+	def tearDown(self):
+		frappe.cache().delete_value(target_forecast.CURVES_KEY)
+		frappe.cache().delete_value(target_forecast.META_KEY)
+		self.keys.stop()
+
+	def fold_night(self, day):
+		"""Fold one day: 500 collected at 08:00 and 500 at 16:00"""
+		hourly = [0.0] * target_forecast.HOURS
+		hourly[8] = hourly[16] = 500.0
+		with patch.object(target_forecast, "_fetch_hourly_totals", return_value={(self.driver, day): hourly}):
+			target_forecast.update_curves(day, day)
+
+	def forecast_at_noon(self, day):
+		at = datetime.combine(day, time(12, 0))
+		drivers = [{"name": self.driver, "current_balance": 500, "left_to_target": 500}]
+		return target_forecast.forecast_end_of_day(drivers, at=at)[self.driver]
+
+	def test_nightly_folds_accumulate_and_drive_the_forecast(self):
+		first = getdate("2026-09-07")
+		self.fold_night(first)
+		self.fold_night(add_days(first, 7))
+
+		key = target_forecast._curve_key(self.driver, first.weekday())
+		curve = target_forecast._load_curves()[key]
+		self.assertAlmostEqual(curve["weight"], 1 + target_forecast.DECAY)
+
+		# Two nights are below MIN_HISTORY_WEIGHT: the fleet curve is used
+		forecast = self.forecast_at_noon(add_days(first, 14))
+		self.assertEqual(forecast["source"], "fleet")
+		self.assertAlmostEqual(forecast["projected"], 1000)
+		self.assertFalse(forecast["likely_to_miss"])
+
+		self.fold_night(add_days(first, 14))
+		forecast = self.forecast_at_noon(add_days(first, 21))
+		self.assertEqual(forecast["source"], "driver")
+		self.assertAlmostEqual(forecast["projected"], 1000)
+		self.assertEqual(forecast["shortfall"], 0)
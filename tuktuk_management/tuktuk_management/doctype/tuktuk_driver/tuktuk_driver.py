@@ -5,6 +5,13 @@ from frappe.model.document import Document
 from frappe.utils import getdate, date_diff, now_datetime, flt
 import re
 
+# Driver Deposit Transaction type -> TukTuk Driver Ledger Entry event type
+DEPOSIT_LEDGER_EVENTS = {
+    "Target Deduction": "Target Deduction",
+    "Damage Deduction": "Damage Deduction",
+    "Refund": "Refund",
+}
+
 class TukTukDriver(Document):
     def validate(self):
         validate_age(self)
@@ -119,6 +126,9 @@ class TukTukDriver(Document):
         
     def add_deposit_transaction(self, transaction_type, amount, description="", reference=""):
         """Add a deposit transaction record"""
+        # Names the balance ledger entry written on save
+        if not self.flags.ledger_event:
+            self.flags.ledger_event = DEPOSIT_LEDGER_EVENTS.get(transaction_type, "Deposit")
         self.append("deposit_transactions", {
             "transaction_date": getdate(),
             "transaction_type": transaction_type,
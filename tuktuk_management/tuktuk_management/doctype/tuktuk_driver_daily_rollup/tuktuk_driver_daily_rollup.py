@@ -0,0 +1,10 @@
+import frappe
+from frappe.model.document import Document
+
+class TukTukDriverDailyRollup(Document):
+    pass
+
+
+def on_doctype_update():
+    frappe.db.add_index("TukTuk Driver Daily Rollup", ["driver", "business_date"])
+    frappe.db.add_index("TukTuk Driver Daily Rollup", ["substitute_driver", "business_date"])
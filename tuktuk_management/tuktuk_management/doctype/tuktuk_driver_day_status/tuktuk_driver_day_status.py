@@ -0,0 +1,9 @@
+import frappe
+from frappe.model.document import Document
+
+class TukTukDriverDayStatus(Document):
+    pass
+
+
+def on_doctype_update():
+    frappe.db.add_index("TukTuk Driver Day Status", ["driver", "business_date"])
@@ -0,0 +1,15 @@
+import frappe
+from frappe.model.document import Document
+
+class TukTukDriverLedgerEntry(Document):
+    def validate(self):
+        if not self.is_new():
+            frappe.throw("Ledger entries are append-only")
+
+    def on_trash(self):
+        frappe.throw("Ledger entries are append-only")
+
+
+def on_doctype_update():
+    frappe.db.add_index("TukTuk Driver Ledger Entry", ["driver", "posting_time"])
+    frappe.db.add_index("TukTuk Driver Ledger Entry", ["is_checkpoint", "posting_time"])
@@ -1,9 +1,94 @@
 # Copyright (c) 2024, Yuda Media and Contributors
 # See license.txt
 
-# import frappe
+import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from tuktuk_management.api.payout_recompute import diff_rows
+from tuktuk_management.utils import report_cache
+
 
 class TestTukTukTransaction(FrappeTestCase):
 	pass
+
+
+class TestReportCacheEviction(FrappeTestCase):
+	report = "_Test Cached Report"
+
+	def tearDown(self):
+		report_cache.clear_report_cache(self.report)
+
+	def cache_window(self, from_date, to_date):
+		filters = {"from_date": from_date, "to_date": to_date}
+		report_cache.set_cached(self.report, filters, [from_date, to_date], from_date, to_date,
+			sources=(report_cache.TRANSACTIONS,))
+		return filters
+
+	def record_payment(self, timestamp):
+		# Run the controller's on_update as a saved payment would
+		frappe.get_doc({
+			"doctype": "TukTuk Transaction",
+			"transaction_id": "_TEST_CACHE_EVICTION",
+			"driver": "_Test Cache Driver",
+			"transaction_type": "Payment",
+			"payment_status": "Completed",
+			"timestamp": timestamp,
+			"amount": 100,
+			"driver_share": 0,
+			"target_contribution": 100,
+		}).run_method("on_update")
+
+	def test_payment_evicts_only_windows_containing_its_date(self):
+		september = self.cache_window("2026-09-01", "2026-09-30")
+		august = self.cache_window("2026-08-01", "2026-08-31")
+		open_ended = {"from_date": "2026-01-01"}
+		report_cache.set_cached(self.report, open_ended, "open", "2026-01-01", None,
+			sources=(report_cache.TRANSACTIONS,))
+
+		self.record_payment("2026-09-15 10:00:00")
+
+		self.assertIsNone(report_cache.get_cached(self.report, september))
+		self.assertIsNone(report_cache.get_cached(self.report, open_ended))
+		self.assertEqual(report_cache.get_cached(self.report, august), ["2026-08-01", "2026-08-31"])
+
+	def test_deposit_change_does_not_evict_transaction_only_results(self):
+		september = self.cache_window("2026-09-01", "2026-09-30")
+
+		report_cache.invalidate_for_date("2026-09-15", source=report_cache.DEPOSITS)
+		self.assertIsNotNone(report_cache.get_cached(self.report, september))
+
+		report_cache.clear_report_cache(self.report)
+		self.assertIsNone(report_cache.get_cached(self.report, september))
+
+
+class TestPayoutRecomputeDiff(FrappeTestCase):
+	def row(self, name, business_date, share, contribution, new_share, new_contribution):
+		return frappe._dict({
+			"name": name,
+			"transaction_id": name,
+			"timestamp": f"{business_date} 10:00:00",
+			"business_date": business_date,
+			"amount": 100,
+			"driver_share": share,
+			"target_contribution": contribution,
+			"new_driver_share": new_share,
+			"new_target_contribution": new_contribution,
+			"running_before": 0,
+		})
+
+	def test_only_changed_rows_are_reported_and_summed_per_day(self):
+		rows = [
+			# 50% -> 60%
+			self.row("T1", "2026-09-01", 50, 50, 60, 40),
+			self.row("T2", "2026-09-01", 50, 50, 60, 40),
+			# Unchanged (within rounding)
+			self.row("T3", "2026-09-01", 60, 40, 60.001, 39.999),
+			# Target met under the new split: 100% to the driver
+			self.row("T4", "2026-09-02", 50, 50, 100, 0),
+		]
+
+		changes, days = diff_rows(rows)
+
+		self.assertEqual([c["name"] for c in changes], ["T1", "T2", "T4"])
+		self.assertEqual(days["2026-09-01"], {"transactions": 2, "share_delta": 20, "contribution_delta": -20})
+		self.assertEqual(days["2026-09-02"], {"transactions": 1, "share_delta": 50, "contribution_delta": -50})
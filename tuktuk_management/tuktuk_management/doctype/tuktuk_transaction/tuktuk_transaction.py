@@ -1,4 +1,21 @@
-from frappe.model.document import Document
-
-class TukTukTransaction(Document):
-    pass
\ No newline at end of file
+import frappe
+from frappe.model.document import Document
+
+from tuktuk_management.api.driver_rollup import on_transaction_trash, on_transaction_update
+
+class TukTukTransaction(Document):
+    def on_update(self):
+        # Keep the per-driver daily rollup in the same DB transaction as this write
+        on_transaction_update(self)
+
+    def on_trash(self):
+        on_transaction_trash(self)
+
+
+def on_doctype_update():
+    # Reports filter on timestamp ranges, usually per driver / substitute
+    frappe.db.add_index("TukTuk Transaction", ["timestamp"])
+    frappe.db.add_index("TukTuk Transaction", ["driver", "timestamp"])
+    frappe.db.add_index("TukTuk Transaction", ["substitute_driver", "timestamp"])
+    # Failed payment matcher: payment history of a customer phone
+    frappe.db.add_index("TukTuk Transaction", ["customer_phone", "timestamp"])
@@ -31,6 +31,12 @@ frappe.query_reports["Deposit Management Report"] = {
             "label": __("Allows Target Deduction"),
             "fieldtype": "Select",
             "options": "\nYes\nNo"
+        },
+        {
+            "fieldname": "as_of_date",
+            "label": __("Liability As Of"),
+            "fieldtype": "Date",
+            "default": frappe.datetime.get_today()
         }
     ],
     
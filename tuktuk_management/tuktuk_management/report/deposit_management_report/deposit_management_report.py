@@ -5,6 +5,13 @@ import frappe
 from frappe import _
 from frappe.utils import flt, getdate
 
+from tuktuk_management.api.deposit_liability import get_deposit_liability
+from tuktuk_management.utils.report_cache import DEPOSITS, TRANSACTIONS, cached_report
+
+REPORT_NAME = "Deposit Management Report"
+
+# Rows show current driver balances, so every deposit or transaction change evicts the result
+@cached_report(REPORT_NAME, sources=(DEPOSITS, TRANSACTIONS), live=True, from_field=None, to_field=None)
 def execute(filters=None):
     if not filters:
         filters = {}
@@ -13,7 +20,7 @@ def execute(filters=None):
     data = get_data(filters)
     
     chart_data = get_chart_data(data)
-    summary = get_summary(data)
+    summary = get_summary(data, filters)
     
     return columns, data, None, chart_data, summary
 
@@ -110,7 +117,7 @@ def get_columns():
 def get_data(filters):
     conditions = get_conditions(filters)
     
-    # Main query to get driver data
+    # Driver data with deposit totals from one grouped pass over the child table
     data = frappe.db.sql(f"""
         SELECT 
             d.name as driver_name,
@@ -118,6 +125,8 @@ def get_data(filters):
             d.deposit_required,
             d.initial_deposit_amount as initial_deposit,
             d.current_deposit_balance as current_balance,
+            COALESCE(ddt.total_deposits, 0) as total_deposits,
+            COALESCE(ddt.total_deductions, 0) as total_deductions,
             d.allow_target_deduction_from_deposit as allows_target_deduction,
             d.assigned_tuktuk,
             d.current_balance as target_balance,
@@ -127,31 +136,21 @@ def get_data(filters):
             d.refund_amount
         FROM 
             `tabTukTuk Driver` d
+        LEFT JOIN (
+            SELECT
+                parent,
+                SUM(CASE WHEN amount > 0 THEN amount ELSE 0 END) as total_deposits,
+                SUM(CASE WHEN amount < 0 THEN ABS(amount) ELSE 0 END) as total_deductions
+            FROM `tabDriver Deposit Transaction`
+            WHERE parenttype = 'TukTuk Driver'
+            GROUP BY parent
+        ) ddt ON ddt.parent = d.name
         WHERE 
             {conditions}
         ORDER BY 
             d.driver_name
     """, filters, as_dict=1)
     
-    # Calculate totals for each driver
-    for row in data:
-        if row.driver_name:
-            # Get transaction totals
-            transaction_totals = frappe.db.sql("""
-                SELECT 
-                    SUM(CASE WHEN amount > 0 THEN amount ELSE 0 END) as total_deposits,
-                    SUM(CASE WHEN amount < 0 THEN ABS(amount) ELSE 0 END) as total_deductions
-                FROM `tabDriver Deposit Transaction`
-                WHERE parent = %s
-            """, (row.driver_name,), as_dict=1)
-            
-            if transaction_totals:
-                row.total_deposits = transaction_totals[0].total_deposits or 0
-                row.total_deductions = transaction_totals[0].total_deductions or 0
-            else:
-                row.total_deposits = 0
-                row.total_deductions = 0
-    
     return data
 
 def get_conditions(filters):
@@ -205,20 +204,32 @@ def get_chart_data(data):
         "colors": ["#5e64ff", "#36a2eb"]
     }
 
-def get_summary(data):
+def get_summary(data, filters):
     if not data:
         return []
     
-    # Calculate summary statistics
-    active_drivers = [d for d in data if not d.exit_date]
-    exited_drivers = [d for d in data if d.exit_date]
-    
-    total_initial_deposits = sum([flt(d.initial_deposit) for d in data if d.deposit_required])
-    total_current_balances = sum([flt(d.current_balance) for d in data if d.deposit_required])
-    total_refunds_pending = sum([flt(d.refund_amount) for d in exited_drivers if d.refund_status == 'Pending'])
-    
-    drivers_allow_deduction = len([d for d in active_drivers if d.allows_target_deduction])
-    drivers_with_negative_target = len([d for d in active_drivers if flt(d.target_balance) < 0])
+    # Calculate summary statistics in a single pass
+    active_count = exited_count = 0
+    total_initial_deposits = total_current_balances = total_refunds_pending = 0
+    drivers_allow_deduction = drivers_with_negative_target = 0
+
+    for d in data:
+        if d.deposit_required:
+            total_initial_deposits += flt(d.initial_deposit)
+            total_current_balances += flt(d.current_balance)
+
+        if d.exit_date:
+            exited_count += 1
+            if d.refund_status == 'Pending':
+                total_refunds_pending += flt(d.refund_amount)
+        else:
+            active_count += 1
+            if d.allows_target_deduction:
+                drivers_allow_deduction += 1
+            if flt(d.target_balance) < 0:
+                drivers_with_negative_target += 1
+
+    liability = get_deposit_liability(filters.get("as_of_date"))
     
     return [
         {
@@ -228,12 +239,12 @@ def get_summary(data):
         },
         {
             "label": _("Active Drivers"),
-            "value": len(active_drivers),
+            "value": active_count,
             "indicator": "Green"
         },
         {
             "label": _("Exited Drivers"),
-            "value": len(exited_drivers),
+            "value": exited_count,
             "indicator": "Grey"
         },
         {
@@ -253,12 +264,27 @@ def get_summary(data):
         },
         {
             "label": _("Drivers Allow Target Deduction"),
-            "value": f"{drivers_allow_deduction}/{len(active_drivers)}",
+            "value": f"{drivers_allow_deduction}/{active_count}",
             "indicator": "Blue"
         },
         {
             "label": _("Drivers with Negative Target Balance"),
             "value": drivers_with_negative_target,
             "indicator": "Red" if drivers_with_negative_target > 0 else "Green"
+        },
+        {
+            "label": _("Fleet Deposits Held (as of {0})").format(liability.as_of_date),
+            "value": f"{liability.total_held:,.0f} KSH",
+            "indicator": "Blue"
+        },
+        {
+            "label": _("Fleet Deposits Deducted"),
+            "value": f"{liability.total_deducted:,.0f} KSH",
+            "indicator": "Red"
+        },
+        {
+            "label": _("Fleet Deposits Refunded"),
+            "value": f"{liability.total_refunded:,.0f} KSH",
+            "indicator": "Grey"
         }
     ]
\ No newline at end of file
@@ -3,6 +3,27 @@
 
 frappe.query_reports["Driver Performance Report"] = {
 	"filters": [
-
+		{
+			"fieldname": "from_date",
+			"label": __("From Date"),
+			"fieldtype": "Date"
+		},
+		{
+			"fieldname": "to_date",
+			"label": __("To Date"),
+			"fieldtype": "Date"
+		},
+		{
+			"fieldname": "driver",
+			"label": __("Driver"),
+			"fieldtype": "Link",
+			"options": "TukTuk Driver"
+		},
+		{
+			"fieldname": "target_status",
+			"label": __("Target Status"),
+			"fieldtype": "Select",
+			"options": "\nMet\nNot Met"
+		}
 	]
 };
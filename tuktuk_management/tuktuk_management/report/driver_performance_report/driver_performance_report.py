@@ -1,147 +1,164 @@
-# ~/frappe-bench/apps/tuktuk_management/tuktuk_management/tuktuk_management/report/driver_performance_report/driver_performance_report.py
-
-from __future__ import unicode_literals
-import frappe
-from frappe import _
-
-def execute(filters=None):
-    if not filters:
-        filters = {}
-
-    columns = get_columns()
-    data = get_data(filters)
-    
-    chart_data = get_chart_data(data)
-    
-    return columns, data, None, chart_data
-
-def get_columns():
-    return [
-        {
-            "fieldname": "driver_name",
-            "label": _("Driver Name"),
-            "fieldtype": "Link",
-            "options": "TukTuk Driver",
-            "width": 150
-        },
-        {
-            "fieldname": "total_trips",
-            "label": _("Total Trips"),
-            "fieldtype": "Int",
-            "width": 100
-        },
-        {
-            "fieldname": "total_revenue",
-            "label": _("Total Revenue"),
-            "fieldtype": "Currency",
-            "width": 120
-        },
-        {
-            "fieldname": "driver_earnings",
-            "label": _("Driver Earnings"),
-            "fieldtype": "Currency",
-            "width": 120
-        },
-        {
-            "fieldname": "target_progress",
-            "label": _("Target Progress"),
-            "fieldtype": "Percent",
-            "width": 120
-        },
-        {
-            "fieldname": "avg_battery_level",
-            "label": _("Avg Battery Level"),
-            "fieldtype": "Percent",
-            "width": 120
-        },
-        {
-            "fieldname": "charging_stops",
-            "label": _("Charging Stops"),
-            "fieldtype": "Int",
-            "width": 120
-        },
-        {
-            "fieldname": "missed_targets",
-            "label": _("Missed Targets"),
-            "fieldtype": "Int",
-            "width": 120
-        }
-    ]
-
-def get_data(filters):
-    conditions = get_conditions(filters)
-    
-    data = frappe.db.sql("""
-        SELECT 
-            td.name as driver_name,
-            COUNT(DISTINCT tt.name) as total_trips,
-            SUM(tt.amount) as total_revenue,
-            SUM(tt.driver_share) as driver_earnings,
-            (td.current_balance / COALESCE(td.daily_target,
-                (SELECT global_daily_target FROM `tabTukTuk Settings` LIMIT 1))) * 100
-                as target_progress,
-            (SELECT AVG(battery_level) 
-             FROM `tabTukTuk Vehicle` 
-             WHERE name = td.assigned_tuktuk) as avg_battery_level,
-            (SELECT COUNT(*) 
-             FROM `tabTukTuk Vehicle` tv 
-             WHERE tv.name = td.assigned_tuktuk 
-             AND tv.status = 'Charging') as charging_stops,
-            td.consecutive_misses as missed_targets
-        FROM 
-            `tabTukTuk Driver` td
-        LEFT JOIN 
-            `tabTukTuk Transaction` tt ON td.name = tt.driver 
-            AND tt.transaction_type NOT IN ('Adjustment', 'Driver Repayment')  -- Exclude adjustment and repayment transactions
-        WHERE 
-            {conditions}
-        GROUP BY 
-            td.name
-        ORDER BY 
-            td.name
-    """.format(conditions=conditions), filters, as_dict=1)
-    
-    return data
-
-def get_conditions(filters):
-    conditions = "1=1"
-    
-    if filters.get("from_date"):
-        conditions += " AND tt.timestamp >= %(from_date)s"
-    
-    if filters.get("to_date"):
-        conditions += " AND tt.timestamp <= %(to_date)s"
-        
-    if filters.get("driver"):
-        conditions += " AND td.name = %(driver)s"
-        
-    if filters.get("target_status"):
-        if filters.get("target_status") == "Met":
-            conditions += " AND td.current_balance >= COALESCE(td.daily_target, \
-                (SELECT global_daily_target FROM `tabTukTuk Settings` LIMIT 1))"
-        else:
-            conditions += " AND td.current_balance < COALESCE(td.daily_target, \
-                (SELECT global_daily_target FROM `tabTukTuk Settings` LIMIT 1))"
-    
-    return conditions
-
-def get_chart_data(data):
-    if not data:
-        return None
-
-    labels = [row.get("driver_name") for row in data]
-    target_progress = [row.get("target_progress") for row in data]
-    
-    return {
-        "data": {
-            "labels": labels,
-            "datasets": [
-                {
-                    "name": "Target Progress",
-                    "values": target_progress
-                }
-            ]
-        },
-        "type": "bar",
-        "colors": ["#5e64ff"]
+# ~/frappe-bench/apps/tuktuk_management/tuktuk_management/tuktuk_management/report/driver_performance_report/driver_performance_report.py
+
+from __future__ import unicode_literals
+import frappe
+from frappe import _
+from frappe.utils import flt
+
+from tuktuk_management.utils.report_cache import TRANSACTIONS, cached_report
+
+REPORT_NAME = "Driver Performance Report"
+
+# Target progress and battery are live values, so closed ranges keep the short TTL too
+@cached_report(REPORT_NAME, sources=(TRANSACTIONS,), live=True)
+def execute(filters=None):
+    if not filters:
+        filters = {}
+
+    columns = get_columns()
+    data = get_data(filters)
+    
+    chart_data = get_chart_data(data)
+    
+    return columns, data, None, chart_data
+
+def get_columns():
+    return [
+        {
+            "fieldname": "driver_name",
+            "label": _("Driver Name"),
+            "fieldtype": "Link",
+            "options": "TukTuk Driver",
+            "width": 150
+        },
+        {
+            "fieldname": "total_trips",
+            "label": _("Total Trips"),
+            "fieldtype": "Int",
+            "width": 100
+        },
+        {
+            "fieldname": "total_revenue",
+            "label": _("Total Revenue"),
+            "fieldtype": "Currency",
+            "width": 120
+        },
+        {
+            "fieldname": "driver_earnings",
+            "label": _("Driver Earnings"),
+            "fieldtype": "Currency",
+            "width": 120
+        },
+        {
+            "fieldname": "target_progress",
+            "label": _("Target Progress"),
+            "fieldtype": "Percent",
+            "width": 120
+        },
+        {
+            "fieldname": "avg_battery_level",
+            "label": _("Avg Battery Level"),
+            "fieldtype": "Percent",
+            "width": 120
+        },
+        {
+            "fieldname": "charging_stops",
+            "label": _("Charging Stops"),
+            "fieldtype": "Int",
+            "width": 120
+        },
+        {
+            "fieldname": "missed_targets",
+            "label": _("Missed Targets"),
+            "fieldtype": "Int",
+            "width": 120
+        }
+    ]
+
+def get_data(filters):
+    """
+    Per-driver totals come from the driver daily rollup (one pre-aggregated row
+    per driver per day), joined once to the assigned vehicle.
+    """
+    params = dict(filters)
+    params["global_target"] = flt(frappe.db.get_single_value("TukTuk Settings", "global_daily_target"))
+
+    rollup_conditions = "1=1"
+    if filters.get("from_date"):
+        rollup_conditions += " AND business_date >= %(from_date)s"
+    if filters.get("to_date"):
+        rollup_conditions += " AND business_date <= %(to_date)s"
+
+    # A date filter only lists drivers with activity in the window
+    join = "INNER JOIN" if filters.get("from_date") or filters.get("to_date") else "LEFT JOIN"
+
+    data = frappe.db.sql("""
+        SELECT
+            td.name as driver_name,
+            COALESCE(r.total_trips, 0) as total_trips,
+            COALESCE(r.total_revenue, 0) as total_revenue,
+            COALESCE(r.driver_earnings, 0) as driver_earnings,
+            (td.current_balance / NULLIF(COALESCE(NULLIF(td.daily_target, 0), %(global_target)s), 0)) * 100
+                as target_progress,
+            tv.battery_level as avg_battery_level,
+            CASE WHEN tv.status = 'Charging' THEN 1 ELSE 0 END as charging_stops,
+            td.consecutive_misses as missed_targets
+        FROM
+            `tabTukTuk Driver` td
+        {join} (
+            SELECT
+                driver,
+                SUM(trips) as total_trips,
+                SUM(revenue) as total_revenue,
+                SUM(driver_share) as driver_earnings
+            FROM `tabTukTuk Driver Daily Rollup`
+            WHERE driver IS NOT NULL
+              AND {rollup_conditions}
+            GROUP BY driver
+        ) r ON r.driver = td.name
+        LEFT JOIN
+            `tabTukTuk Vehicle` tv ON tv.name = td.assigned_tuktuk
+        WHERE
+            {conditions}
+        ORDER BY
+            td.name
+    """.format(join=join, rollup_conditions=rollup_conditions, conditions=get_conditions(filters)),
+        params, as_dict=1)
+
+    return data
+
+def get_conditions(filters):
+    conditions = "1=1"
+
+    if filters.get("driver"):
+        conditions += " AND td.name = %(driver)s"
+
+    if filters.get("target_status"):
+        target = "COALESCE(NULLIF(td.daily_target, 0), %(global_target)s)"
+        if filters.get("target_status") == "Met":
+            conditions += f" AND td.current_balance >= {target}"
+        else:
+            conditions += f" AND td.current_balance < {target}"
+
+    return conditions
+
+def get_chart_data(data):
+    if not data:
+        return None
+
+    labels = [row.get("driver_name") for row in data]
+    target_progress = [row.get("target_progress") for row in data]
+    
+    return {
+        "data": {
+            "labels": labels,
+            "datasets": [
+                {
+                    "name": "Target Progress",
+                    "values": target_progress
+                }
+            ]
+        },
+        "type": "bar",
+        "colors": ["#5e64ff"]
     }
\ No newline at end of file
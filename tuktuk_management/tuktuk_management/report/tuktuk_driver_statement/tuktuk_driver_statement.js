@@ -26,6 +26,72 @@ frappe.query_reports["TukTuk Driver Statement"] = {
 		}
 	],
 
+	"onload": function(report) {
+		["CSV", "XLSX"].forEach(function(file_format) {
+			report.page.add_inner_button(__("Export {0}", [file_format]), function() {
+				let filters = report.get_values();
+				if (!filters) return;
+
+				frappe.call({
+					method: "tuktuk_management.api.driver_statement.export_driver_statement",
+					args: {
+						driver: filters.driver,
+						from_date: filters.from_date,
+						to_date: filters.to_date,
+						file_format: file_format
+					},
+					callback: function(r) {
+						if (r.message) {
+							frappe.show_alert({message: r.message.message, indicator: "blue"});
+						}
+					}
+				});
+			}, __("Export"));
+		});
+
+		report.page.add_inner_button(__("All Drivers (Month)"), function() {
+			let d = new frappe.ui.Dialog({
+				title: __("Monthly Statements for All Drivers"),
+				fields: [
+					{fieldname: "month_date", label: __("Any Date in Month"), fieldtype: "Date", reqd: 1,
+						default: frappe.datetime.add_months(frappe.datetime.get_today(), -1)},
+					{fieldname: "file_format", label: __("File Format"), fieldtype: "Select", options: "CSV\nXLSX", default: "CSV"},
+					{fieldname: "notify", label: __("Send Link By"), fieldtype: "Select", options: "\nEmail\nSMS"}
+				],
+				primary_action_label: __("Generate"),
+				primary_action: function(values) {
+					frappe.call({
+						method: "tuktuk_management.api.bulk_statements.enqueue_monthly_statements",
+						args: values,
+						callback: function(r) {
+							if (r.message) {
+								frappe.show_alert({message: r.message.message, indicator: "blue"});
+								d.hide();
+							}
+						}
+					});
+				}
+			});
+			d.show();
+		}, __("Export"));
+
+		frappe.realtime.on("bulk_statements_ready", function(data) {
+			frappe.msgprint({
+				title: __("Statements Ready"),
+				message: __("{0} statements for {1} ({2} per minute)", [data.statements, data.period, data.statements_per_minute]),
+				indicator: "green"
+			});
+		});
+
+		frappe.realtime.on("driver_statement_export_ready", function(data) {
+			frappe.msgprint({
+				title: __("Statement Ready"),
+				message: __("Statement for {0}: <a href='{1}' target='_blank'>{2}</a>", [data.driver, data.file_url, data.file_name]),
+				indicator: "green"
+			});
+		});
+	},
+
 	"formatter": function(value, row, column, data, default_formatter) {
 		value = default_formatter(value, row, column, data);
 
@@ -5,6 +5,13 @@ import frappe
 from frappe import _
 from frappe.utils import flt
 
+from tuktuk_management.api.driver_rollup import get_driver_daily_rows, get_driver_range_totals
+from tuktuk_management.api.driver_statement import iter_statement
+from tuktuk_management.utils.report_cache import cached_report
+
+REPORT_NAME = "TukTuk Driver Statement"
+REPORT_ROW_LIMIT = 5000
+
 def execute(filters=None):
     if not filters:
         filters = {}
@@ -17,12 +24,30 @@ def execute(filters=None):
     if not filters.get("to_date"):
         frappe.throw(_("Please select a To Date"))
 
-    columns = get_columns()
-    data = get_data(filters)
-    summary = get_summary(filters)
-    chart_data = get_chart_data(data)
+    result = get_statement_result(filters)
+    if result.truncated:
+        frappe.msgprint(
+            _("Showing the first {0} rows. Use Export to download the full statement.").format(REPORT_ROW_LIMIT),
+            indicator="orange",
+            alert=True
+        )
 
-    return columns, data, None, chart_data, summary
+    # Driver name and current balances are read fresh; everything else is range-bound
+    summary = get_summary(filters, result.totals, result.deposit_totals)
+
+    return get_columns(), result.data, None, result.chart_data, summary
+
+@cached_report(REPORT_NAME)
+def get_statement_result(filters):
+    """Rows, chart and period totals of the statement (cached per driver and range)"""
+    data, truncated = get_data(filters)
+    return frappe._dict(
+        data=data,
+        truncated=truncated,
+        chart_data=get_chart_data(filters),
+        totals=get_driver_range_totals(filters.get("driver"), filters.get("from_date"), filters.get("to_date")),
+        deposit_totals=get_deposit_totals(filters),
+    )
 
 def get_columns():
     return [
@@ -90,69 +115,43 @@ def get_columns():
         },
         {
             "fieldname": "balance_after",
-            "label": _("Balance After"),
+            "label": _("Deposit Balance"),
             "fieldtype": "Currency",
             "width": 120
+        },
+        {
+            "fieldname": "running_earnings",
+            "label": _("Running Earnings"),
+            "fieldtype": "Currency",
+            "width": 130
         }
     ]
 
 def get_data(filters):
-    driver = filters.get("driver")
-    from_date = filters.get("from_date")
-    to_date = filters.get("to_date")
+    """
+    Statement rows streamed in order from the statement engine.
+    The report view shows up to REPORT_ROW_LIMIT rows; longer statements are
+    paged through get_statement_page or exported to CSV/XLSX.
+    """
+    rows = []
+    for row in iter_statement(filters.get("driver"), filters.get("from_date"), filters.get("to_date")):
+        if len(rows) == REPORT_ROW_LIMIT:
+            return rows, True
+        row.pop("_cursor", None)
+        rows.append(row)
 
-    # Get all transactions (rides and adjustments)
-    transactions = frappe.db.sql("""
-        SELECT
-            DATE(tt.timestamp) as posting_date,
-            CASE 
-                WHEN tt.transaction_type = 'Adjustment' THEN 'Adjustment Transaction'
-                WHEN tt.transaction_type = 'Driver Repayment' THEN 'Driver Repayment'
-                ELSE 'Ride Payment'
-            END as transaction_type,
-            tt.transaction_id,
-            tt.name as reference,
-            'TukTuk Transaction' as ref_doctype,
-            CASE 
-                WHEN tt.transaction_type = 'Adjustment' THEN CONCAT('Adjustment: ', tt.customer_phone)
-                WHEN tt.transaction_type = 'Driver Repayment' THEN CONCAT('Driver Repayment: ', tt.customer_phone)
-                ELSE CONCAT('Customer: ', tt.customer_phone)
-            END as description,
-            tt.amount as revenue,
-            tt.driver_share,
-            tt.target_contribution,
-            0 as deposit_amount,
-            NULL as balance_after,
-            tt.timestamp as sort_timestamp
-        FROM
-            `tabTukTuk Transaction` tt
-        WHERE
-            tt.driver = %(driver)s
-            AND DATE(tt.timestamp) BETWEEN %(from_date)s AND %(to_date)s
-            AND tt.payment_status = 'Completed'
-        ORDER BY
-            tt.timestamp
-    """, {
-        'driver': driver,
-        'from_date': from_date,
-        'to_date': to_date
-    }, as_dict=1)
+    return rows, False
 
-    # Get deposit transactions from the driver's deposit history
-    deposit_transactions = frappe.db.sql("""
+def get_deposit_totals(filters):
+    """Deposits, deductions and refunds of the driver in the statement range"""
+    return frappe.db.sql("""
         SELECT
-            ddt.transaction_date as posting_date,
-            CONCAT('Deposit - ', ddt.transaction_type) as transaction_type,
-            ddt.transaction_reference as transaction_id,
-            td.name as reference,
-            'TukTuk Driver' as ref_doctype,
-            COALESCE(ddt.description, ddt.transaction_type) as description,
-            0 as revenue,
-            0 as driver_share,
-            0 as target_contribution,
-            ddt.amount as deposit_amount,
-            ddt.balance_after_transaction as balance_after,
-            CONCAT(ddt.transaction_date, ' 23:59:59') as sort_timestamp
+            SUM(CASE WHEN ddt.transaction_type IN ('Initial Deposit', 'Top Up')
+                THEN ddt.amount ELSE 0 END) as total_deposits,
+            SUM(CASE WHEN ddt.transaction_type IN ('Target Deduction', 'Damage Deduction')
+                THEN ddt.amount ELSE 0 END) as total_deductions,
+            SUM(CASE WHEN ddt.transaction_type = 'Refund'
+                THEN ddt.amount ELSE 0 END) as total_refunds
         FROM
             `tabDriver Deposit Transaction` ddt
         JOIN
@@ -160,82 +159,34 @@ def get_data(filters):
         WHERE
             td.name = %(driver)s
             AND ddt.transaction_date BETWEEN %(from_date)s AND %(to_date)s
-        ORDER BY
-            ddt.transaction_date
     """, {
-        'driver': driver,
-        'from_date': from_date,
-        'to_date': to_date
-    }, as_dict=1)
-
-    # Combine both transaction types and sort by timestamp
-    all_transactions = transactions + deposit_transactions
-    all_transactions = sorted(all_transactions, key=lambda x: x.get('sort_timestamp', ''))
-
-    # Remove the sort_timestamp field before returning
-    for row in all_transactions:
-        row.pop('sort_timestamp', None)
-
-    return all_transactions
+        'driver': filters.get("driver"),
+        'from_date': filters.get("from_date"),
+        'to_date': filters.get("to_date")
+    }, as_dict=1)[0]
 
-def get_summary(filters):
+def get_summary(filters, totals, deposit_summary):
     """Get summary statistics for the driver statement"""
-    driver = filters.get("driver")
-    from_date = filters.get("from_date")
-    to_date = filters.get("to_date")
-
     # Get driver information
     driver_info = frappe.db.get_value(
         "TukTuk Driver",
-        driver,
+        filters.get("driver"),
         ["driver_name", "current_balance", "current_deposit_balance"],
         as_dict=1
     )
 
-    # Get transaction summaries (excluding adjustments and repayments from earnings)
-    trip_summary = frappe.db.sql("""
-        SELECT
-            COUNT(CASE WHEN transaction_type NOT IN ('Adjustment', 'Driver Repayment') THEN 1 END) as total_trips,
-            SUM(CASE WHEN transaction_type NOT IN ('Adjustment', 'Driver Repayment') THEN amount ELSE 0 END) as total_revenue,
-            SUM(CASE WHEN transaction_type NOT IN ('Adjustment', 'Driver Repayment') THEN driver_share ELSE 0 END) as total_driver_earnings,
-            SUM(CASE WHEN transaction_type NOT IN ('Adjustment', 'Driver Repayment') THEN target_contribution ELSE 0 END) as total_target_contribution,
-            COUNT(CASE WHEN transaction_type = 'Adjustment' THEN 1 END) as total_adjustments,
-            SUM(CASE WHEN transaction_type = 'Adjustment' THEN amount ELSE 0 END) as total_adjustment_amount,
-            COUNT(CASE WHEN transaction_type = 'Driver Repayment' THEN 1 END) as total_repayments,
-            SUM(CASE WHEN transaction_type = 'Driver Repayment' THEN amount ELSE 0 END) as total_repayment_amount
-        FROM
-            `tabTukTuk Transaction`
-        WHERE
-            driver = %(driver)s
-            AND DATE(timestamp) BETWEEN %(from_date)s AND %(to_date)s
-            AND payment_status = 'Completed'
-    """, {
-        'driver': driver,
-        'from_date': from_date,
-        'to_date': to_date
-    }, as_dict=1)[0]
-
-    # Get deposit transaction summary
-    deposit_summary = frappe.db.sql("""
-        SELECT
-            SUM(CASE WHEN ddt.transaction_type IN ('Initial Deposit', 'Top Up')
-                THEN ddt.amount ELSE 0 END) as total_deposits,
-            SUM(CASE WHEN ddt.transaction_type IN ('Target Deduction', 'Damage Deduction')
-                THEN ddt.amount ELSE 0 END) as total_deductions,
-            SUM(CASE WHEN ddt.transaction_type = 'Refund'
-                THEN ddt.amount ELSE 0 END) as total_refunds
-        FROM
-            `tabDriver Deposit Transaction` ddt
-        JOIN
-            `tabTukTuk Driver` td ON ddt.parent = td.name
-        WHERE
-            td.name = %(driver)s
-            AND ddt.transaction_date BETWEEN %(from_date)s AND %(to_date)s
-    """, {
-        'driver': driver,
-        'from_date': from_date,
-        'to_date': to_date
-    }, as_dict=1)[0]
+    # Transaction summaries come from the driver daily rollup
+    # (trips exclude adjustments and repayments, which are totalled separately)
+    trip_summary = {
+        "total_trips": totals.trips,
+        "total_revenue": totals.revenue,
+        "total_driver_earnings": totals.driver_share,
+        "total_target_contribution": totals.target_contribution,
+        "total_adjustments": totals.adjustments,
+        "total_adjustment_amount": totals.adjustment_amount,
+        "total_repayments": totals.repayments,
+        "total_repayment_amount": totals.repayment_amount
+    }
 
     summary = [
         {
@@ -319,43 +270,23 @@ def get_summary(filters):
 
     return summary
 
-def get_chart_data(data):
-    """Generate chart data for visualization"""
-    if not data:
+def get_chart_data(filters):
+    """Daily earnings chart from the driver daily rollup (covers the full range)"""
+    days = get_driver_daily_rows(filters.get("driver"), filters.get("from_date"), filters.get("to_date"))
+    if not days:
         return None
 
-    # Group data by date and sum earnings
-    date_earnings = {}
-    for row in data:
-        date = row.get("posting_date")
-        if date:
-            if date not in date_earnings:
-                date_earnings[date] = {
-                    "driver_share": 0,
-                    "target_contribution": 0,
-                    "deposit_amount": 0
-                }
-            date_earnings[date]["driver_share"] += flt(row.get("driver_share", 0))
-            date_earnings[date]["target_contribution"] += flt(row.get("target_contribution", 0))
-            date_earnings[date]["deposit_amount"] += flt(row.get("deposit_amount", 0))
-
-    # Sort dates
-    sorted_dates = sorted(date_earnings.keys())
-
-    driver_shares = [date_earnings[date]["driver_share"] for date in sorted_dates]
-    target_contributions = [date_earnings[date]["target_contribution"] for date in sorted_dates]
-
     return {
         "data": {
-            "labels": [str(date) for date in sorted_dates],
+            "labels": [str(day.business_date) for day in days],
             "datasets": [
                 {
                     "name": "Driver Earnings",
-                    "values": driver_shares
+                    "values": [flt(day.driver_share) for day in days]
                 },
                 {
                     "name": "Target Contribution",
-                    "values": target_contributions
+                    "values": [flt(day.target_contribution) for day in days]
                 }
             ]
         },
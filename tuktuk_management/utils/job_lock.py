@@ -0,0 +1,246 @@
+# ~/frappe-bench/apps/tuktuk_management/tuktuk_management/utils/job_lock.py
+"""
+Single-flight locks for scheduled jobs
+
+Every scheduler entry point in hooks.py is wrapped with @single_flight so that
+two scheduler processes (or a manual `bench execute` racing the cron) can never
+run the same job at the same time. The lock is a Redis key with a lease that is
+renewed by a heartbeat thread while the job is still running, so long jobs keep
+their lock and crashed workers release it when the lease expires.
+
+Each run also records its status (running / last run / duration / rows touched)
+in Redis, queryable through get_job_status(). Jobs that catch and log their own
+errors call mark_failed() so the run is still recorded as Failed.
+"""
+
+import functools
+import os
+import socket
+import threading
+import time
+import uuid
+
+import frappe
+from frappe.utils import now_datetime
+
+LOCK_KEY_PREFIX = "tuktuk_job_lock:"
+STATUS_KEY = "tuktuk_job_status"
+DEFAULT_LEASE_SECONDS = 600
+
+# Only extend / delete the lock if we still own it (token matches)
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class JobLock:
+    """
+    Redis lease lock for a single named job.
+
+    Usage:
+        with JobLock("reset_daily_targets") as lock:
+            if not lock.acquired:
+                return
+            ...
+            lock.add_rows_touched(processed)
+    """
+
+    def __init__(self, job_name, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.job_name = job_name
+        self.lease_seconds = int(lease_seconds)
+        self.token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+        self.acquired = False
+        self.rows_touched = 0
+        self.error = None
+        self.started_at = None
+        self._cache = frappe.cache()
+        self._key = self._cache.make_key(LOCK_KEY_PREFIX + job_name)
+        self._stop = threading.Event()
+        self._heartbeat = None
+
+    def acquire(self):
+        """Try to take the lock once; never blocks"""
+        self.acquired = bool(
+            self._cache.set(self._key, self.token, nx=True, ex=self.lease_seconds)
+        )
+        if self.acquired:
+            self.started_at = now_datetime()
+            self._start_heartbeat()
+        return self.acquired
+
+    def renew(self):
+        """Extend the lease; returns False if the lock was lost"""
+        return bool(self._cache.eval(_RENEW_SCRIPT, 1, self._key, self.token, self.lease_seconds * 1000))
+
+    def release(self):
+        self._stop.set()
+        if self._heartbeat:
+            self._heartbeat.join(timeout=5)
+        if self.acquired:
+            self._cache.eval(_RELEASE_SCRIPT, 1, self._key, self.token)
+            self.acquired = False
+
+    def add_rows_touched(self, count):
+        self.rows_touched += int(count or 0)
+
+    def mark_failed(self, error=None):
+        self.error = str(error or "Failed")
+
+    def _start_heartbeat(self):
+        interval = max(1, self.lease_seconds // 3)
+
+        def beat():
+            while not self._stop.wait(interval):
+                try:
+                    if not self.renew():
+                        break
+                except Exception:
+                    # Redis hiccup: keep trying until the lease runs out
+                    continue
+
+        self._heartbeat = threading.Thread(
+            target=beat, name=f"job-lock-{self.job_name}", daemon=True
+        )
+        self._heartbeat.start()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+def single_flight(job_name=None, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """
+    Decorator for scheduled jobs: run only if no other process holds the job's lock.
+
+    The running lock is exposed as frappe.flags.job_lock so the job can report
+    rows touched via set_rows_touched() / add_rows_touched(), and a failure it
+    handled itself via mark_failed().
+    """
+    def decorator(fn):
+        name = job_name or f"{fn.__module__}.{fn.__name__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            lock = JobLock(name, lease_seconds=lease_seconds)
+            if not lock.acquire():
+                frappe.log_error(
+                    f"Skipping {name}: another run is already in progress.\n"
+                    f"Status: {read_job_status(name)}",
+                    "Scheduled Job - Already Running"
+                )
+                return None
+
+            parent_lock = frappe.flags.get("job_lock")
+            frappe.flags.job_lock = lock
+            _write_status(name, {
+                "running": 1,
+                "started_at": str(lock.started_at),
+                "owner": lock.token,
+            })
+
+            start = time.monotonic()
+            status = "Success"
+            error = None
+            try:
+                result = fn(*args, **kwargs)
+                if lock.error:
+                    status = "Failed"
+                    error = lock.error
+                return result
+            except Exception as e:
+                status = "Failed"
+                error = str(e)
+                raise
+            finally:
+                frappe.flags.job_lock = parent_lock
+                lock.release()
+                _write_status(name, {
+                    "running": 0,
+                    "owner": None,
+                    "last_run_start": str(lock.started_at),
+                    "last_run_end": str(now_datetime()),
+                    "last_duration_seconds": round(time.monotonic() - start, 3),
+                    "last_rows_touched": lock.rows_touched,
+                    "last_status": status,
+                    "last_error": error,
+                })
+
+        wrapper.job_name = name
+        return wrapper
+
+    return decorator
+
+
+def add_rows_touched(count):
+    """Add to the rows-touched counter of the job currently running in this process"""
+    lock = frappe.flags.get("job_lock")
+    if lock:
+        lock.add_rows_touched(count)
+
+
+def set_rows_touched(count):
+    lock = frappe.flags.get("job_lock")
+    if lock:
+        lock.rows_touched = int(count or 0)
+
+
+def mark_failed(error=None):
+    """Record the job currently running in this process as Failed (for errors it catches and logs)"""
+    lock = frappe.flags.get("job_lock")
+    if lock:
+        lock.mark_failed(error)
+
+
+def _write_status(job_name, values):
+    try:
+        status = frappe.cache().hget(STATUS_KEY, job_name) or {}
+        status.update(values)
+        frappe.cache().hset(STATUS_KEY, job_name, status)
+    except Exception as e:
+        # Status is informational - never fail the job because of it
+        frappe.logger().warning(f"Could not record status for job {job_name}: {str(e)}")
+
+
+def read_job_status(job_name=None):
+    """
+    Run status of scheduled jobs.
+
+    Returns:
+        dict: {job_name: {running, started_at, last_run_start, last_run_end,
+               last_duration_seconds, last_rows_touched, last_status, last_error}}
+        or the single job's status if job_name is given
+    """
+    if job_name:
+        status = frappe.cache().hget(STATUS_KEY, job_name) or {}
+        status["lock_held"] = bool(frappe.cache().get(frappe.cache().make_key(LOCK_KEY_PREFIX + job_name)))
+        return status
+
+    # hgetall returns the field names as bytes
+    statuses = {
+        frappe.safe_decode(name): status
+        for name, status in (frappe.cache().hgetall(STATUS_KEY) or {}).items()
+    }
+    for name, status in statuses.items():
+        status["lock_held"] = bool(frappe.cache().get(frappe.cache().make_key(LOCK_KEY_PREFIX + name)))
+    return statuses
+
+
+@frappe.whitelist()
+def get_job_status(job_name=None):
+    """Run status of one or all scheduled jobs (see read_job_status)"""
+    frappe.only_for(["System Manager", "Tuktuk Manager"])
+    return read_job_status(job_name)
@@ -0,0 +1,283 @@
+# ~/frappe-bench/apps/tuktuk_management/tuktuk_management/utils/job_queues.py
+"""
+Background job queue topology for the TukTuk app
+
+All background work of this app goes through enqueue_job() so that a long CSV
+import or report can never sit in front of a payout. Each logical queue has its
+own RQ queue (configured as a custom worker in common_site_config.json), worker
+count, job timeout, backpressure limit and deduplication.
+
+Until the workers are configured on the bench (see write_worker_config), jobs
+fall back to the standard Frappe queue listed as `fallback`, so nothing breaks
+on a bench that has not been set up yet.
+"""
+
+import time
+
+import frappe
+from frappe.utils import cint, flt, now_datetime
+
+PAYMENTS = "payments"
+TELEMETRY = "telemetry"
+NOTIFICATIONS = "notifications"
+REPORTS = "reports"
+
+# queue: RQ queue name (custom worker)
+# workers: background_workers for the bench supervisor/Procfile config
+# timeout: default job timeout in seconds
+# max_depth: backpressure - refuse new jobs when this many are waiting
+# on_full: "reject" raises, "drop" logs and skips (only for work that can be lost)
+QUEUE_TOPOLOGY = {
+    PAYMENTS: {
+        "queue": "tuktuk_payments",
+        "fallback": "short",
+        "workers": 2,
+        "timeout": 300,
+        "max_depth": 1000,
+        "on_full": "reject",
+    },
+    TELEMETRY: {
+        "queue": "tuktuk_telemetry",
+        "fallback": "long",
+        "workers": 1,
+        "timeout": 1800,
+        "max_depth": 50,
+        "on_full": "reject",
+    },
+    NOTIFICATIONS: {
+        "queue": "tuktuk_notifications",
+        "fallback": "default",
+        "workers": 1,
+        "timeout": 600,
+        "max_depth": 2000,
+        "on_full": "drop",
+    },
+    REPORTS: {
+        "queue": "tuktuk_reports",
+        "fallback": "long",
+        "workers": 1,
+        "timeout": 3600,
+        "max_depth": 20,
+        "on_full": "reject",
+    },
+}
+
+STATS_KEY = "tuktuk_queue_stats"
+
+# Raise a hash field to ARGV[2] if it is larger than the stored value
+_MAX_SCRIPT = """
+local current = tonumber(redis.call('hget', KEYS[1], ARGV[1]) or '0')
+if tonumber(ARGV[2]) > current then
+    redis.call('hset', KEYS[1], ARGV[1], ARGV[2])
+end
+return 0
+"""
+
+
+class QueueFullError(frappe.ValidationError):
+    pass
+
+
+def _resolve_queue(kind):
+    """RQ queue name for a logical queue - the custom worker if configured, else the fallback"""
+    from frappe.utils.background_jobs import get_queues_timeout
+
+    config = QUEUE_TOPOLOGY[kind]
+    if config["queue"] in get_queues_timeout():
+        return config["queue"]
+    return config["fallback"]
+
+
+def _queue_depth(queue_name):
+    from frappe.utils.background_jobs import get_queue
+
+    try:
+        return get_queue(queue_name).count
+    except Exception:
+        return 0
+
+
+def enqueue_job(method, queue=NOTIFICATIONS, dedupe_key=None, timeout=None, at_front=False,
+                enqueue_after_commit=False, **kwargs):
+    """
+    Enqueue a background job on one of the app's queues.
+
+    Args:
+        method: Dotted path of the function to run
+        queue: Logical queue (PAYMENTS, TELEMETRY, NOTIFICATIONS, REPORTS)
+        dedupe_key: If set, a job with the same key that is still queued or
+            running is not enqueued again
+        timeout: Override the queue's default job timeout
+        at_front: Put the job at the front of its queue
+        enqueue_after_commit: Enqueue only once the current DB transaction commits
+        **kwargs: Passed through to the job function
+
+    Returns:
+        The RQ job, or None if it was deduplicated or dropped by backpressure
+    """
+    if queue not in QUEUE_TOPOLOGY:
+        frappe.throw(f"Unknown TukTuk job queue: {queue}")
+
+    config = QUEUE_TOPOLOGY[queue]
+    queue_name = _resolve_queue(queue)
+
+    depth = _queue_depth(queue_name)
+    if depth >= config["max_depth"]:
+        message = f"Queue {queue} ({queue_name}) is full: {depth} jobs waiting. Refusing {method}"
+        if config["on_full"] == "drop":
+            frappe.log_error(message, "Job Queue - Job Dropped")
+            return None
+        raise QueueFullError(message)
+
+    job_kwargs = {}
+    if dedupe_key:
+        job_kwargs["job_id"] = f"tuktuk::{queue}::{dedupe_key}"
+        job_kwargs["deduplicate"] = True
+
+    return frappe.enqueue(
+        "tuktuk_management.utils.job_queues.execute_job",
+        queue=queue_name,
+        timeout=timeout or config["timeout"],
+        at_front=at_front,
+        enqueue_after_commit=enqueue_after_commit,
+        _method=method,
+        _queue=queue,
+        _enqueued_at=time.time(),
+        **job_kwargs,
+        **kwargs
+    )
+
+
+def execute_job(_method, _queue, _enqueued_at, **kwargs):
+    """Worker-side wrapper: records queue wait time, then runs the job"""
+    wait = max(0.0, time.time() - (_enqueued_at or time.time()))
+    _record_stats(_queue, wait=wait)
+
+    start = time.monotonic()
+    try:
+        return frappe.get_attr(_method)(**kwargs)
+    except Exception:
+        _record_stats(_queue, failed=True)
+        raise
+    finally:
+        _record_stats(_queue, runtime=time.monotonic() - start)
+
+
+def _stats_key(queue):
+    return frappe.cache().make_key(f"{STATS_KEY}:{queue}")
+
+
+def _record_stats(queue, wait=None, runtime=None, failed=False):
+    """
+    Update the queue's counters in one MULTI/EXEC pipeline.
+
+    Counters are plain Redis hash fields bumped with HINCRBY / HINCRBYFLOAT,
+    so concurrent workers on the same queue never overwrite each other.
+    """
+    try:
+        key = _stats_key(queue)
+        pipe = frappe.cache().pipeline()
+        if wait is not None:
+            pipe.hincrby(key, "jobs_started", 1)
+            pipe.hincrbyfloat(key, "total_wait_seconds", wait)
+            pipe.hset(key, "last_wait_seconds", wait)
+            pipe.hset(key, "last_started_at", str(now_datetime()))
+            pipe.eval(_MAX_SCRIPT, 1, key, "max_wait_seconds", wait)
+        if runtime is not None:
+            pipe.hincrbyfloat(key, "total_runtime_seconds", runtime)
+        if failed:
+            pipe.hincrby(key, "jobs_failed", 1)
+        pipe.execute()
+    except Exception as e:
+        # Metrics must never fail the job
+        frappe.logger().warning(f"Could not record job queue stats for {queue}: {str(e)}")
+
+
+def _read_stats(queue):
+    """Counters of a queue as {field: value} (Redis returns bytes field names and values)"""
+    raw = frappe.cache().execute_command("HGETALL", _stats_key(queue)) or {}
+    stats = {frappe.safe_decode(field): frappe.safe_decode(value) for field, value in raw.items()}
+    for field in ("jobs_started", "jobs_failed"):
+        stats[field] = cint(stats.get(field))
+    for field in ("total_wait_seconds", "max_wait_seconds", "last_wait_seconds", "total_runtime_seconds"):
+        stats[field] = flt(stats.get(field))
+    return stats
+
+
+def _oldest_job_wait(queue_name):
+    """Seconds the job at the head of the queue has been waiting"""
+    from frappe.utils.background_jobs import get_queue
+
+    try:
+        rq_queue = get_queue(queue_name)
+        job_ids = rq_queue.get_job_ids(0, 1)
+        if not job_ids:
+            return 0.0
+        job = rq_queue.fetch_job(job_ids[0])
+        if not job or not job.enqueued_at:
+            return 0.0
+        from datetime import datetime, timezone
+        enqueued_at = job.enqueued_at
+        if enqueued_at.tzinfo is None:
+            enqueued_at = enqueued_at.replace(tzinfo=timezone.utc)
+        return (datetime.now(timezone.utc) - enqueued_at).total_seconds()
+    except Exception:
+        return 0.0
+
+
+@frappe.whitelist()
+def get_queue_metrics():
+    """
+    Depth and wait-time metrics for each of the app's queues.
+
+    Returns:
+        dict: {queue: {rq_queue, configured, depth, max_depth, oldest_wait_seconds,
+               avg_wait_seconds, max_wait_seconds, jobs_started, jobs_failed}}
+    """
+    frappe.only_for(["System Manager", "Tuktuk Manager"])
+    metrics = {}
+    for kind, config in QUEUE_TOPOLOGY.items():
+        queue_name = _resolve_queue(kind)
+        queue_stats = _read_stats(kind)
+        started = queue_stats["jobs_started"]
+        metrics[kind] = {
+            "rq_queue": queue_name,
+            "configured": queue_name == config["queue"],
+            "depth": _queue_depth(queue_name),
+            "max_depth": config["max_depth"],
+            "oldest_wait_seconds": _oldest_job_wait(queue_name),
+            "avg_wait_seconds": (queue_stats["total_wait_seconds"] / started) if started else 0.0,
+            "max_wait_seconds": queue_stats["max_wait_seconds"],
+            "last_wait_seconds": queue_stats["last_wait_seconds"],
+            "avg_runtime_seconds": (queue_stats["total_runtime_seconds"] / started) if started else 0.0,
+            "jobs_started": started,
+            "jobs_failed": queue_stats["jobs_failed"],
+        }
+    return metrics
+
+
+def get_worker_config():
+    """The `workers` block for common_site_config.json matching QUEUE_TOPOLOGY"""
+    return {
+        config["queue"]: {
+            "timeout": config["timeout"],
+            "background_workers": config["workers"],
+        }
+        for config in QUEUE_TOPOLOGY.values()
+    }
+
+
+def write_worker_config():
+    """
+    Merge the app's queues into common_site_config.json.
+    Run once per bench, then `bench setup supervisor` (or update the Procfile) and restart:
+
+        bench execute tuktuk_management.utils.job_queues.write_worker_config
+    """
+    from frappe.installer import update_site_config
+
+    workers = frappe.get_conf().get("workers") or {}
+    workers.update(get_worker_config())
+    update_site_config("workers", workers, validate=False, site_config_path="common_site_config.json")
+    print(f"✅ Configured TukTuk job queues: {', '.join(get_worker_config())}")
+    return workers
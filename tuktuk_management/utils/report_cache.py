@@ -0,0 +1,208 @@
+# ~/frappe-bench/apps/tuktuk_management/tuktuk_management/utils/report_cache.py
+"""
+Filter-keyed result cache for Script Reports
+
+A report's result is cached under a hash of its normalised filters, pickled and
+zlib-compressed in Redis. Results whose date window ends before today can no
+longer change through new activity and are kept for CLOSED_RANGE_TTL; open
+windows, and reports showing live columns, expire after DEFAULT_TTL.
+
+Every cached entry is also added to one Redis set per (source, business date)
+its window covers, for each source it is built from (transactions, deposits).
+A new or changed TukTuk Transaction or deposit row only reads the set of its own
+source and business date, so invalidation cost does not grow with the number of
+cached entries. Open-ended windows and windows longer than MAX_INDEXED_DAYS go
+into a per-source "open" set that every invalidation of that source evicts.
+
+    @cached_report("Deposit Management Report", sources=(DEPOSITS, TRANSACTIONS))
+    def execute(filters=None):
+        ...
+"""
+
+import functools
+import hashlib
+import json
+import pickle
+import zlib
+
+import frappe
+from frappe.utils import add_days, date_diff, flt, getdate, today
+
+KEY_PREFIX = "tuktuk_report_cache::"
+DATE_INDEX_PREFIX = "tuktuk_report_cache_date::"
+OPEN_INDEX_PREFIX = "tuktuk_report_cache_open::"
+REPORT_INDEX_PREFIX = "tuktuk_report_cache_report::"
+REPORTS_KEY = "tuktuk_report_cache_reports"
+DEFAULT_TTL = 300
+CLOSED_RANGE_TTL = 7 * 24 * 3600
+MAX_INDEXED_DAYS = 400  # Longer windows are indexed as open-ended
+
+TRANSACTIONS = "transactions"
+DEPOSITS = "deposits"
+
+
+def normalise_filters(filters):
+    """Drop empty filters and stringify values so equivalent filter sets share a key"""
+    return {
+        key: str(value)
+        for key, value in (filters or {}).items()
+        if value not in (None, "", [])
+    }
+
+
+def cache_key(report, filters):
+    payload = json.dumps(normalise_filters(filters), sort_keys=True)
+    return f"{KEY_PREFIX}{report}::{hashlib.sha1(payload.encode()).hexdigest()}"
+
+
+def ttl_for(to_date, live=False):
+    """Long TTL for ranges closed before today, short for open ranges and live reports"""
+    if not live and to_date and getdate(to_date) < getdate(today()):
+        return CLOSED_RANGE_TTL
+    return DEFAULT_TTL
+
+
+def _index_key(prefix, *parts):
+    return frappe.cache().make_key(prefix + "::".join(parts))
+
+
+def get_cached(report, filters):
+    value = frappe.cache().get_value(cache_key(report, filters))
+    if value is None:
+        return None
+    return pickle.loads(zlib.decompress(value))
+
+
+def set_cached(report, filters, value, from_date=None, to_date=None, ttl=DEFAULT_TTL,
+               sources=(TRANSACTIONS, DEPOSITS)):
+    """Cache a report result for the [from_date, to_date] window (None = open-ended)"""
+    key = cache_key(report, filters)
+    frappe.cache().set_value(
+        key, zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)), expires_in_sec=ttl
+    )
+
+    dates = None
+    if from_date and to_date:
+        days = date_diff(to_date, from_date)
+        if 0 <= days < MAX_INDEXED_DAYS:
+            dates = [str(getdate(add_days(from_date, offset))) for offset in range(days + 1)]
+
+    # Index sets outlive their entries; stale members are harmless on eviction
+    pipe = frappe.cache().pipeline()
+    for source in sources:
+        index_keys = (
+            [_index_key(DATE_INDEX_PREFIX, source, day) for day in dates]
+            if dates is not None else [_index_key(OPEN_INDEX_PREFIX, source)]
+        )
+        for index_key in index_keys:
+            pipe.sadd(index_key, key)
+            pipe.expire(index_key, CLOSED_RANGE_TTL)
+    report_key = _index_key(REPORT_INDEX_PREFIX, report)
+    pipe.sadd(report_key, key)
+    pipe.expire(report_key, CLOSED_RANGE_TTL)
+    pipe.sadd(frappe.cache().make_key(REPORTS_KEY), report)
+    pipe.execute()
+
+
+def cached_report(report, sources=(TRANSACTIONS, DEPOSITS), live=False,
+                  from_field="from_date", to_field="to_date"):
+    """
+    Decorator for a report's execute(filters) (or any function of the filters):
+    serve the cached result for the same filters, otherwise compute and cache it.
+
+    Args:
+        sources: data the result is built from; decides which changes evict it
+        live: the result also shows current values (balances, battery), so
+            closed ranges get the short TTL too
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(filters=None):
+            filters = frappe._dict(filters or {})
+            cached = get_cached(report, filters)
+            if cached is not None:
+                return cached
+
+            result = fn(filters)
+            try:
+                set_cached(
+                    report, filters, result,
+                    filters.get(from_field), filters.get(to_field),
+                    ttl=ttl_for(filters.get(to_field), live),
+                    sources=sources,
+                )
+            except Exception as e:
+                frappe.logger().warning(f"Caching {report} failed: {str(e)}")
+            return result
+        return wrapper
+    return decorator
+
+
+def invalidate_for_date(business_date, source=TRANSACTIONS):
+    """Evict every cached report result built from `source` whose window contains business_date"""
+    try:
+        date_key = _index_key(DATE_INDEX_PREFIX, source, str(getdate(business_date)))
+        open_key = _index_key(OPEN_INDEX_PREFIX, source)
+
+        pipe = frappe.cache().pipeline()
+        pipe.smembers(date_key)
+        pipe.smembers(open_key)
+        dated, open_ended = pipe.execute()
+        if not dated and not open_ended:
+            return
+
+        # Set members come back as bytes
+        frappe.cache().delete_value([frappe.safe_decode(key) for key in dated | open_ended])
+
+        pipe = frappe.cache().pipeline()
+        if dated:
+            pipe.srem(date_key, *dated)
+        if open_ended:
+            pipe.srem(open_key, *open_ended)
+        pipe.execute()
+    except Exception as e:
+        # A cache problem must never fail a payment
+        frappe.logger().warning(f"Report cache invalidation failed: {str(e)}")
+
+
+def _deposit_state(doc):
+    return {
+        row.name: (str(getdate(row.transaction_date)), row.transaction_type, flt(row.amount))
+        for row in (doc.get("deposit_transactions") or [])
+        if row.transaction_date
+    }
+
+
+def on_deposit_rows_update(doc, method=None):
+    """
+    doc_events hook (TukTuk Driver, Terminated TukTuk Driver): evict cached results
+    and deposit liability checkpoints covering the dates of deposit rows that
+    were added, changed or removed.
+    """
+    before = doc.get_doc_before_save()
+    old = _deposit_state(before) if before else {}
+    new = _deposit_state(doc)
+
+    dates = {state[0] for name, state in new.items() if old.get(name) != state}
+    dates |= {state[0] for name, state in old.items() if name not in new}
+    for business_date in dates:
+        invalidate_for_date(business_date, source=DEPOSITS)
+
+    if dates:
+        from tuktuk_management.api.deposit_liability import invalidate_liability_snapshots
+        invalidate_liability_snapshots(min(dates))
+
+
+def clear_report_cache(report=None):
+    """Drop all cached results (of one report, or of all reports)"""
+    cache = frappe.cache()
+    reports = [report] if report else [
+        frappe.safe_decode(name)
+        for name in cache.execute_command("SMEMBERS", cache.make_key(REPORTS_KEY)) or ()
+    ]
+    for name in reports:
+        report_key = _index_key(REPORT_INDEX_PREFIX, name)
+        keys = [frappe.safe_decode(key) for key in cache.execute_command("SMEMBERS", report_key) or ()]
+        if keys:
+            cache.delete_value(keys)
+        cache.execute_command("DEL", report_key)
@@ -0,0 +1,56 @@
+# Copyright (c) 2024, Yuda Media and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from tuktuk_management.utils.job_lock import JobLock, STATUS_KEY, get_job_status, mark_failed, single_flight
+
+
+class TestJobLock(FrappeTestCase):
+    job_name = "test_tuktuk_job_lock"
+
+    def tearDown(self):
+        frappe.cache().hdel(STATUS_KEY, self.job_name)
+        JobLock(self.job_name).release()
+
+    def test_second_lock_is_refused_until_release(self):
+        with JobLock(self.job_name, lease_seconds=30) as first:
+            self.assertTrue(first.acquired)
+            second = JobLock(self.job_name, lease_seconds=30)
+            self.assertFalse(second.acquire())
+        third = JobLock(self.job_name, lease_seconds=30)
+        self.assertTrue(third.acquire())
+        third.release()
+
+    def test_single_flight_skips_overlapping_run_and_records_status(self):
+        calls = []
+
+        @single_flight(self.job_name, lease_seconds=30)
+        def job():
+            calls.append(1)
+            # A run started while this one holds the lock is skipped
+            self.assertIsNone(job())
+            return "done"
+
+        self.assertEqual(job(), "done")
+        self.assertEqual(len(calls), 1)
+
+        status = get_job_status()
+        self.assertIn(self.job_name, status)
+        self.assertEqual(status[self.job_name]["last_status"], "Success")
+        self.assertFalse(status[self.job_name]["lock_held"])
+
+    def test_error_handled_by_the_job_is_recorded_as_failed(self):
+        @single_flight(self.job_name, lease_seconds=30)
+        def job():
+            try:
+                raise ValueError("no connection")
+            except Exception as e:
+                mark_failed(e)
+
+        job()
+
+        status = get_job_status(self.job_name)
+        self.assertEqual(status["last_status"], "Failed")
+        self.assertEqual(status["last_error"], "no connection")